@@ -0,0 +1,86 @@
+# active_searches.py
+# 每个聊天当前进行中的搜索。用户改了主意又发一个关键词时，上一次搜索直接取消：
+# 处理协程被取消 -> singleflight 的等待者离开 -> 没有其他人等待时抓取任务被取消 ->
+# 调度器把还在排队的任务移出队列，或者通知正在运行的浏览器停下（见 scheduler.py / cancellation.py）。
+# worker farm 模式下，正在 worker 进程里执行的抓取同样会收到取消消息（见 worker_farm.py）。
+#
+# 搜索在处理函数的第一个 await 之前就用 message_id 登记（start()），按消息顺序而不是到达顺序判断新旧：
+# 较早的消息即使处理得晚，也不会取消同一聊天里更新的搜索（它自己直接被视为已取代）。
+# run() 之外（例如还在发送占位消息）被取代的搜索只做标记，进入 run() 时立即抛 SearchSuperseded。
+#
+# 同一个关键词还有其他聊天（或同一聊天的新消息）在等待时，抓取本身不会被取消，只是旧的等待者离开。
+# 所有方法都在事件循环线程中调用，不需要加锁。
+import asyncio
+
+
+class SearchSuperseded(RuntimeError):
+    """同一聊天发起了新的搜索，这次搜索已被取消"""
+
+
+class _Search:
+    def __init__(self, chat_id, message_id):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.task = None  # 只在 run() 期间设置
+        self.superseded = False
+
+
+class ActiveSearches:
+    def __init__(self):
+        self._searches = {}  # chat_id -> _Search
+        self.stats = {"started": 0, "superseded": 0}
+
+    def start(self, chat_id, message_id):
+        """登记一次新的搜索并取代该聊天之前的搜索；必须在处理函数的第一个 await 之前调用。
+
+        该聊天已经登记了更新的消息时，不取代它，返回的搜索直接标记为已取代。
+        """
+        self.stats["started"] += 1
+        search = _Search(chat_id, message_id)
+        previous = self._searches.get(chat_id)
+        if previous is not None and previous.message_id > message_id:
+            search.superseded = True
+            self.stats["superseded"] += 1
+            return search
+        if previous is not None:
+            self._supersede(previous)
+        self._searches[chat_id] = search
+        return search
+
+    def _supersede(self, search):
+        if search.superseded:
+            return
+        search.superseded = True
+        self.stats["superseded"] += 1
+        if search.task is not None and not search.task.done():
+            search.task.cancel()
+
+    def finish(self, search):
+        """搜索结束（或结果已经开始发送）后取消登记，之后的新消息不会打断它"""
+        if self._searches.get(search.chat_id) is search:
+            del self._searches[search.chat_id]
+
+    async def run(self, search, awaitable):
+        """在当前任务里等待 awaitable；等待期间被更新的搜索取代时取消它并抛 SearchSuperseded。
+
+        awaitable 结束后就不再登记，之后的新消息不会打断结果的发送。
+        """
+        try:
+            if search.superseded:
+                if asyncio.iscoroutine(awaitable):
+                    awaitable.close()
+                raise SearchSuperseded("同一聊天发起了新的搜索")
+            search.task = asyncio.current_task()
+            try:
+                return await awaitable
+            except asyncio.CancelledError:
+                if search.superseded:
+                    raise SearchSuperseded("同一聊天发起了新的搜索") from None
+                raise
+            finally:
+                search.task = None
+        finally:
+            self.finish(search)
+
+    def snapshot(self):
+        return dict(self.stats, active=len(self._searches))
@@ -1,7 +1,7 @@
-from bs4 import BeautifulSoup
+from extract import make_soup
 
 html = open('rendered.html', encoding='utf-8').read()
-soup = BeautifulSoup(html, 'html.parser')
+soup = make_soup(html)  # lxml 优先，比 html.parser 快得多
 
 # Find all t.me links
 links = [a for a in soup.find_all('a') if 't.me' in a.get('href', '')]
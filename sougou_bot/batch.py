@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# batch.py
+# 离线批量抓取：把关键词列表逐个交给 scraper，结果以 JSONL 流式写出。
+#
+# 输入每行一个查询，或者 JSONL 对象：查询词取 --field 指定的字段，其次是 "query"、"q"、"keyword"、"title"；
+# 记录 id 取 "id" / "request_id"，没有时就是查询词本身。以 # 开头的行忽略。
+#
+# 每完成一个查询立即追加到输出文件。用同一个输出文件重新运行时跳过已经成功的 id，
+# 中断后从停下的地方继续；失败的 id 在下次运行时重试。--fresh 从头开始。
+#
+# 用法：
+#   python batch.py keywords.txt -o results.jsonl --concurrency 4 --rate 2
+#   python batch.py ../requests.jsonl --field title -o out.jsonl --pages 2
+#   python batch.py keywords.txt -o results.jsonl --backend selenium --warm-cache
+#   python batch.py keywords.txt -o results.jsonl --summary summary.json
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from circuit_breaker import CircuitOpen
+from latency_stats import summarize
+
+QUERY_FIELDS = ("query", "q", "keyword", "title")
+ID_FIELDS = ("id", "request_id")
+# 上游熔断时最多等待几轮冷却
+MAX_CIRCUIT_WAITS = 10
+
+
+# ---------- 输入 / 断点 ----------
+
+def read_queries(path, field=None):
+    """读取查询列表，返回 [{"id", "query"}]（按 id 去重，保持原有顺序）"""
+    jobs = {}
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                try:
+                    item = json.loads(line)
+                except ValueError as e:
+                    print(f"[batch] 第 {lineno} 行不是合法 JSON，跳过: {e}", file=sys.stderr)
+                    continue
+                fields = ((field,) if field else ()) + QUERY_FIELDS
+                query = next((str(item[name]).strip() for name in fields if item.get(name)), None)
+                if not query:
+                    print(f"[batch] 第 {lineno} 行没有查询词（{'/'.join(fields)}），跳过", file=sys.stderr)
+                    continue
+                job_id = next((str(item[name]) for name in ID_FIELDS if item.get(name)), query)
+            else:
+                query = job_id = line
+            jobs.setdefault(job_id, {"id": job_id, "query": query})
+    return list(jobs.values())
+
+
+def ensure_trailing_newline(path):
+    """上次中断时最后一行可能只写了一半：追加之前先补上换行，新记录不会接在半行后面"""
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+    except OSError:
+        return
+    if last != b"\n":
+        with open(path, "ab") as f:
+            f.write(b"\n")
+
+
+def completed_ids(path):
+    """输出文件里已经成功的 id（用于断点续跑）"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 上次中断时可能只写了半行
+                continue
+            if record.get("ok"):
+                done.add(record["id"])
+    return done
+
+
+# ---------- 限速 ----------
+
+class RateLimiter:
+    """全局限速：两次开始之间至少间隔 1/rate 秒（rate <= 0 表示不限速）"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            if self._next > now:
+                await asyncio.sleep(self._next - now)
+            self._next = max(now, self._next) + self.interval
+
+
+# ---------- 执行 ----------
+
+class BatchRunner:
+    def __init__(self, args):
+        self.args = args
+        self.latencies = []
+        self.stats = {"ok": 0, "failed": 0, "empty": 0, "retries": 0, "results": 0}
+        self.limiter = RateLimiter(args.rate)
+        self.cache = None
+        self.corpus = None
+
+    def _setup(self):
+        if self.args.backend == "selenium":
+            os.environ["FAST_PATH"] = "0"
+        # 浏览器数量与并发一致（未显式配置时）
+        os.environ.setdefault("SCRAPER_POOL_SIZE", str(self.args.concurrency))
+        import scraper
+        self.scraper = scraper
+        if self.args.warm_cache:
+            from corpus_index import CorpusIndex
+            from result_cache import ResultCache
+            self.cache = ResultCache.from_env()
+            self.corpus = CorpusIndex.from_env()
+
+    async def search_page(self, query, page):
+        if self.args.backend == "fast":
+            results = await self.scraper.search_telegram_fast(query, page)
+        else:
+            results = await self.scraper.search(query, page)
+        if self.cache is not None:
+            self.cache.put(query, page, results)
+            self.corpus.add(results)
+        return results
+
+    async def run_one(self, job):
+        attempts = failures = 0
+        t0 = time.perf_counter()
+        while True:
+            attempts += 1
+            await self.limiter.wait()
+            try:
+                if self.args.pages > 1:
+                    results = await asyncio.wait_for(
+                        self.scraper.search_pages(job["query"], self.args.pages, self.args.timeout, self.search_page),
+                        self.args.timeout + 5,
+                    )
+                else:
+                    results = await asyncio.wait_for(self.search_page(job["query"], 1), self.args.timeout)
+                error = None
+                break
+            except CircuitOpen as e:
+                # 上游熔断中：等冷却结束再试，不计入重试次数
+                error = e
+                if attempts >= MAX_CIRCUIT_WAITS:
+                    break
+                print(f"[batch] 上游熔断中，{e.retry_after:.0f}s 后重试 {job['query']!r}", file=sys.stderr)
+                await asyncio.sleep(max(1.0, e.retry_after))
+            except Exception as e:
+                error = e
+                failures += 1
+                if failures > self.args.retries:
+                    break
+                self.stats["retries"] += 1
+                await asyncio.sleep(min(30.0, 2.0 ** failures))
+        elapsed = time.perf_counter() - t0
+
+        record = {"id": job["id"], "query": job["query"], "ok": error is None, "attempts": attempts,
+                  "elapsed_ms": round(elapsed * 1000, 1), "finished_at": round(time.time(), 3)}
+        if error is None:
+            self.stats["ok"] += 1
+            self.stats["results"] += len(results)
+            if not results:
+                self.stats["empty"] += 1
+            self.latencies.append(elapsed)
+            record["results"] = results
+        else:
+            self.stats["failed"] += 1
+            record["error"] = f"{type(error).__name__}: {error}"
+        return record
+
+    async def run(self, jobs, out):
+        self._setup()
+        loop = asyncio.get_running_loop()
+        # Selenium 回退在线程池里执行；线程数与并发一致，不让默认线程池无限制地开浏览器
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.args.concurrency, thread_name_prefix="batch"))
+        queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+        total = len(jobs)
+        started = time.perf_counter()
+
+        async def worker():
+            while True:
+                try:
+                    job = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                record = await self.run_one(job)
+                # 每完成一条立即写入并 flush：中断后重跑时据此跳过
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                done = self.stats["ok"] + self.stats["failed"]
+                if done % self.args.progress_every == 0 or done == total:
+                    rate = done / (time.perf_counter() - started)
+                    print(f"[batch] {done}/{total} 完成（失败 {self.stats['failed']}），{rate:.2f} 条/s",
+                          file=sys.stderr)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        finally:
+            await self.scraper.close_http_session()
+        return time.perf_counter() - started
+
+    def summary(self, wall, resumed, total):
+        finished = self.stats["ok"] + self.stats["failed"]
+        return dict(
+            self.stats,
+            queries=total,
+            already_done=resumed,
+            backend=self.args.backend,
+            concurrency=self.args.concurrency,
+            rate_limit=self.args.rate,
+            wall_s=round(wall, 3),
+            throughput_qps=round(finished / wall, 3) if wall else None,
+            latency_ms=summarize(self.latencies),
+        )
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="批量抓取关键词列表，结果写入 JSONL")
+    parser.add_argument("input", help="查询列表：每行一个，或 JSONL")
+    parser.add_argument("-o", "--output", required=True, help="JSONL 结果（同时也是断点续跑的依据）")
+    parser.add_argument("--field", default=None, help="JSONL 里查询词所在的字段")
+    parser.add_argument("--backend", choices=("auto", "fast", "selenium"), default="auto",
+                        help="auto = 快速路径，失败时回退到 Selenium")
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--rate", type=float, default=1.0, help="每秒最多开始几个查询（0 = 不限）")
+    parser.add_argument("--pages", type=int, default=1, help="每个查询抓取的结果页数")
+    parser.add_argument("--timeout", type=float, default=90.0, help="每个查询的超时（秒）")
+    parser.add_argument("--retries", type=int, default=1)
+    parser.add_argument("--warm-cache", action="store_true", help="同时把结果写入结果缓存和语料库")
+    parser.add_argument("--fresh", action="store_true", help="忽略并覆盖已有的输出")
+    parser.add_argument("--limit", type=int, default=0, help="只执行前 N 个未完成的查询")
+    parser.add_argument("--progress-every", type=int, default=10)
+    parser.add_argument("--summary", default=None, help="同时把汇总 JSON 写到这里")
+    args = parser.parse_args()
+    args.concurrency = max(1, args.concurrency)
+    args.progress_every = max(1, args.progress_every)
+
+    jobs = read_queries(args.input, args.field)
+    done = set() if args.fresh else completed_ids(args.output)
+    pending = [job for job in jobs if job["id"] not in done]
+    resumed = len(jobs) - len(pending)
+    if args.limit:
+        pending = pending[:args.limit]
+    print(f"[batch] 共 {len(jobs)} 个查询，之前已完成 {resumed}，本次执行 {len(pending)}", file=sys.stderr)
+
+    runner = BatchRunner(args)
+    wall = 0.0
+    if not args.fresh:
+        ensure_trailing_newline(args.output)
+    with open(args.output, "w" if args.fresh else "a", encoding="utf-8") as out:
+        if pending:
+            try:
+                wall = asyncio.run(runner.run(pending, out))
+            except KeyboardInterrupt:
+                print("[batch] 已中断；已完成的结果已写入，重新运行同样的命令即可继续", file=sys.stderr)
+                return 130
+
+    summary = runner.summary(wall, resumed, len(jobs))
+    text = json.dumps(summary, ensure_ascii=False, indent=2)
+    print(text)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 1 if runner.stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# bench_extract.py
+# 在录制的页面上比较几种结果提取方式的耗时。
+#
+# 用法：
+#   python bench_extract.py [page.html ...] [--rounds N]
+#
+# 对每个录制页面（默认 rendered.html）比较：
+# - bs4/html.parser：scraper 原来的做法（BeautifulSoup + select）
+# - bs4/lxml       ：BeautifulSoup 使用 lxml 解析器（make_soup）
+# - lxml/xpath     ：extract.extract_from_html 直接用 lxml
+# 同时给出每次查询经过 WebDriver 协议传输的字节数：完整的 page_source 对比 EXTRACT_JS 返回的精简 JSON。
+
+import argparse
+import json
+import os
+import time
+
+from bs4 import BeautifulSoup
+
+import extract
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def bs4_extract(html, parser):
+    soup = BeautifulSoup(html, parser)
+    return [(" ".join(a.get_text().split()), a.get("href")) for a in soup.select(extract.RESULT_SELECTOR)]
+
+
+def time_path(fn, html, rounds):
+    fn(html)  # 预热
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        pairs = fn(html)
+    return (time.perf_counter() - t0) / rounds * 1000, len(pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较结果提取方式的耗时")
+    parser.add_argument("pages", nargs="*", default=[os.path.join(HERE, "rendered.html")])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    paths = [("bs4/html.parser", lambda html: bs4_extract(html, "html.parser"))]
+    if extract._LXML_AVAILABLE:
+        paths.append(("bs4/lxml", lambda html: bs4_extract(html, "lxml")))
+        paths.append(("lxml/xpath", extract.extract_from_html))
+    else:
+        print("没有安装 lxml：只测量 html.parser")
+
+    for page in args.pages:
+        with open(page, encoding="utf-8") as f:
+            html = f.read()
+        pairs = extract.extract_from_html(html)
+        compact = json.dumps(pairs, ensure_ascii=False).encode("utf-8")
+        page_bytes = len(html.encode("utf-8"))
+
+        print(f"\n{os.path.basename(page)}：{len(pairs)} 个链接")
+        print(f"  传输量  page_source={page_bytes:,} B  页面内提取的 JSON={len(compact):,} B "
+              f"（小 {page_bytes / max(1, len(compact)):.0f} 倍）")
+        baseline = None
+        for name, fn in paths:
+            ms, n = time_path(fn, html, args.rounds)
+            baseline = baseline or ms
+            print(f"  {name:16s} {ms:8.2f} ms/次  链接={n:3d}  加速={baseline / ms:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# benchmark.py
+# 抓取的离线端到端基准测试，请求全部发往本地的 stub_server.py：
+# 它用录制的 rendered.html 提供搜索页，可以配置网络延迟和渲染延迟。
+#
+# 用法：
+#   # 给定并发下的延迟 / 吞吐（快速路径不需要浏览器）
+#   python benchmark.py run --backend fast --requests 200 --concurrency 20 --latency 0.05
+#   python benchmark.py run --backend selenium --requests 20 --concurrency 2 --render-delay 1.0
+#
+#   # search_telegram 各阶段耗时：启动浏览器、导航、等待渲染、提取
+#   # （selenium / stages 需要本机的 Chrome 和 chromedriver：CHROMEDRIVER_PATH 或 PATH 里的，不会联网下载）
+#   python benchmark.py stages --iterations 5 --render-delay 1.0
+#   LEAN_PROFILE=0 python benchmark.py stages --json full.json   # 不拦截请求时的对比
+#
+#   # 输出 JSON 并比较两次运行
+#   python benchmark.py run --backend fast --json before.json
+#   python benchmark.py compare before.json after.json
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from latency_stats import summarize
+from proctree import process_tree_rss
+from stub_server import RECORDED_PAGE, StubServerThread
+
+QUERIES = ["六合彩", "python", "编程", "美剧", "投资", "游戏"]
+
+
+# ---------- 统计工具 ----------
+
+class PeakRSSSampler:
+    """后台线程周期性采样进程树 RSS，记录峰值"""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, process_tree_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, process_tree_rss())
+
+
+# ---------- run：并发吞吐 / 延迟 ----------
+
+async def _run_fast(requests, concurrency):
+    import scraper
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], []
+
+    async def one(i):
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                await scraper.search_telegram_fast(QUERIES[i % len(QUERIES)])
+                latencies.append(time.perf_counter() - t0)
+            except Exception as e:
+                errors.append(repr(e))
+
+    try:
+        await asyncio.gather(*(one(i) for i in range(requests)))
+    finally:
+        await scraper.close_http_session()
+    return latencies, errors
+
+
+def _run_selenium(requests, concurrency):
+    os.environ["SCRAPER_POOL_SIZE"] = str(concurrency)
+    # 不经过 webdriver_manager / selenium-manager：基准测试不联网
+    os.environ["SCRAPER_DRIVER_OFFLINE"] = "1"
+    import scraper
+
+    # 先把浏览器池预热好，只测量稳态下的查询延迟
+    pool = scraper.get_driver_pool()
+    warm = [pool.acquire() for _ in range(concurrency)]
+    for driver in warm:
+        pool.release(driver)
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def one(i):
+        t0 = time.perf_counter()
+        try:
+            scraper.search_telegram(QUERIES[i % len(QUERIES)])
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+        except Exception as e:
+            with lock:
+                errors.append(repr(e))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(requests)))
+    pool.close()
+    return latencies, errors
+
+
+def cmd_run(args):
+    with StubServerThread(args.page, args.latency, args.render_delay) as stub:
+        stub.use_for_scraper()
+        with PeakRSSSampler() as rss:
+            t0 = time.perf_counter()
+            if args.backend == "fast":
+                latencies, errors = asyncio.run(_run_fast(args.requests, args.concurrency))
+            else:
+                latencies, errors = _run_selenium(args.requests, args.concurrency)
+            wall = time.perf_counter() - t0
+
+    return {
+        "mode": "run",
+        "backend": args.backend,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "latency_ms": summarize(latencies),
+        "peak_rss_mb": round(rss.peak / 1024 / 1024, 1),
+    }
+
+
+# ---------- stages：search_telegram 各阶段耗时 ----------
+
+def cmd_stages(args):
+    from driver_factory import DriverFactory
+    from extract import extract_from_html, extract_in_browser
+    from lean_profile import collect_traffic, install_blocking, lean_enabled, reset_traffic
+    from readiness import RenderTimer, wait_for_results
+    import scraper
+
+    stages = {name: [] for name in ("driver_start", "navigation", "render_wait",
+                                    "extract_in_browser", "extract_page_source")}
+    page_kb, blocked = [], []
+    factory = DriverFactory(offline=True)
+    timer = RenderTimer(max_deadline=args.render_delay + 10)
+
+    with StubServerThread(args.page, args.latency, args.render_delay) as stub:
+        stub.use_for_scraper()
+        with PeakRSSSampler() as rss:
+            for i in range(args.iterations):
+                t0 = time.perf_counter()
+                driver = factory.create()
+                install_blocking(driver)
+                stages["driver_start"].append(time.perf_counter() - t0)
+                try:
+                    reset_traffic(driver)
+                    t0 = time.perf_counter()
+                    driver.get(scraper.build_url(QUERIES[i % len(QUERIES)]))
+                    stages["navigation"].append(time.perf_counter() - t0)
+
+                    t0 = time.perf_counter()
+                    wait_for_results(driver, timer=timer)
+                    stages["render_wait"].append(time.perf_counter() - t0)
+
+                    t0 = time.perf_counter()
+                    extract_in_browser(driver)
+                    stages["extract_in_browser"].append(time.perf_counter() - t0)
+
+                    traffic = collect_traffic(driver)
+                    if traffic is not None:
+                        page_kb.append(traffic.bytes / 1024)
+                        blocked.append(traffic.blocked)
+
+                    t0 = time.perf_counter()
+                    extract_from_html(driver.page_source)
+                    stages["extract_page_source"].append(time.perf_counter() - t0)
+                finally:
+                    driver.quit()
+
+    return {
+        "mode": "stages",
+        "iterations": args.iterations,
+        "lean_profile": lean_enabled(),
+        "stages_ms": {name: summarize(samples) for name, samples in stages.items()},
+        "page_kb_mean": round(sum(page_kb) / len(page_kb), 1) if page_kb else None,
+        "blocked_requests_mean": round(sum(blocked) / len(blocked), 1) if blocked else None,
+        "peak_rss_mb": round(rss.peak / 1024 / 1024, 1),
+    }
+
+
+# ---------- compare：比较两次运行 ----------
+
+def _flatten(data, prefix=""):
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def cmd_compare(args):
+    with open(args.before, encoding="utf-8") as f:
+        before = _flatten(json.load(f)["result"])
+    with open(args.after, encoding="utf-8") as f:
+        after = _flatten(json.load(f)["result"])
+
+    print(f"{'metric':40s} {'before':>12s} {'after':>12s} {'change':>9s}")
+    for key in sorted(set(before) & set(after)):
+        b, a = before[key], after[key]
+        change = f"{(a - b) / b * 100:+.1f}%" if b else "-"
+        print(f"{key:40s} {b:12.2f} {a:12.2f} {change:>9s}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抓取的离线基准测试（请求发往本地 stub_server）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(p):
+        p.add_argument("--page", default=RECORDED_PAGE, help="stub 提供的录制搜索页")
+        p.add_argument("--latency", type=float, default=0.0, help="stub 每个响应额外延迟的秒数")
+        p.add_argument("--render-delay", type=float, default=0.5, help="结果出现在 DOM 里之前的秒数")
+        p.add_argument("--json", help="把结果以 JSON 写入这个文件")
+
+    run = sub.add_parser("run", help="给定并发下的延迟 / 吞吐")
+    add_common(run)
+    run.add_argument("--backend", choices=("fast", "selenium"), default="fast")
+    run.add_argument("--requests", type=int, default=100)
+    run.add_argument("--concurrency", type=int, default=10)
+
+    stages = sub.add_parser("stages", help="search_telegram 各阶段耗时（需要 Chrome）")
+    add_common(stages)
+    stages.add_argument("--iterations", type=int, default=5)
+
+    compare = sub.add_parser("compare", help="比较两次 --json 的输出")
+    compare.add_argument("before")
+    compare.add_argument("after")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        cmd_compare(args)
+        return
+
+    result = cmd_run(args) if args.command == "run" else cmd_stages(args)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"page": os.path.basename(args.page), "latency": args.latency, "render_delay": args.render_delay},
+        "result": result,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
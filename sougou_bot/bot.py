@@ -1,9 +1,28 @@
 # bot.py
 import asyncio
+from startup import STARTUP, get_scraper, load_scraper, loaded_scraper, prewarm
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.types import Message, BotCommand
-from scraper import search_telegram
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message, BotCommand, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from result_merge import merge_pages
+from circuit_breaker import CircuitOpen
+from watchdog import NavigationTimeout, get_watchdog
+from result_cache import ResultCache, cache_key
+from singleflight import SingleFlight
+from active_searches import ActiveSearches, SearchSuperseded
+from result_sessions import ResultSessionStore
+from corpus_index import CorpusIndex
+from sources import FederatedSearch
+from warmer import CacheWarmer
+from worker_farm import WorkerFarm
+from webhook import run_webhook, webhook_enabled
+from streaming import StreamingMessage, streaming_enabled
+import progress
+from scheduler import ScrapeScheduler, SchedulerBusy, RateLimited
+from settings import env_float, env_int, env_str
+import metrics
 import os
+import time
 from dotenv import load_dotenv
 import logging
 
@@ -11,12 +30,236 @@ logging.basicConfig(level=logging.INFO)
 
 load_dotenv()
 
+# scraper（selenium 等）不在这里导入，启动后在后台加载，见 startup.py
+STARTUP.mark("imports")
+
 # 从 .env 文件读取 TOKEN，确保敏感信息不会暴露在代码中
 TOKEN = os.getenv("BOT_TOKEN")
 
 bot = Bot(token=TOKEN)
 dp = Dispatcher()
 
+# 搜索结果缓存（内存 LRU + SQLite），相同关键词短时间内不再重复打开浏览器
+result_cache = ResultCache.from_env()
+
+# 本地语料库：抓到过的所有频道/群组，实时搜索完成前先给出“已知结果”
+corpus = CorpusIndex.from_env()
+
+# 搜索来源（SEARCH_SOURCES）：并发请求、按来源数和排名合并，慢的来源自动放弃
+federated = FederatedSearch.from_env(corpus)
+
+# 多个用户同时搜索同一个关键词时，只打开一次浏览器，大家共享结果
+search_flights = SingleFlight()
+
+# 同一个聊天发来新的关键词时，取消上一次还没完成的搜索（排队的直接丢弃，运行中的浏览器停下）
+active_searches = ActiveSearches()
+
+# 专用抓取线程池：限制并发、按用户轮询排队、限速、过载时直接拒绝
+scheduler = ScrapeScheduler.from_env()
+
+# SCRAPER_WORKERS > 0 时 Chrome 由独立的 worker 进程驱动，bot 进程只负责分发
+worker_farm = WorkerFarm.from_env() if WorkerFarm.enabled() else None
+
+
+def browser_search(query, page=1):
+    """在调度器的线程里执行一次浏览器抓取（worker 进程或本进程的浏览器池）"""
+    if worker_farm is not None:
+        return worker_farm.search_telegram(query, page)
+    return load_scraper().search_telegram(query, page)
+
+
+async def scrape(query, page=1, user_id=None, background=False, admit=None):
+    """执行一次真实抓取并写入缓存（相同关键词的并发请求共享这一次调用）
+
+    background=True 时以低优先级排队（缓存预热用），不占用交互搜索的浏览器。
+    admit() 在真正把浏览器抓取放入调度器之前调用（用户限速），可以抛 RateLimited / SchedulerBusy。
+    """
+    led = False
+
+    async def run():
+        nonlocal led
+        led = True
+
+        async def run_selenium(q, p):
+            if admit is not None:
+                admit()
+            return await scheduler.run(user_id, browser_search, q, p, background=background)
+
+        try:
+            # tse 来源先走无浏览器的快速路径，失败时自动回退到 Selenium（经由调度器）
+            results, by_source = await federated.search_detailed(query, page, run_selenium=run_selenium)
+        except (SchedulerBusy, RateLimited, CircuitOpen, NavigationTimeout):
+            # 过载拒绝和限速不是站点故障；上游超时由熔断器处理。都不写负缓存（也不覆盖可以兜底的旧结果）
+            raise
+        except Exception as e:
+            result_cache.put_error(query, page, e)
+            raise
+        remote = federated.remote_results(by_source)
+        if remote is None:
+            # 只有本地语料库给出了结果：上游没有确认，不当作新鲜结果缓存，也不再写回语料库
+            return results
+        if getattr(results, "timed_out", False):
+            # 页面加载或渲染超时：结果不完整（可能为空），照常返回，但不缓存（空结果会变成负缓存），也不写回语料库
+            return results
+        result_cache.put(query, page, results)
+        # 只把上游真正返回的结果写回语料库，语料库自己的旧结果不重复计数
+        corpus.add(remote)
+        return results
+
+    # 后台刷新用单独的 key：交互搜索不会加入低优先级的预热任务（否则会跟着它排在所有交互任务之后，等待没有上限）
+    key = cache_key(query, page)
+    key = "warm\x1f" + key if background else key
+    while True:
+        try:
+            return await search_flights.do(key, run)
+        except RateLimited:
+            if led:
+                raise
+            # 加入的是别人发起的抓取，被限速的是发起者：自己重新发起（或加入新的）抓取，按自己的令牌准入
+
+
+# 热门查询的缓存快过期时在后台提前刷新
+warmer = CacheWarmer.from_env(result_cache, lambda query: scrape(query, background=True))
+
+
+# 分页：每次搜索的结果集保存在一个短 token 下，翻页时直接编辑原消息
+result_sessions = ResultSessionStore.from_env()
+
+
+def scraper_state(read):
+    """读取 scraper 里的统计；scraper 还没加载时返回空字典（/metrics 不会因此触发导入）"""
+    module = loaded_scraper()
+    return read(module) if module is not None else {}
+
+
+# /metrics 导出各组件已有的统计（抓取时才读取）
+metrics.REGISTRY.callback("startup_state", "Startup stage durations and readiness", STARTUP.snapshot, label="stat")
+metrics.REGISTRY.callback("result_cache_state", "Result cache counters and size", result_cache.snapshot, label="stat")
+metrics.REGISTRY.callback("scheduler_state", "Scrape scheduler counters and queue state", scheduler.snapshot, label="stat")
+metrics.REGISTRY.callback("singleflight_state", "Coalesced scrape counters", search_flights.snapshot, label="stat")
+metrics.REGISTRY.callback(
+    "active_searches_state", "Per-chat searches and searches superseded by a newer query",
+    active_searches.snapshot, label="stat",
+)
+metrics.REGISTRY.callback(
+    "driver_pool_state", "Browser pool state", lambda: scraper_state(lambda s: s.pool_snapshot()), label="stat"
+)
+metrics.REGISTRY.callback(
+    "browser_memory_state", "Browser fleet memory and recycling",
+    lambda: scraper_state(lambda s: s.memory_snapshot()), label="stat",
+)
+metrics.REGISTRY.callback(
+    "browser_rss_bytes", "RSS of each browser process tree",
+    lambda: scraper_state(lambda s: s.browser_memory()), label="browser",
+)
+metrics.REGISTRY.callback(
+    "browser_cache_state", "Shared browser disk cache: profile templates and cache hit ratio",
+    lambda: scraper_state(lambda s: s.profile_cache_snapshot()), label="stat",
+)
+metrics.REGISTRY.callback(
+    "fast_path_events", "Fast path successes and fallbacks",
+    lambda: scraper_state(lambda s: s.fast_path_stats), "counter", "stat",
+)
+if worker_farm is not None:
+    metrics.REGISTRY.callback("worker_farm_state", "Scraper worker processes", worker_farm.snapshot, label="stat")
+metrics.REGISTRY.callback(
+    "search_source_state", "Per-source search stats", federated.snapshot, label="source", sublabel="stat"
+)
+metrics.REGISTRY.callback("corpus_state", "Local corpus index", corpus.snapshot, label="stat")
+metrics.REGISTRY.callback(
+    "render_wait_state", "Adaptive render wait deadline",
+    lambda: scraper_state(lambda s: s.get_render_timer().snapshot()), label="stat",
+)
+metrics.REGISTRY.callback(
+    "site_breaker_state", "Upstream circuit breaker (state: 0 closed, 1 half open, 2 open)",
+    lambda: scraper_state(lambda s: s.get_site_breaker().snapshot()), label="stat",
+)
+metrics.REGISTRY.callback("browser_watchdog_state", "Browsers killed after a stage deadline", lambda: get_watchdog().snapshot(), label="stat")
+
+STARTUP.mark("components")
+
+
+async def cached_scrape(query, page=1, user_id=None):
+    """先查缓存，未命中再抓取"""
+    entry = result_cache.get(query, page)
+    if entry is None:
+        return await scrape(query, page, user_id=user_id)
+    if entry.error is not None:
+        raise RuntimeError(entry.error)
+    return entry.results
+
+
+def render_results_page(session, index):
+    """生成结果集第 index 页（从 0 开始）的消息文本和翻页键盘"""
+    per_page = max(1, env_int("RESULTS_PER_PAGE", 10))
+    more = not session.exhausted and session.source_pages < env_int("PAGINATION_MAX_PAGES", 5)
+    total = len(session.results)
+    page_count = max(1, (total + per_page - 1) // per_page)
+    index = max(0, min(index, page_count - 1))
+    start = index * per_page
+    plus = "+" if more else ""
+
+    text = f"🔍 **搜索结果：{session.query}** (共 {total}{plus} 个)\n\n"
+    for i, item in enumerate(session.results[start:start + per_page], start + 1):
+        text += f"{i}. [{item['title']}]({item['link']})\n"
+
+    # 添加页脚
+    text += "\n---\n💬 继续输入其他关键词继续搜索"
+
+    buttons = []
+    if index > 0:
+        buttons.append(InlineKeyboardButton(text="⬅️ 上一页", callback_data=f"pg:{session.token}:{index - 1}"))
+    if index + 1 < page_count or more:
+        buttons.append(InlineKeyboardButton(text="下一页 ➡️", callback_data=f"pg:{session.token}:{index + 1}"))
+    if not buttons:
+        return text, None
+    # 中间的页码按钮只做展示
+    counter = InlineKeyboardButton(text=f"{index + 1}/{page_count}{plus}", callback_data="pg:noop")
+    buttons.insert(1 if index > 0 else 0, counter)
+    return text, InlineKeyboardMarkup(inline_keyboard=[buttons])
+
+
+def render_known(query, known, note):
+    """语料库里的已知结果（实时搜索进行中、失败或排队时显示）"""
+    text = f"🔍 {query}\n{note}\n\n📚 之前收录的相关结果：\n"
+    for i, item in enumerate(known, 1):
+        text += f"{i}. [{item['title']}]({item['link']})\n"
+    return text
+
+
+def render_partial(query, results):
+    """流式显示：搜索还没结束时占位消息里显示的内容"""
+    per_page = max(1, env_int("RESULTS_PER_PAGE", 10))
+    text = f"🔍 正在搜索：{query}\n已找到 {len(results)} 个结果，继续加载中…\n\n"
+    for i, item in enumerate(results[:per_page], 1):
+        text += f"{i}. [{item['title']}]({item['link']})\n"
+    return text
+
+
+def start_prefetch(session, user_id=None):
+    """后台预取下一批搜索引擎页面，用户翻到时结果已经在会话里"""
+    if session.prefetch is not None and not session.prefetch.done():
+        return
+    if session.exhausted or session.source_pages >= env_int("PAGINATION_MAX_PAGES", 5):
+        return
+    session.prefetch = asyncio.ensure_future(prefetch_pages(session, user_id))
+
+
+async def prefetch_pages(session, user_id=None):
+    max_pages = env_int("PAGINATION_MAX_PAGES", 5)
+    last = min(max_pages, session.source_pages + max(1, env_int("PAGINATION_PREFETCH_PAGES", 1)))
+    for page in range(session.source_pages + 1, last + 1):
+        try:
+            results = await cached_scrape(session.query, page, user_id=user_id)
+        except Exception as e:
+            print(f"预取第 {page} 页失败: {e}")
+            return
+        session.source_pages = page
+        if not results or session.extend(results) == 0:
+            # 没有新结果，说明搜索引擎已经到底了
+            session.exhausted = True
+            return
+
 
 # @dp.message() 是装饰器（decorator）
 # dp 是 Dispatcher 对象，用于管理机器人的消息路由
@@ -59,7 +302,7 @@ async def help_handler(msg: Message):
 
 **提示：**
 💡 搜索结果会自动去重，避免重复显示
-💡 最多显示前20个最相关的结果
+💡 结果较多时点击 ⬅️ / ➡️ 按钮翻页
 💡 如果找不到结果，请尝试其他关键词
 
 ❓ 有问题？可以直接输入你想要搜索的内容！
@@ -118,30 +361,223 @@ async def search_handler(msg: Message):
     if not query:
         return
 
-    await msg.reply(f"🔍 正在搜索：{query}\n请稍候…")
-
+    user_id = msg.from_user.id if msg.from_user else msg.chat.id
+    trace = metrics.start_trace(query, user_id=user_id)
+    # 在第一个 await 之前登记：按 message_id 取代同一聊天里更早的搜索
+    search = active_searches.start(msg.chat.id, msg.message_id)
     try:
-        # 在线程池运行 search_telegram，避免阻塞
-        loop = asyncio.get_event_loop()
-        results = await loop.run_in_executor(None, search_telegram, query)
-    except Exception as e:
-        print(f"搜索错误: {e}")
-        await msg.reply(f"❌ 搜索失败\n\n错误信息：\n{str(e)}")
+        if search.superseded:
+            # 同一聊天里更新的消息已经先开始处理了：这条旧消息不再搜索
+            trace.outcome = "superseded"
+            return
+        await _handle_search(msg, query, user_id, trace, search)
+    except Exception:
+        trace.outcome = "error"
+        raise
+    finally:
+        active_searches.finish(search)
+        metrics.finish_trace(trace)
+
+
+async def _handle_search(msg, query, user_id, trace, search):
+    stream = None
+    listener = None
+    known = []
+    footer = None
+
+    async def respond(text, parse_mode=None, disable_web_page_preview=None, reply_markup=None):
+        # 有占位消息时编辑它；编辑失败（或没有占位消息）才发新消息
+        if stream is not None and await stream.finish(text, reply_markup=reply_markup, parse_mode=parse_mode):
+            return
+        await msg.reply(
+            text, parse_mode=parse_mode, disable_web_page_preview=disable_web_page_preview, reply_markup=reply_markup
+        )
+
+    async def respond_with_known(note):
+        # 实时搜索没有结果（排队、失败、为空）时，把语料库里的已知结果一起发出去
+        if known:
+            text = render_known(query, known, note)
+            await respond(text, parse_mode="Markdown", disable_web_page_preview=True)
+        else:
+            await respond(note)
+
+    # 统计查询热度，供后台预热使用
+    warmer.record(query)
+
+    # SEARCH_PAGES > 1 时并发抓取多页并合并（每页单独缓存）
+    pages = max(1, env_int("SEARCH_PAGES", 1))
+    cached_pages = [result_cache.get(query, page) for page in range(1, pages + 1)]
+    cached = cached_pages[0]
+    if cached is not None and cached.error is not None:
+        # 负缓存：同一个关键词刚刚失败过，短时间内直接返回错误
+        trace.outcome = "cached_error"
+        await msg.reply(f"❌ 搜索失败\n\n错误信息：\n{cached.error}")
         return
 
+    if all(entry is not None for entry in cached_pages):
+        trace.outcome = "cache_hit"
+        results = merge_pages(entry.results for entry in cached_pages)
+    else:
+        # 本地语料库的查询是毫秒级的，实时搜索之前先查
+        known = corpus.search(query, max(1, env_int("CORPUS_KNOWN_RESULTS", 10)))
+        admitted = False
+
+        def admit():
+            # 只有真正要排队打开浏览器时才占用用户的令牌（快速路径成功、加入别人的抓取都不算）；
+            # 多页搜索只算一次
+            nonlocal admitted
+            if not admitted:
+                scheduler.admit(user_id)
+                admitted = True
+
+        position = scheduler.estimate_position(user_id)
+        waiting = f"\n排队中，前面还有 {position - 1} 个搜索" if position > 1 else ""
+        if not STARTUP.ready:
+            # 刚启动：scraper 还在加载或浏览器还在预热，这次搜索会慢一些
+            trace.fields["warming_up"] = 1
+            waiting += "\n🔥 机器人刚启动，正在预热浏览器，这次搜索会稍慢"
+        if known:
+            # 先把已知结果发出去，实时结果到了再替换
+            placeholder = await msg.reply(
+                render_known(query, known, f"正在实时搜索，请稍候…{waiting}"),
+                parse_mode="Markdown",
+                disable_web_page_preview=True,
+            )
+        else:
+            placeholder = await msg.reply(f"🔍 正在搜索：{query}\n请稍候…{waiting}")
+
+        # 流式显示：抓到的部分结果直接编辑进占位消息，最后一次编辑换成完整结果
+        if streaming_enabled():
+            stream = StreamingMessage.from_env(placeholder, lambda partial: render_partial(query, partial))
+            listener = progress.set_listener(stream.listener())
+
+        async def search_page(q, page):
+            entry = cached_pages[page - 1]
+            if entry is None:
+                results = await scrape(q, page, user_id=user_id, admit=admit)
+            elif entry.error is not None:
+                raise RuntimeError(entry.error)
+            else:
+                results = entry.results
+            if stream is not None:
+                stream.update(page, results)
+            return results
+
+        async def live_search():
+            scraper = await get_scraper()
+            return await scraper.search_pages(query, pages, env_float("SEARCH_DEADLINE", 60.0), search_page)
+
+        try:
+            results = await active_searches.run(search, live_search())
+        except SearchSuperseded:
+            # 用户已经发了新的关键词：不再回复这次的结果，只把占位消息改成已取消
+            trace.outcome = "superseded"
+            note = f"⏹ 已取消：{query}\n你发起了新的搜索"
+            if stream is not None:
+                await stream.finish(note, parse_mode=None)
+            else:
+                try:
+                    await placeholder.edit_text(note)
+                except TelegramBadRequest as e:
+                    print(f"更新已取消的占位消息失败: {e}")
+            return
+        except SchedulerBusy as e:
+            trace.outcome = "busy"
+            await respond_with_known(f"⏳ 当前搜索人数较多，你排在第 {e.position} 位，请稍后再试")
+            return
+        except RateLimited as e:
+            trace.outcome = "rate_limited"
+            await respond_with_known(f"⏳ 搜索太频繁了，请 {e.retry_after:.0f} 秒后再试")
+            return
+        except CircuitOpen as e:
+            # 站点持续超时：用过期的缓存结果（没有就用语料库）兜底，不再等待
+            stale = [result_cache.get_stale(query, page) for page in range(1, pages + 1)]
+            results = merge_pages(entry.results if entry else None for entry in stale)
+            if not results:
+                trace.outcome = "corpus_fallback" if known else "circuit_open"
+                await respond_with_known(f"⚠️ 搜索站点暂时没有响应，约 {e.retry_after:.0f} 秒后恢复实时搜索")
+                return
+            trace.outcome = "stale_cache"
+            age = time.time() - min(entry.created_at for entry in stale if entry)
+            footer = f"\n⚠️ 搜索站点暂时没有响应，以上是 {age / 60:.0f} 分钟前的结果"
+        except Exception as e:
+            print(f"搜索错误: {e}")
+            trace.outcome = "corpus_fallback" if known else "error"
+            await respond_with_known(f"❌ 搜索失败\n\n错误信息：\n{str(e)}")
+            return
+        finally:
+            if listener is not None:
+                progress.reset_listener(listener)
+            if stream is not None and stream.time_to_first_result() is not None:
+                metrics.FIRST_RESULT_SECONDS.observe(stream.time_to_first_result())
+                trace.fields["first_result_ms"] = round(stream.time_to_first_result() * 1000, 2)
+
+    trace.results = len(results)
     if not results:
-        await msg.reply("⚠️ 没有找到相关频道或群。\n\n💡 提示：尝试使用不同的关键词或更简短的搜索词")
+        if trace.outcome == "ok":
+            trace.outcome = "empty"
+        await respond_with_known("⚠️ 没有找到相关频道或群。\n\n💡 提示：尝试使用不同的关键词或更简短的搜索词")
         return
 
-    text = f"🔍 **搜索结果：{query}** (共 {len(results)} 个)\n\n"
-    for i, item in enumerate(results, 1):
-        text += f"{i}. [{item['title']}]({item['link']})\n"
-    
-    # 添加页脚
-    text += "\n---\n💬 继续输入其他关键词继续搜索"
+    session = result_sessions.create(query, results, source_pages=pages)
+    text, markup = render_results_page(session, 0)
+    if footer is not None:
+        text += footer
+    elif stream is not None:
+        text += f"\n✅ 搜索完成（{trace.elapsed():.1f}s）"
+    with metrics.stage("telegram_reply"):
+        await respond(text, parse_mode="Markdown", disable_web_page_preview=True, reply_markup=markup)
+    # 用户看第一页的时候，后台继续抓下一页
+    start_prefetch(session, user_id)
+
+
+@dp.callback_query(F.data.startswith("pg:"))
+async def page_callback_handler(callback: CallbackQuery):
+    """处理翻页按钮：用保存的结果集编辑原消息，不重新抓取"""
+    parts = callback.data.split(":")
+    if len(parts) != 3 or not parts[2].isdigit():
+        await callback.answer()
+        return
 
-    await msg.reply(text, parse_mode="Markdown", disable_web_page_preview=True)
+    session = result_sessions.get(parts[1])
+    if session is None:
+        await callback.answer("结果已过期，请重新输入关键词搜索", show_alert=True)
+        return
 
+    index = int(parts[2])
+    per_page = max(1, env_int("RESULTS_PER_PAGE", 10))
+    user_id = callback.from_user.id if callback.from_user else None
+    answered = False
+    if (index + 1) * per_page > len(session.results):
+        # 要看的页还没抓到：确保预取在跑，并等它一会儿
+        start_prefetch(session, user_id)
+        if session.prefetch is not None and not session.prefetch.done():
+            # 回调必须在几秒内应答，否则 Telegram 会拒绝（query is too old）：先应答再等
+            await callback.answer("正在加载更多结果…")
+            answered = True
+            try:
+                await asyncio.wait_for(asyncio.shield(session.prefetch), env_float("PAGINATION_WAIT", 8.0))
+            except asyncio.TimeoutError:
+                pass
+
+    text, markup = render_results_page(session, index)
+    try:
+        await callback.message.edit_text(
+            text, parse_mode="Markdown", disable_web_page_preview=True, reply_markup=markup
+        )
+    except TelegramBadRequest as e:
+        # 内容没有变化（例如重复点击）时 Telegram 会返回 "message is not modified"
+        print(f"翻页编辑消息失败: {e}")
+    if not answered:
+        await callback.answer()
+
+    # 快翻到已有结果的末尾时，提前预取下一批
+    if (index + 2) * per_page >= len(session.results):
+        start_prefetch(session, user_id)
+
+
+def register_webhook_metrics(handler):
+    metrics.REGISTRY.callback("webhook_state", "Webhook updates and in-flight handlers", handler.snapshot, label="stat")
 
 
 async def main():
@@ -153,10 +589,44 @@ async def main():
         BotCommand(command="help", description="📖 查看使用说明"),
         BotCommand(command="search", description="🔍 搜索Telegram频道"),
     ]
-    await bot.set_my_commands(commands)
+    with STARTUP.stage("set_my_commands"):
+        await bot.set_my_commands(commands)
     print("✅ 菜单已设置")
-    
-    await dp.start_polling(bot)
+
+    # 后台：加载 scraper、预先启动浏览器；不等它完成就开始接收消息
+    browsers_ready = None
+    if worker_farm is not None:
+        worker_farm.start()
+        browsers_ready = lambda: worker_farm.snapshot()["workers_ready"] > 0
+    warmup = asyncio.ensure_future(prewarm(browsers_ready, env_float("STARTUP_WARM_TIMEOUT", 120.0)))
+
+    if CacheWarmer.enabled():
+        warmer.start()
+        print("✅ 缓存预热已启动")
+
+    metrics_runner = None
+    metrics_port = env_int("METRICS_PORT", 9108)
+    if metrics_port:
+        metrics_host = env_str("METRICS_HOST", "127.0.0.1")
+        metrics_runner = await metrics.start_http_server(metrics_host, metrics_port)
+        print(f"✅ 指标端点：http://{metrics_host}:{metrics_port}/metrics")
+
+    # 从组件初始化完成到开始接收消息（含 set_my_commands、指标端点）
+    STARTUP.mark("ready_for_updates")
+    try:
+        if webhook_enabled():
+            await run_webhook(dp, bot, on_handler=register_webhook_metrics)
+        else:
+            await dp.start_polling(bot)
+    finally:
+        warmup.cancel()
+        await warmer.stop()
+        if loaded_scraper() is not None:
+            await loaded_scraper().close_http_session()
+        if worker_farm is not None:
+            await asyncio.get_running_loop().run_in_executor(None, worker_farm.close)
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
 
 if __name__ == "__main__":
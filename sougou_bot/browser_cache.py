@@ -0,0 +1,280 @@
+# browser_cache.py
+# 浏览器磁盘缓存（HTTP 缓存 + V8 编译代码缓存）在浏览器之间共享，进程重启后仍然保留。
+#
+# 不指定 user-data-dir 时，每个 Chrome 都使用一个空的临时 profile：站点的页面外壳和内嵌的
+# Google CSE 脚本每次都要重新下载、重新编译。Chrome 不允许多个实例同时使用同一个 user-data-dir，
+# 所以这里采用“模板 + 启动时复制”的方式：
+# - root/templates/<版本>/ 是预热好的缓存，只包含 Default/Cache 和 Default/Code Cache，不含 cookies 等状态；
+#   root/CURRENT 记录当前版本，用原子替换的方式写入，多个进程（worker farm）可以同时读取
+# - 启动浏览器时把当前模板复制到 root/live/<pid>-<n>/，作为这个浏览器自己的 user-data-dir，
+#   所以新浏览器的第一次查询也能命中缓存
+# - 浏览器正常退出时，如果模板还不存在或已经过期（超过 refresh 秒），用它的缓存生成新版本的模板
+# - --disk-cache-size 限制每个浏览器的 HTTP 缓存；生成模板时超过 max_size 的部分按时间从旧到新删除
+# - 定期清理：已经退出的进程留下的 live 目录，以及不再使用的旧模板版本
+# - 命中率来自 performance 日志（lean_profile.collect_traffic），通过 /metrics 导出
+#
+# 配置（环境变量）：
+#   SCRAPER_PROFILE_CACHE=0            关闭（每个浏览器使用 Chrome 的临时 profile）
+#   SCRAPER_PROFILE_DIR                根目录（默认 sougou_bot/.browser_profiles）
+#   SCRAPER_PROFILE_CACHE_MB           每个浏览器和模板的缓存上限（默认 200）
+#   SCRAPER_PROFILE_REFRESH            模板多久用新的缓存更新一次（秒，默认 3600）
+#   SCRAPER_PROFILE_PRUNE_INTERVAL     两次清理之间的最小间隔（秒，默认 600）
+import itertools
+import os
+import shutil
+import threading
+import time
+
+from proctree import pid_alive
+from settings import env_bool, env_float, env_int, env_str
+
+_MB = 1024 * 1024
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".browser_profiles")
+
+# user-data-dir 里和缓存有关的目录；其余内容（cookies、storage、偏好设置）不进入模板
+CACHE_DIRS = (os.path.join("Default", "Cache"), os.path.join("Default", "Code Cache"))
+
+# Chrome simple cache 的索引文件：裁剪时保留，缺少的条目 Chrome 启动时会自行校正
+_INDEX_FILES = ("index", "the-real-index")
+
+
+def dir_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+class _Profile:
+    def __init__(self, path, template):
+        self.path = path
+        self.template = template  # 复制自哪个模板版本；None 表示从空 profile 启动
+
+
+class ProfileCache:
+    def __init__(self, root=DEFAULT_ROOT, max_size=200 * _MB, refresh=3600.0, prune_interval=600.0):
+        self.root = root
+        self.max_size = max_size
+        self.refresh = refresh
+        self.prune_interval = prune_interval
+        self.templates_dir = os.path.join(root, "templates")
+        self.live_dir = os.path.join(root, "live")
+        self._profiles = {}  # id(driver) -> _Profile
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._promote_lock = threading.Lock()
+        self._pruned_at = 0.0
+        self._template_bytes = None
+        self.stats = {
+            "warm_starts": 0,    # 从模板复制了缓存的浏览器
+            "cold_starts": 0,    # 没有可用模板，从空 profile 启动
+            "copy_failed": 0,
+            "promoted": 0,       # 生成新模板的次数
+            "pruned_dirs": 0,
+            "trimmed_bytes": 0,
+            "requests": 0,
+            "cache_hits": 0,
+        }
+        os.makedirs(self.templates_dir, exist_ok=True)
+        os.makedirs(self.live_dir, exist_ok=True)
+
+    @staticmethod
+    def enabled():
+        return env_bool("SCRAPER_PROFILE_CACHE", True)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            root=env_str("SCRAPER_PROFILE_DIR", DEFAULT_ROOT),
+            max_size=env_int("SCRAPER_PROFILE_CACHE_MB", 200) * _MB,
+            refresh=env_float("SCRAPER_PROFILE_REFRESH", 3600.0),
+            prune_interval=env_float("SCRAPER_PROFILE_PRUNE_INTERVAL", 600.0),
+        )
+
+    # ---------- 模板版本 ----------
+
+    def current_template(self):
+        """当前模板目录；还没有模板时返回 None"""
+        try:
+            with open(os.path.join(self.root, "CURRENT"), encoding="utf-8") as f:
+                version = f.read().strip()
+        except OSError:
+            return None
+        path = os.path.join(self.templates_dir, version)
+        return path if version and os.path.isdir(path) else None
+
+    def _template_stale(self):
+        template = self.current_template()
+        if template is None:
+            return True
+        try:
+            return time.time() - os.path.getmtime(template) >= self.refresh
+        except OSError:
+            return True
+
+    def _publish(self, version):
+        pointer = os.path.join(self.root, "CURRENT")
+        tmp_path = f"{pointer}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp_path, pointer)
+
+    # ---------- 浏览器启动 / 退出 ----------
+
+    def checkout(self):
+        """为一个新浏览器准备 user-data-dir（从当前模板复制），返回 _Profile"""
+        path = os.path.join(self.live_dir, f"{os.getpid()}-{next(self._ids)}")
+        template = self.current_template()
+        if template is not None:
+            try:
+                shutil.copytree(template, path)
+                self.stats["warm_starts"] += 1
+                return _Profile(path, template)
+            except (OSError, shutil.Error) as e:
+                # 模板可能刚好被另一个进程清理掉：用空 profile 启动
+                print(f"[profile] 复制缓存模板失败，使用空 profile: {e}")
+                self.stats["copy_failed"] += 1
+                shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+        self.stats["cold_starts"] += 1
+        return _Profile(path, None)
+
+    def arguments(self, profile):
+        """启动 Chrome 需要的参数"""
+        return [f"--user-data-dir={profile.path}", f"--disk-cache-size={self.max_size}"]
+
+    def attach(self, driver, profile):
+        with self._lock:
+            self._profiles[id(driver)] = profile
+
+    def discard(self, profile):
+        """浏览器没有启动成功：直接删掉准备好的目录"""
+        shutil.rmtree(profile.path, ignore_errors=True)
+
+    def checkin(self, driver, harvest=True):
+        """浏览器已经退出时调用：需要时把它的缓存做成新模板，然后删除它的目录。
+
+        harvest=False 用于异常退出（被 watchdog 杀掉等）的浏览器，它的缓存不一定完整。
+        """
+        with self._lock:
+            profile = self._profiles.pop(id(driver), None)
+        if profile is None:
+            return
+        try:
+            if harvest and self._template_stale():
+                self._promote(profile.path)
+        finally:
+            shutil.rmtree(profile.path, ignore_errors=True)
+        self.maybe_prune()
+
+    def _promote(self, source):
+        # 同一进程里同时退出的多个浏览器只需要一个生成模板
+        if not self._promote_lock.acquire(blocking=False):
+            return
+        try:
+            if not self._template_stale():
+                return
+            version = f"{int(time.time() * 1000)}-{os.getpid()}"
+            staging = os.path.join(self.templates_dir, version + ".tmp")
+            copied = False
+            for name in CACHE_DIRS:
+                if os.path.isdir(os.path.join(source, name)):
+                    shutil.copytree(os.path.join(source, name), os.path.join(staging, name))
+                    copied = True
+            if not copied:
+                return
+            self._trim(staging)
+            os.rename(staging, os.path.join(self.templates_dir, version))
+            self._publish(version)
+            self._template_bytes = dir_size(os.path.join(self.templates_dir, version))
+            self.stats["promoted"] += 1
+            print(f"[profile] 新的缓存模板 {version}（{self._template_bytes / _MB:.1f} MB）")
+        except (OSError, shutil.Error) as e:
+            print(f"[profile] 生成缓存模板失败: {e}")
+        finally:
+            self._promote_lock.release()
+
+    def _trim(self, path):
+        """缓存超过 max_size 时，按修改时间从旧到新删除缓存条目"""
+        if not self.max_size:
+            return
+        files = []
+        for dirpath, _, filenames in os.walk(path):
+            for name in filenames:
+                if name in _INDEX_FILES:
+                    continue
+                full = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, full))
+        total = sum(size for _, size, _ in files)
+        for _, size, full in sorted(files):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(full)
+            except OSError:
+                continue
+            total -= size
+            self.stats["trimmed_bytes"] += size
+
+    # ---------- 清理 ----------
+
+    def maybe_prune(self, force=False):
+        """删除已经退出的进程留下的 live 目录和旧模板（距离上次清理不足 prune_interval 秒时跳过）"""
+        now = time.monotonic()
+        if not force and now - self._pruned_at < self.prune_interval:
+            return
+        self._pruned_at = now
+
+        for name in os.listdir(self.live_dir):
+            pid = name.split("-", 1)[0]
+            if pid.isdigit() and int(pid) != os.getpid() and not pid_alive(int(pid)):
+                shutil.rmtree(os.path.join(self.live_dir, name), ignore_errors=True)
+                self.stats["pruned_dirs"] += 1
+
+        # 旧版本可能还有其他进程正在复制：只删除一段时间以前的
+        current = self.current_template()
+        cutoff = time.time() - max(60.0, self.prune_interval)
+        for name in os.listdir(self.templates_dir):
+            path = os.path.join(self.templates_dir, name)
+            if path == current:
+                continue
+            try:
+                old = os.path.getmtime(path) < cutoff
+            except OSError:
+                continue
+            if old:
+                shutil.rmtree(path, ignore_errors=True)
+                self.stats["pruned_dirs"] += 1
+
+    # ---------- 观测 ----------
+
+    def record(self, traffic):
+        """记录一次查询的请求数和缓存命中数（lean_profile.TrafficStats）"""
+        self.stats["requests"] += traffic.requests
+        self.stats["cache_hits"] += traffic.cached
+
+    def hit_ratio(self):
+        requests = self.stats["requests"]
+        return self.stats["cache_hits"] / requests if requests else 0.0
+
+    def snapshot(self):
+        if self._template_bytes is None:
+            template = self.current_template()
+            self._template_bytes = dir_size(template) if template else 0
+        with self._lock:
+            live = len(self._profiles)
+        return dict(
+            self.stats,
+            live_profiles=live,
+            template_bytes=self._template_bytes,
+            hit_ratio=round(self.hit_ratio(), 4),
+        )
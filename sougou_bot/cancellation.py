@@ -0,0 +1,47 @@
+# cancellation.py
+# 取消已经在抓取线程里运行的搜索（例如用户发了新的关键词，上一次搜索已经没人要了）。
+#
+# asyncio 这边取消很简单，但 Selenium 调用在调度器的线程里阻塞运行，取消不到。
+# 调度器给每个任务一个 CancelToken，和 progress 的监听器一样通过 contextvars 带进抓取线程；
+# 调度器的 Future 被取消时令牌被触发，scraper 在各阶段之间（以及等待渲染的轮询里）
+# 调用 check()，抛出 SearchCancelled，浏览器停止加载后照常归还到池里。
+import contextvars
+import threading
+
+_token = contextvars.ContextVar("search_cancel", default=None)
+
+
+class SearchCancelled(RuntimeError):
+    """搜索已经被取消（没有人再等待它的结果）"""
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise SearchCancelled("搜索已被取消")
+
+
+def bind(token):
+    """把 token 设为当前上下文（抓取线程）的取消令牌"""
+    _token.set(token)
+
+
+def current():
+    return _token.get()
+
+
+def check():
+    """当前任务已被取消时抛 SearchCancelled；不在调度器任务里运行时什么也不做"""
+    token = _token.get()
+    if token is not None:
+        token.check()
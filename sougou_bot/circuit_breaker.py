@@ -0,0 +1,164 @@
+# circuit_breaker.py
+# 上游站点的熔断器：站点持续超时的时候不再把浏览器和线程送进去等死。
+#
+# 三种状态：
+# - closed     正常放行；记录最近的结果，窗口内超时次数达到阈值 -> open
+# - open       直接拒绝（抛 CircuitOpen，调用方改用缓存 / 语料库里的结果），持续 cooldown 秒
+# - half_open  冷却结束后只放行少量探测请求：连续 probes 次成功 -> closed，任何一次超时 -> 重新 open
+#
+# 只有“上游超时”（NavigationTimeout 等）计入失败；本机过载、解析失败之类的错误不影响熔断状态。
+import threading
+import time
+from collections import deque
+
+from settings import env_float, env_int
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(RuntimeError):
+    """熔断中：上游站点最近持续超时，暂时不发起请求"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} 最近持续超时，暂停实时搜索（约 {retry_after:.0f}s 后重试）")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name="upstream", threshold=3, window=10, cooldown=60.0, probes=2, max_cooldown=600.0):
+        self.name = name
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.max_cooldown = max(cooldown, max_cooldown)
+        self.probes = max(1, probes)
+        self._outcomes = deque(maxlen=max(self.threshold, window))  # True = 超时
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._current_cooldown = cooldown
+        self._probes_inflight = 0
+        self._probe_successes = 0
+        self.stats = {"allowed": 0, "rejected": 0, "timeouts": 0, "opened": 0, "closed": 0, "probes": 0}
+
+    @classmethod
+    def from_env(cls, name="upstream"):
+        return cls(
+            name,
+            threshold=env_int("BREAKER_THRESHOLD", 3),
+            window=env_int("BREAKER_WINDOW", 10),
+            cooldown=env_float("BREAKER_COOLDOWN", 60.0),
+            probes=env_int("BREAKER_PROBES", 2),
+            max_cooldown=env_float("BREAKER_MAX_COOLDOWN", 600.0),
+        )
+
+    # ---------- 状态 ----------
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def retry_after(self):
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self._current_cooldown - time.monotonic())
+
+    def _maybe_half_open(self):
+        # 调用前必须持有 self._lock
+        if self._state == OPEN and time.monotonic() >= self._opened_at + self._current_cooldown:
+            self._state = HALF_OPEN
+            self._probes_inflight = 0
+            self._probe_successes = 0
+            print(f"[breaker] {self.name} 冷却结束，开始探测")
+
+    def _open(self, reason):
+        # 调用前必须持有 self._lock
+        if self._state == HALF_OPEN:
+            # 探测失败：冷却时间加倍，避免每隔一小段时间就有一批请求被拖住
+            self._current_cooldown = min(self.max_cooldown, self._current_cooldown * 2)
+        else:
+            self._current_cooldown = self.cooldown
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.stats["opened"] += 1
+        print(f"[breaker] {self.name} {reason}，熔断 {self._current_cooldown:.0f}s")
+
+    # ---------- 调用方接口 ----------
+
+    def allow(self):
+        """请求前调用：放行时返回 True（探测请求）或 False（正常请求），熔断中抛 CircuitOpen。
+
+        放行之后必须调用一次 success() / timeout() / release()，并把返回值原样传回。
+        """
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                self.stats["allowed"] += 1
+                return False
+            if self._state == HALF_OPEN and self._probes_inflight < self.probes - self._probe_successes:
+                self._probes_inflight += 1
+                self.stats["allowed"] += 1
+                self.stats["probes"] += 1
+                return True
+            self.stats["rejected"] += 1
+            if self._state == OPEN:
+                retry_after = self._opened_at + self._current_cooldown - time.monotonic()
+            else:
+                # 探测进行中：大约一个冷却周期内会有结论
+                retry_after = self.cooldown
+            raise CircuitOpen(self.name, max(0.0, retry_after))
+
+    def success(self, probe=False):
+        with self._lock:
+            if probe:
+                self._probes_inflight -= 1
+                if self._state == HALF_OPEN:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.probes:
+                        self._state = CLOSED
+                        self._current_cooldown = self.cooldown
+                        self.stats["closed"] += 1
+                        print(f"[breaker] {self.name} 探测成功，恢复正常")
+                return
+            if self._state == CLOSED:
+                self._outcomes.append(False)
+
+    def timeout(self, probe=False):
+        with self._lock:
+            self.stats["timeouts"] += 1
+            if probe:
+                self._probes_inflight -= 1
+                if self._state == HALF_OPEN:
+                    self._open("探测请求超时")
+                return
+            if self._state != CLOSED:
+                return
+            self._outcomes.append(True)
+            if self._outcomes.count(True) >= self.threshold:
+                self._open(f"最近 {len(self._outcomes)} 次请求中 {self._outcomes.count(True)} 次超时")
+
+    def release(self, probe=False):
+        """请求以与上游健康无关的方式结束（本机过载、被取消等）：不计入统计，只归还探测名额"""
+        if probe:
+            with self._lock:
+                self._probes_inflight -= 1
+
+    def snapshot(self):
+        with self._lock:
+            self._maybe_half_open()
+            retry_after = 0.0
+            if self._state == OPEN:
+                retry_after = max(0.0, self._opened_at + self._current_cooldown - time.monotonic())
+            return dict(
+                self.stats,
+                state=_STATE_CODES[self._state],
+                retry_after=round(retry_after, 1),
+                recent_timeouts=self._outcomes.count(True),
+            )
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# corpus_index.py
+# 本地语料库：保存抓取到过的每一个频道/群组（title + link），用 SQLite FTS5 做全文检索。
+#
+# - 按规范化的 t.me 链接去重（https、t.me 域名、去掉 /s/ 前缀、查询参数和结尾斜杠，
+#   公开用户名不区分大小写），记录首次 / 最近一次出现的时间和出现次数
+# - 中文没有空格分词，FTS5 自带的 unicode61 会把一整段汉字当成一个词，
+#   所以索引前先自己切词：连续的 CJK 字符切成重叠的二元组（bigram），
+#   其他文字按单词小写；查询用同样的方式切词后做 AND 匹配，单个汉字用前缀匹配
+# - bot 在实时抓取完成之前先用它给出“已知结果”，抓取失败时也可以用它兜底
+#
+# 命令行：
+#   python corpus_index.py search 六合彩
+#   python corpus_index.py backfill [search_cache.sqlite3]     # 从结果缓存导入
+#   python corpus_index.py stats
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import urllib.parse
+
+from settings import env_str
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus.sqlite3")
+
+_TELEGRAM_HOSTS = {"t.me", "www.t.me", "telegram.me", "www.telegram.me", "telegram.dog"}
+
+# CJK 统一表意文字（含扩展 A）、兼容表意文字、假名、韩文音节
+_CJK = "㐀-䶿一-鿿豈-﫿぀-ヿ가-힯"
+_TOKEN_RE = re.compile(f"[{_CJK}]+|[^\\W_]+", re.UNICODE)
+_CJK_RE = re.compile(f"[{_CJK}]")
+
+
+def canonical_link(link):
+    """规范化链接，用作去重键；非 Telegram 链接只去掉片段和结尾斜杠"""
+    link = (link or "").strip()
+    parts = urllib.parse.urlsplit(link if "://" in link else "https://" + link)
+    host = parts.netloc.lower()
+    if host not in _TELEGRAM_HOSTS:
+        return urllib.parse.urlunsplit((parts.scheme.lower(), host, parts.path.rstrip("/"), parts.query, ""))
+
+    segments = [s for s in parts.path.split("/") if s]
+    if segments[:1] == ["s"]:
+        # t.me/s/name 是频道的网页预览
+        segments = segments[1:]
+    if segments and segments[0] not in ("joinchat", "addlist") and not segments[0].startswith("+"):
+        # 公开用户名不区分大小写；邀请链接的 hash 区分大小写，保持原样
+        segments[0] = segments[0].lower()
+    return "https://t.me/" + "/".join(segments)
+
+
+def tokenize(text):
+    """切词：CJK 连续片段 -> 重叠二元组（单字保留原样），其他 -> 小写单词"""
+    tokens = []
+    for run in _TOKEN_RE.findall((text or "").casefold()):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def build_match_query(query):
+    """把用户的查询词转换成 FTS5 MATCH 表达式；没有可用的词时返回 None"""
+    terms = []
+    for token in dict.fromkeys(tokenize(query)):
+        quoted = '"' + token.replace('"', '""') + '"'
+        # 单个字符用前缀匹配（例如单个汉字能命中以它开头的 bigram）
+        if len(token) == 1:
+            quoted += "*"
+        terms.append(quoted)
+    return " AND ".join(terms) if terms else None
+
+
+class CorpusIndex:
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self._lock = threading.Lock()
+        self._db = None
+        self.fts = False
+        self.stats = {"added": 0, "updated": 0, "queries": 0, "query_hits": 0, "errors": 0}
+        if db_path:
+            self._open_db(db_path)
+
+    @classmethod
+    def from_env(cls):
+        db_path = env_str("CORPUS_DB_PATH", DEFAULT_DB_PATH)
+        if db_path.lower() in ("off", "none", "0"):
+            db_path = None
+        return cls(db_path=db_path)
+
+    @property
+    def enabled(self):
+        return self._db is not None
+
+    def _open_db(self, db_path):
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS channels ("
+                " id INTEGER PRIMARY KEY,"
+                " link TEXT NOT NULL UNIQUE,"
+                " title TEXT NOT NULL,"
+                " first_seen REAL NOT NULL,"
+                " last_seen REAL NOT NULL,"
+                " seen_count INTEGER NOT NULL DEFAULT 1)"
+            )
+            try:
+                # rowid 与 channels.id 相同；tokens 是切好词、用空格连接的文本。
+                # prefix='1' 给单字前缀查询建索引，避免扫描所有以该字开头的词
+                self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS channels_fts USING fts5(tokens, prefix='1')")
+                self.fts = True
+            except sqlite3.OperationalError as e:
+                # 没有编译 FTS5 的 SQLite：退化为 LIKE 查询（数据量大时会变慢）
+                print(f"[corpus] SQLite 不支持 FTS5，使用 LIKE 查询: {e}")
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"[corpus] 无法打开语料库 {db_path}，不使用本地索引: {e}")
+            self._db = None
+
+    # ---------- 写入 ----------
+
+    def add(self, results, seen_at=None):
+        """记录一批抓取结果（list[{"title", "link"}]），返回新增的条目数"""
+        if self._db is None or not results:
+            return 0
+        now = time.time() if seen_at is None else seen_at
+        added = updated = 0
+        with self._lock:
+            try:
+                with self._db:
+                    for item in results:
+                        link = canonical_link(item.get("link"))
+                        title = " ".join((item.get("title") or "").split())
+                        if not title or link == "https://t.me/":
+                            continue
+                        row = self._db.execute("SELECT id, title FROM channels WHERE link = ?", (link,)).fetchone()
+                        if row is None:
+                            cursor = self._db.execute(
+                                "INSERT INTO channels (link, title, first_seen, last_seen) VALUES (?, ?, ?, ?)",
+                                (link, title, now, now),
+                            )
+                            self._index(cursor.lastrowid, title, link)
+                            added += 1
+                            continue
+                        self._db.execute(
+                            "UPDATE channels SET last_seen = max(last_seen, ?), seen_count = seen_count + 1,"
+                            " title = ? WHERE id = ?",
+                            (now, title, row[0]),
+                        )
+                        if row[1] != title:
+                            # 标题变了：重建这一行的索引
+                            if self.fts:
+                                self._db.execute("DELETE FROM channels_fts WHERE rowid = ?", (row[0],))
+                            self._index(row[0], title, link)
+                        updated += 1
+            except sqlite3.Error as e:
+                self.stats["errors"] += 1
+                print(f"[corpus] 写入语料库失败: {e}")
+                return 0
+            self.stats["added"] += added
+            self.stats["updated"] += updated
+        return added
+
+    def _index(self, rowid, title, link):
+        if not self.fts:
+            return
+        # 用户名也可以搜到（例如搜 python 能命中 t.me/python_cn）
+        username = link.rsplit("/", 1)[-1] if link.startswith("https://t.me/") else ""
+        tokens = tokenize(title) + tokenize(username.replace("_", " "))
+        self._db.execute("INSERT INTO channels_fts (rowid, tokens) VALUES (?, ?)", (rowid, " ".join(tokens)))
+
+    # ---------- 查询 ----------
+
+    def search(self, query, limit=20):
+        """返回 list[{"title", "link"}]，按相关度（BM25）排序，相同相关度时最近出现的在前"""
+        if self._db is None:
+            return []
+        self.stats["queries"] += 1
+        try:
+            with self._lock:
+                if self.fts:
+                    match = build_match_query(query)
+                    if match is None:
+                        return []
+                    rows = self._db.execute(
+                        "SELECT c.title, c.link FROM channels_fts f JOIN channels c ON c.id = f.rowid"
+                        " WHERE channels_fts MATCH ? ORDER BY bm25(channels_fts), c.last_seen DESC LIMIT ?",
+                        (match, limit),
+                    ).fetchall()
+                else:
+                    pattern = "%" + " ".join(query.split()).replace("%", "").replace("_", "") + "%"
+                    rows = self._db.execute(
+                        "SELECT title, link FROM channels WHERE title LIKE ? ORDER BY last_seen DESC LIMIT ?",
+                        (pattern, limit),
+                    ).fetchall()
+        except sqlite3.Error as e:
+            self.stats["errors"] += 1
+            print(f"[corpus] 查询语料库失败: {e}")
+            return []
+        if rows:
+            self.stats["query_hits"] += 1
+        return [{"title": title, "link": link} for title, link in rows]
+
+    def count(self):
+        if self._db is None:
+            return 0
+        with self._lock:
+            # max(id) 不需要扫描全表（几百万条时 COUNT(*) 很慢）；没有删除操作，两者相等
+            return self._db.execute("SELECT coalesce(max(id), 0) FROM channels").fetchone()[0]
+
+    def snapshot(self):
+        return dict(self.stats, entries=self.count(), fts=int(self.fts))
+
+    def optimize(self):
+        """合并 FTS5 的索引段（大量导入之后执行一次）"""
+        if self._db is not None and self.fts:
+            with self._lock:
+                self._db.execute("INSERT INTO channels_fts (channels_fts) VALUES ('optimize')")
+                self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+                self._db = None
+
+
+def backfill_from_cache(index, cache_db_path):
+    """把结果缓存（search_cache.sqlite3）里已有的结果导入语料库"""
+    db = sqlite3.connect(cache_db_path)
+    added = 0
+    try:
+        for results, created_at in db.execute("SELECT results, created_at FROM results WHERE results IS NOT NULL"):
+            added += index.add(json.loads(results), seen_at=created_at)
+    finally:
+        db.close()
+    index.optimize()
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="local corpus of every channel/group the bot has seen")
+    parser.add_argument("--db", default=env_str("CORPUS_DB_PATH", DEFAULT_DB_PATH))
+    sub = parser.add_subparsers(dest="command", required=True)
+    search = sub.add_parser("search")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=20)
+    backfill = sub.add_parser("backfill", help="import results stored in the result cache")
+    from result_cache import DEFAULT_DB_PATH as CACHE_DB_PATH
+    backfill.add_argument("cache_db", nargs="?", default=CACHE_DB_PATH)
+    sub.add_parser("stats")
+    args = parser.parse_args()
+
+    index = CorpusIndex(args.db)
+    if args.command == "search":
+        t0 = time.perf_counter()
+        results = index.search(args.query, args.limit)
+        print(f"{len(results)} results in {(time.perf_counter() - t0) * 1000:.1f} ms")
+        for i, r in enumerate(results, 1):
+            print(f"{i:2d}. {r['title'][:60]:60s} | {r['link']}")
+    elif args.command == "backfill":
+        print(f"imported {backfill_from_cache(index, args.cache_db)} new entries")
+    else:
+        print(json.dumps(index.snapshot(), ensure_ascii=False, indent=2))
+    index.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,7 +6,7 @@ from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
+from extract import make_soup
 import re
 
 options = Options()
@@ -41,7 +41,7 @@ with open('rendered.html', 'w', encoding='utf-8') as f:
 print('[debug] Saved to rendered.html')
 
 # Analyze structure
-soup = BeautifulSoup(html, 'html.parser')
+soup = make_soup(html)  # lxml 优先，比 html.parser 快得多
 
 # Look for any <a> tags that might be results
 print('\n--- Looking for <a> tags with t.me in href ---')
@@ -0,0 +1,287 @@
+# driver_factory.py
+# 负责创建 Chrome WebDriver。
+#
+# 以前每次查询都要调用 ChromeDriverManager().install()（可能触发网络/版本检查），
+# 再依次尝试四种 webdriver.Chrome(...) 构造方式（service、executable_path、
+# positional、default），靠异常一路回退。
+# 现在只在进程启动后第一次创建浏览器时探测一次，把可用的方式和 driver 路径
+# 缓存在内存和磁盘（按 Chrome 版本区分），之后直接复用；只有启动失败时才重新探测。
+# 探测（可能要下载 chromedriver）不持有锁：同时到达的其他线程等待同一次探测的结果，
+# 最多等 SCRAPER_DRIVER_PROBE_TIMEOUT 秒（默认 180）。
+#
+# CHROMEDRIVER_PATH 指定 chromedriver 时直接使用，不经过 webdriver_manager。
+# SCRAPER_DRIVER_OFFLINE=1（基准测试使用）：只用 CHROMEDRIVER_PATH 或 PATH 里的 chromedriver，
+# 不调用 webdriver_manager，也不用 Selenium 默认方式（selenium-manager 可能联网下载 driver），不读磁盘缓存。
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+from lean_profile import apply_lean_options
+from settings import env_bool, env_float, env_str
+
+# Try to import webdriver_manager; fall back to system chromedriver or selenium-manager
+try:
+    from webdriver_manager.chrome import ChromeDriverManager
+    _WEBDRIVER_MANAGER_AVAILABLE = True
+except ImportError:
+    _WEBDRIVER_MANAGER_AVAILABLE = False
+
+# Try to import Service class (name varies across selenium versions)
+try:
+    # selenium 4+: Service is available here
+    from selenium.webdriver.chrome.service import Service as ChromeService
+    _CHROME_SERVICE_AVAILABLE = True
+except Exception:
+    ChromeService = None
+    _CHROME_SERVICE_AVAILABLE = False
+
+STRATEGY_SERVICE = "service"
+STRATEGY_EXECUTABLE_PATH = "executable_path"
+STRATEGY_POSITIONAL = "positional"
+STRATEGY_DEFAULT = "default"
+
+_STRATEGY_LABELS = {
+    STRATEGY_SERVICE: "ChromeService(...)",
+    STRATEGY_EXECUTABLE_PATH: "executable_path",
+    STRATEGY_POSITIONAL: "positional path",
+    STRATEGY_DEFAULT: "Selenium 默认方式（selenium-manager 或系统 chromedriver）",
+}
+
+_CHROME_BINARIES = (
+    "google-chrome",
+    "google-chrome-stable",
+    "chromium",
+    "chromium-browser",
+    "chrome",
+)
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".driver_cache.json")
+
+
+def build_options():
+    # Headless Chrome
+    options = Options()
+    options.add_argument("--headless=new")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64)")
+    # 不加载图片/字体/样式等与结果无关的资源（LEAN_PROFILE=0 关闭）
+    return apply_lean_options(options)
+
+
+def detect_chrome_version():
+    """返回本机 Chrome 版本号字符串，检测不到时返回 "unknown" """
+    if sys.platform.startswith("win"):
+        commands = [[
+            "reg", "query", r"HKEY_CURRENT_USER\Software\Google\Chrome\BLBeacon", "/v", "version",
+        ]]
+    else:
+        commands = [[name, "--version"] for name in _CHROME_BINARIES]
+
+    for cmd in commands:
+        try:
+            out = subprocess.run(cmd, capture_output=True, text=True, timeout=5).stdout
+        except Exception:
+            continue
+        match = re.search(r"(\d+\.\d+\.\d+\.\d+)", out)
+        if match:
+            return match.group(1)
+    return "unknown"
+
+
+class DriverFactory:
+    def __init__(self, options_builder=build_options, cache_path=None, probe_timeout=None, offline=None):
+        self._options_builder = options_builder
+        self.cache_path = cache_path or env_str("SCRAPER_DRIVER_CACHE", DEFAULT_CACHE_PATH)
+        self.chromedriver_path = env_str("CHROMEDRIVER_PATH") or None
+        self.offline = env_bool("SCRAPER_DRIVER_OFFLINE", False) if offline is None else offline
+        if probe_timeout is None:
+            probe_timeout = env_float("SCRAPER_DRIVER_PROBE_TIMEOUT", 180.0)
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._probing = None  # 正在进行的探测：Future，结果是 (strategy, driver_path)
+        self._chrome_version = None
+        self.strategy = None
+        self.driver_path = None
+        self.probes = 0
+
+    def _options(self, arguments):
+        options = self._options_builder()
+        for argument in arguments:
+            options.add_argument(argument)
+        return options
+
+    def create(self, arguments=()):
+        """创建一个新的 WebDriver；必要时先探测（每个进程/每次失败后只探测一次）
+
+        arguments 是这个浏览器额外的启动参数（例如它自己的 --user-data-dir）。
+        """
+        strategy, driver_path, driver = self._resolve(arguments)
+        if driver is not None:
+            return driver
+        try:
+            return self._launch(strategy, driver_path, self._options(arguments))
+        except Exception as e:
+            print(f"[factory] 使用缓存的方式 {strategy} 启动失败，重新探测: {e}")
+
+        strategy, driver_path, driver = self._resolve(arguments, failed=(strategy, driver_path))
+        if driver is not None:
+            return driver
+        return self._launch(strategy, driver_path, self._options(arguments))
+
+    def _resolve(self, arguments, failed=None):
+        """返回 (strategy, driver_path, driver)。
+
+        driver 只有在当前线程亲自探测时才不为 None（探测成功启动的那个浏览器）。
+        failed 是刚刚启动失败的方式：如果它仍是当前方式就作废，重新探测（不再读磁盘缓存）。
+        """
+        with self._lock:
+            if failed is not None and (self.strategy, self.driver_path) == failed:
+                self.strategy = None
+                self.driver_path = None
+            if self.strategy is not None:
+                return self.strategy, self.driver_path, None
+            probing = self._probing
+            owner = probing is None
+            if owner:
+                probing = self._probing = Future()
+
+        if not owner:
+            # 其他线程正在探测：等它的结果，不重复下载 / 启动
+            try:
+                strategy, driver_path = probing.result(timeout=self.probe_timeout)
+            except FutureTimeout:
+                raise RuntimeError(f"等待 Chrome driver 探测超时（{self.probe_timeout:.0f}s）") from None
+            return strategy, driver_path, None
+
+        driver = None
+        try:
+            cached = None if failed is not None or self.offline else self._load_cache()
+            if cached is not None:
+                strategy, driver_path = cached
+            else:
+                driver, strategy, driver_path = self._probe(arguments)
+        except BaseException as e:
+            with self._lock:
+                self._probing = None
+            probing.set_exception(e)
+            raise
+        with self._lock:
+            self.strategy = strategy
+            self.driver_path = driver_path
+            self._probing = None
+        if driver is not None:
+            self._save_cache(strategy, driver_path)
+        probing.set_result((strategy, driver_path))
+        return strategy, driver_path, driver
+
+    # ---------- 探测 ----------
+
+    def _probe(self, arguments=()):
+        """依次尝试各种初始化方式，返回 (driver, strategy, driver_path)；全部失败时抛 RuntimeError"""
+        self.probes += 1
+        options = self._options(arguments)
+
+        # Initialize Chrome driver with robust fallback logic to support multiple Selenium versions
+        print("[factory] 探测 Chrome driver 初始化方式...")
+        driver_path = self.chromedriver_path
+        if driver_path is None and self.offline:
+            driver_path = shutil.which("chromedriver")
+            if driver_path is None:
+                raise RuntimeError("离线模式需要本机的 chromedriver：设置 CHROMEDRIVER_PATH 或把它放进 PATH")
+        if driver_path is None and _WEBDRIVER_MANAGER_AVAILABLE:
+            try:
+                driver_path = ChromeDriverManager().install()
+                print(f"[factory] webdriver_manager returned path: {driver_path}")
+            except Exception as e:
+                print(f"webdriver_manager 下载 chromedriver 失败: {e}")
+
+        # Try multiple ways to create the Chrome WebDriver depending on Selenium version
+        candidates = []
+        if driver_path:
+            # 1) Preferred: use Service object (Selenium 4+)
+            if _CHROME_SERVICE_AVAILABLE:
+                candidates.append(STRATEGY_SERVICE)
+            # 2) Older Selenium versions accept executable_path keyword
+            # 3) Some environments accept the path as the first positional argument
+            candidates += [STRATEGY_EXECUTABLE_PATH, STRATEGY_POSITIONAL]
+        # 4) Fallback: let Selenium use selenium-manager or system chromedriver
+        if not self.offline:
+            candidates.append(STRATEGY_DEFAULT)
+
+        errors = []
+        for strategy in candidates:
+            try:
+                driver = self._launch(strategy, driver_path, options)
+            except Exception as e:
+                print(f"[factory] {strategy} 初始化失败: {e}")
+                errors.append((strategy, e))
+                continue
+            return driver, strategy, driver_path if strategy != STRATEGY_DEFAULT else None
+
+        # All attempts failed — raise a consolidated error for debugging
+        msg_lines = [f"无法初始化 Chrome driver，尝试的方式和错误："]
+        for k, v in errors:
+            msg_lines.append(f" - {k}: {v}")
+        raise RuntimeError("\n".join(msg_lines))
+
+    @staticmethod
+    def _launch(strategy, driver_path, options):
+        print(f"[factory] 使用 {_STRATEGY_LABELS[strategy]} 初始化 driver")
+        if strategy == STRATEGY_SERVICE:
+            return webdriver.Chrome(service=ChromeService(driver_path), options=options)
+        if strategy == STRATEGY_EXECUTABLE_PATH:
+            return webdriver.Chrome(executable_path=driver_path, options=options)
+        if strategy == STRATEGY_POSITIONAL:
+            return webdriver.Chrome(driver_path, options=options)
+        return webdriver.Chrome(options=options)
+
+    # ---------- 磁盘缓存（按 Chrome 版本区分） ----------
+
+    def _version(self):
+        if self._chrome_version is None:
+            self._chrome_version = detect_chrome_version()
+        return self._chrome_version
+
+    def _read_cache_file(self):
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _load_cache(self):
+        """返回磁盘缓存里当前 Chrome 版本的 (strategy, driver_path)，没有（或已失效）时返回 None"""
+        entry = self._read_cache_file().get(self._version())
+        if not entry or entry.get("strategy") not in _STRATEGY_LABELS:
+            return None
+        driver_path = entry.get("driver_path")
+        if driver_path and not os.path.exists(driver_path):
+            return None
+        print(f"[factory] 使用缓存的 driver 初始化方式: {entry['strategy']} ({driver_path or '-'})")
+        return entry["strategy"], driver_path
+
+    def _save_cache(self, strategy, driver_path):
+        data = self._read_cache_file()
+        data[self._version()] = {
+            "strategy": strategy,
+            "driver_path": driver_path,
+            "saved_at": int(time.time()),
+        }
+        try:
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"[factory] 无法写入 driver 缓存文件 {self.cache_path}: {e}")
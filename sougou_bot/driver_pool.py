@@ -0,0 +1,271 @@
+# driver_pool.py
+# 预热、可复用的 Chrome WebDriver 池。
+#
+# search_telegram 以前每次查询都新建一个 headless Chrome 并在结束时 quit()，
+# 每次都要付出完整的浏览器启动成本。这里维护一组常驻浏览器：
+# - acquire() 取出一个健康的 driver（必要时现场启动一个）；健康检查超过 reset_timeout 秒的浏览器被杀掉并替换
+# - release() 归还前清理状态（多余标签页、cookies、storage），失败或超过 reset_timeout 秒则销毁并后台补位
+# - 启动时在后台预先拉起 warm 个浏览器
+# - 可选的 governor（memory_governor.py）：浏览器用得太久 / 内存太大时回收，内存预算不足时不再启动新浏览器
+# - 可选的 profiles（browser_cache.py）：浏览器退出后交还它的缓存目录，正常退出的浏览器可以更新缓存模板
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from watchdog import get_watchdog
+
+
+class PoolTimeout(RuntimeError):
+    """在规定时间内没有可用的浏览器"""
+
+
+class DriverPool:
+    def __init__(
+        self, factory, size=2, warm=None, acquire_timeout=60.0, reset_timeout=10.0, governor=None, profiles=None
+    ):
+        # factory: 无参函数，返回一个新的 WebDriver
+        self._factory = factory
+        self.governor = governor
+        self.profiles = profiles
+        self.size = max(1, size)
+        self.warm = self.size if warm is None else max(0, min(warm, self.size))
+        self.acquire_timeout = acquire_timeout
+        self.reset_timeout = reset_timeout
+
+        # LIFO：优先复用最近归还的浏览器，冷的浏览器留在底部
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._live = 0  # 空闲 + 借出 + 正在启动 的浏览器数量
+        self._closed = False
+        self.stats = {
+            "created": 0,
+            "reused": 0,
+            "replaced": 0,
+            "launch_failed": 0,
+            "reset_failed": 0,
+            "recycled": 0,
+        }
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        """在后台预先启动 warm 个浏览器，不阻塞调用方"""
+        for _ in range(self.warm):
+            self._spawn_background()
+
+    def close(self):
+        """关闭池中所有空闲浏览器；借出中的浏览器在归还时销毁"""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._destroy(driver)
+
+    # ---------- 借出 / 归还 ----------
+
+    def acquire(self, timeout=None):
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolTimeout(f"等待空闲浏览器超时（{timeout:.0f}s）")
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    if self._reserve():
+                        if self._may_launch():
+                            return self._launch()
+                        self._unreserve()
+                    # 所有名额都被占用（有浏览器正在后台启动），或者内存预算不允许再启动：等已有的浏览器入队
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"等待空闲浏览器超时（{timeout:.0f}s）")
+                    try:
+                        driver = self._idle.get(timeout=min(remaining, 1.0))
+                    except queue.Empty:
+                        continue
+
+                if self._is_alive(driver):
+                    self._count("reused")
+                    return driver
+                print("[pool] 空闲浏览器已失效，销毁并替换")
+                self._count("replaced")
+                self._destroy(driver)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, driver, broken=False):
+        try:
+            recycle = None
+            if self.governor is not None and not broken and not self._closed:
+                self.governor.record_navigation(driver)
+                recycle = self.governor.should_recycle(driver)
+            if recycle is not None:
+                print(f"[pool] 回收浏览器：{recycle}")
+                self._count("recycled")
+                self._destroy(driver)
+                self._replenish()
+            elif broken or self._closed or not self._reset(driver):
+                if not broken and not self._closed:
+                    self._count("reset_failed")
+                self._destroy(driver)
+                if not self._closed:
+                    self._replenish()
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def session(self, timeout=None):
+        """with pool.session() as driver: ...（出现 WebDriver 异常时不再复用该浏览器）"""
+        driver = self.acquire(timeout)
+        broken = False
+        try:
+            yield driver
+        except Exception:
+            broken = True
+            raise
+        finally:
+            self.release(driver, broken=broken)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, size=self.size, live=self._live, idle=self._idle.qsize())
+
+    # ---------- 内部实现 ----------
+
+    def _count(self, key):
+        # acquire / release / 后台预热在不同线程里同时更新统计
+        with self._lock:
+            self.stats[key] += 1
+
+    def _reserve(self):
+        with self._lock:
+            if self._closed or self._live >= self.size:
+                return False
+            self._live += 1
+            return True
+
+    def _unreserve(self):
+        with self._lock:
+            self._live -= 1
+
+    def _may_launch(self):
+        # 调用前必须已经 _reserve()；_live 已经包含这个名额
+        if self.governor is None:
+            return True
+        with self._lock:
+            live = self._live - 1
+        return self.governor.can_launch(live)
+
+    def _launch(self):
+        # 调用前必须已经 _reserve()
+        t0 = time.monotonic()
+        try:
+            driver = self._factory()
+        except BaseException:
+            self._count("launch_failed")
+            self._unreserve()
+            raise
+        self._count("created")
+        if self.governor is not None:
+            self.governor.track(driver)
+        print(f"[pool] 新浏览器已启动（{time.monotonic() - t0:.1f}s）")
+        return driver
+
+    def _spawn_background(self):
+        if not self._reserve():
+            return
+        if not self._may_launch():
+            # 内存预算不足：不补位，请求会等待已有的浏览器
+            self._unreserve()
+            return
+
+        def run():
+            try:
+                driver = self._launch()
+            except Exception as e:
+                print(f"[pool] 后台预热浏览器失败: {e}")
+                return
+            if self._closed:
+                self._destroy(driver)
+            else:
+                self._idle.put(driver)
+
+        threading.Thread(target=run, name="driver-pool-warm", daemon=True).start()
+
+    def _replenish(self):
+        # 保持至少 warm 个浏览器常驻
+        with self._lock:
+            missing = self.warm - self._live
+        for _ in range(max(0, missing)):
+            self._spawn_background()
+
+    def _destroy(self, driver):
+        clean = True
+        try:
+            driver.quit()
+        except Exception:
+            clean = False
+        if self.governor is not None:
+            self.governor.forget(driver)
+        if self.profiles is not None:
+            # 没能正常退出（例如已经被 watchdog 杀掉）的浏览器，缓存可能不完整，不用来更新模板
+            try:
+                self.profiles.checkin(driver, harvest=clean)
+            except Exception as e:
+                print(f"[pool] 清理浏览器 profile 失败: {e}")
+        self._unreserve()
+
+    def _is_alive(self, driver):
+        # 卡死的浏览器连 execute_script 都不会返回：同样由 watchdog 在 reset_timeout 秒后杀掉
+        try:
+            with get_watchdog().guard(driver, self.reset_timeout, "health_check"):
+                driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _reset(self, driver):
+        """把浏览器恢复到干净状态，供下一个查询使用；失败返回 False
+
+        浏览器卡死时 CDP 调用和 about:blank 导航都可能一直阻塞：超过 reset_timeout 秒由 watchdog
+        杀掉浏览器，这里返回 False，由 release() 销毁并补位。
+        """
+        try:
+            with get_watchdog().guard(driver, self.reset_timeout, "reset"):
+                self._clear_state(driver)
+            return True
+        except Exception as e:
+            print(f"[pool] 重置浏览器状态失败: {e}")
+            return False
+
+    @staticmethod
+    def _clear_state(driver):
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+
+        try:
+            driver.execute_script(
+                "try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}"
+            )
+        except Exception:
+            pass
+
+        # delete_all_cookies 只清当前域名，优先用 CDP 清掉所有域名的 cookies
+        try:
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        except Exception:
+            driver.delete_all_cookies()
+
+        driver.get("about:blank")
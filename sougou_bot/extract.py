@@ -0,0 +1,52 @@
+# extract.py
+# 搜索结果提取。
+#
+# 以前的做法是把整个 driver.page_source（经常几百 KB）通过 WebDriver 协议传回来，
+# 再用 BeautifulSoup(html, "html.parser") 全量解析，只为了跑一个 div.gs-title a 选择器。
+# 现在优先在页面里直接执行选择器，只传回精简的 [title, href] 列表；
+# 确实需要完整 HTML 的场景（debug_html.py / analyze_html.py / rendered.html 快照）
+# 使用 lxml 解析，lxml 不可用时退回 html.parser。
+from bs4 import BeautifulSoup
+
+# lxml 是可选依赖（不在 requirements.txt 里，需要时 pip install lxml）：没有安装时自动退回 Python 自带的 html.parser
+try:
+    import lxml.html
+    _LXML_AVAILABLE = True
+except ImportError:
+    _LXML_AVAILABLE = False
+
+RESULT_SELECTOR = "div.gs-title a"
+
+# div.gs-title a 的等价 XPath，供 lxml 直接使用（不需要 cssselect）
+_RESULT_XPATH = "//div[contains(concat(' ', normalize-space(@class), ' '), ' gs-title ')]//a"
+
+# 在页面中执行：返回 [[title, href], ...]，title 中的连续空白合并为一个空格
+EXTRACT_JS = """
+return Array.from(document.querySelectorAll(arguments[0])).map(function (a) {
+    return [(a.textContent || "").replace(/\\s+/g, " ").trim(), a.getAttribute("href")];
+});
+"""
+
+
+def html_parser_name():
+    return "lxml" if _LXML_AVAILABLE else "html.parser"
+
+
+def make_soup(html):
+    """用可用的最快解析器构造 BeautifulSoup（lxml 优先）"""
+    return BeautifulSoup(html, html_parser_name())
+
+
+def extract_in_browser(driver, selector=RESULT_SELECTOR):
+    """在页面内执行选择器，返回 [(title, href), ...]，不传输整页 HTML"""
+    rows = driver.execute_script(EXTRACT_JS, selector) or []
+    return [(title, href) for title, href in rows]
+
+
+def extract_from_html(html):
+    """从完整 HTML 中提取 [(title, href), ...]"""
+    if _LXML_AVAILABLE:
+        tree = lxml.html.fromstring(html)
+        return [(" ".join(a.text_content().split()), a.get("href")) for a in tree.xpath(_RESULT_XPATH)]
+    soup = BeautifulSoup(html, "html.parser")
+    return [(" ".join(a.get_text().split()), a.get("href")) for a in soup.select(RESULT_SELECTOR)]
@@ -0,0 +1,25 @@
+# latency_stats.py
+# 离线工具（benchmark.py / batch.py）共用的延迟统计：百分位数和秒 -> 毫秒的摘要。
+# 单独成模块，batch.py 不需要为了算百分位数而导入 stub_server / aiohttp.web。
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def summarize(samples_s):
+    """秒 -> 毫秒的延迟摘要"""
+    if not samples_s:
+        return {"count": 0}
+    ms = [s * 1000 for s in samples_s]
+    return {
+        "count": len(ms),
+        "mean": round(sum(ms) / len(ms), 2),
+        "p50": round(percentile(ms, 50), 2),
+        "p95": round(percentile(ms, 95), 2),
+        "p99": round(percentile(ms, 99), 2),
+        "max": round(max(ms), 2),
+    }
@@ -0,0 +1,193 @@
+# lean_profile.py
+# “精简浏览”配置：抓取只需要 HTML 文档和生成结果的脚本，默认不加载图片、字体和样式表。
+# 广告和统计脚本默认照常加载：结果页里的 Google CSE 会请求 */afs/ads*、*/pagead/* 等地址，
+# 拦截后结果可能渲染不出来；确认不影响结果时再用 SCRAPER_BLOCK_TRACKERS=1 开启。
+#
+# - apply_lean_options(options)：Chrome 启动参数和偏好设置（禁止加载图片、关闭后台服务等）
+# - install_blocking(driver)：通过 DevTools 协议 Network.setBlockedURLs 拦截按类型/域名匹配的请求
+# - collect_traffic(driver)：从 Chrome 的 performance 日志统计本次查询的传输字节数、被拦截的请求数
+#   和命中浏览器缓存的请求数
+#
+# 配置（环境变量）：
+#   LEAN_PROFILE=0                    关闭整个精简配置（对比基准时使用）
+#   SCRAPER_BLOCK_RESOURCES=image,font,stylesheet    拦截的资源类型（可选 image,font,stylesheet,media）
+#   SCRAPER_BLOCK_TRACKERS=1          同时拦截广告、统计和社交插件（TRACKER_PATTERNS，默认关闭）
+#   SCRAPER_BLOCK_URLS=*foo.com*,*/bar/*             额外拦截的 URL 模式
+#   SCRAPER_TRAFFIC_STATS=0           不记录流量统计（关闭 performance 日志）
+import json
+
+import metrics
+from settings import env_bool, env_str
+
+# Network.setBlockedURLs 的模式只支持 * 通配符，按扩展名匹配资源类型
+RESOURCE_PATTERNS = {
+    "image": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.bmp", "*.avif"],
+    "font": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "stylesheet": ["*.css", "*.css?*"],
+    "media": ["*.mp4", "*.webm", "*.mp3", "*.ogg", "*.m4a"],
+}
+DEFAULT_BLOCKED_RESOURCES = "image,font,stylesheet"
+
+# 广告、统计、社交插件（SCRAPER_BLOCK_TRACKERS=1 时才拦截）
+TRACKER_PATTERNS = [
+    "*googletagmanager.com*",
+    "*google-analytics.com*",
+    "*googlesyndication.com*",
+    "*doubleclick.net*",
+    "*adservice.google.*",
+    "*/pagead/*",
+    "*/afs/ads*",
+    "*facebook.net*",
+    "*connect.facebook.*",
+    "*platform.twitter.com*",
+]
+
+# 对应 Chrome 的偏好设置：2 = 阻止
+_BLOCK_PREFS = {
+    "profile.managed_default_content_settings.images": 2,
+    "profile.managed_default_content_settings.media_stream": 2,
+    "profile.managed_default_content_settings.notifications": 2,
+    "profile.managed_default_content_settings.geolocation": 2,
+    "profile.default_content_setting_values.automatic_downloads": 2,
+}
+
+_LEAN_ARGUMENTS = (
+    "--blink-settings=imagesEnabled=false",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-features=Translate,OptimizationHints,MediaRouter",
+    "--no-first-run",
+    "--mute-audio",
+)
+
+
+def lean_enabled():
+    return env_bool("LEAN_PROFILE", True)
+
+
+def traffic_stats_enabled():
+    return env_bool("SCRAPER_TRAFFIC_STATS", True)
+
+
+def blocked_url_patterns():
+    """根据 SCRAPER_BLOCK_RESOURCES / SCRAPER_BLOCK_TRACKERS / SCRAPER_BLOCK_URLS 生成拦截模式列表"""
+    patterns = []
+    resources = env_str("SCRAPER_BLOCK_RESOURCES", DEFAULT_BLOCKED_RESOURCES)
+    for name in resources.split(","):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in RESOURCE_PATTERNS:
+            print(f"[lean] 未知的资源类型 {name!r}，可选：{', '.join(RESOURCE_PATTERNS)}")
+            continue
+        patterns += RESOURCE_PATTERNS[name]
+    if env_bool("SCRAPER_BLOCK_TRACKERS", False):
+        patterns += TRACKER_PATTERNS
+    extra = env_str("SCRAPER_BLOCK_URLS")
+    if extra:
+        patterns += [p.strip() for p in extra.split(",") if p.strip()]
+    return patterns
+
+
+def apply_lean_options(options):
+    """在 Chrome Options 上加上精简配置和流量统计所需的日志设置"""
+    if traffic_stats_enabled():
+        # performance 日志里有每个请求的 Network.* 事件，用来统计字节数和被拦截的请求
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+    if not lean_enabled():
+        return options
+    for argument in _LEAN_ARGUMENTS:
+        options.add_argument(argument)
+    options.add_experimental_option("prefs", dict(_BLOCK_PREFS))
+    return options
+
+
+def install_blocking(driver):
+    """在新建的浏览器上开启 DevTools 请求拦截；失败时只打印警告（不影响抓取）"""
+    if not lean_enabled():
+        return False
+    patterns = blocked_url_patterns()
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    except Exception as e:
+        print(f"[lean] 无法设置请求拦截: {e}")
+        return False
+    return True
+
+
+class TrafficStats:
+    def __init__(self, requests=0, bytes=0, blocked=0, failed=0, cached=0):
+        self.requests = requests  # 发出的请求数
+        self.bytes = bytes        # 实际传输的字节数（含响应头，压缩后）
+        self.blocked = blocked    # 被拦截的请求数（setBlockedURLs 或偏好设置）
+        self.failed = failed      # 其他原因失败的请求数
+        self.cached = cached      # 由磁盘缓存或内存缓存直接提供的请求数
+
+    def __repr__(self):
+        return (f"TrafficStats(requests={self.requests}, {self.bytes / 1024:.1f} KB, "
+                f"blocked={self.blocked}, failed={self.failed}, cached={self.cached})")
+
+
+def _read_performance_log(driver):
+    try:
+        return driver.get_log("performance")
+    except Exception:
+        # 没有开启 performance 日志（或 driver 不支持），不统计
+        return None
+
+
+def reset_traffic(driver):
+    """丢弃之前积累的日志（例如池重置时打开 about:blank 产生的事件）"""
+    if traffic_stats_enabled():
+        _read_performance_log(driver)
+
+
+def collect_traffic(driver):
+    """统计自上次调用以来的网络流量，并记入 metrics；未开启统计时返回 None"""
+    if not traffic_stats_enabled():
+        return None
+    entries = _read_performance_log(driver)
+    if entries is None:
+        return None
+
+    stats = TrafficStats()
+    cached = set()
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, TypeError, ValueError):
+            continue
+        method = message.get("method")
+        params = message.get("params", {})
+        if method == "Network.requestWillBeSent":
+            stats.requests += 1
+        elif method == "Network.requestServedFromCache":
+            cached.add(params.get("requestId"))
+        elif method == "Network.responseReceived":
+            if params.get("response", {}).get("fromDiskCache"):
+                cached.add(params.get("requestId"))
+        elif method == "Network.loadingFinished":
+            stats.bytes += int(params.get("encodedDataLength", 0))
+        elif method == "Network.loadingFailed":
+            if params.get("blockedReason"):
+                stats.blocked += 1
+            elif not params.get("canceled"):
+                stats.failed += 1
+    # 同一个请求可能同时出现在两种事件里
+    stats.cached = len(cached)
+
+    metrics.PAGE_BYTES.observe(stats.bytes)
+    metrics.BLOCKED_REQUESTS.inc(stats.blocked)
+    metrics.BROWSER_REQUESTS.inc(stats.requests)
+    metrics.CACHED_REQUESTS.inc(stats.cached)
+    trace = metrics.current_trace()
+    if trace is not None:
+        trace.fields["page_bytes"] = trace.fields.get("page_bytes", 0) + stats.bytes
+        trace.fields["blocked_requests"] = trace.fields.get("blocked_requests", 0) + stats.blocked
+        trace.fields["cached_requests"] = trace.fields.get("cached_requests", 0) + stats.cached
+    return stats
@@ -0,0 +1,181 @@
+# memory_governor.py
+# 浏览器内存管理：headless Chrome 常驻后会越用越大，每个实例几百 MB。
+#
+# - 定期采样每个浏览器进程树（chromedriver + Chrome 的所有子进程）的 RSS
+# - 浏览器用了 max_navigations 次，或 RSS 超过 max_browser_rss，归还时直接回收（池会在后台补一个新的）
+# - 启动新浏览器前检查预算：所有浏览器的 RSS 加上一个新浏览器的预估值不能超过 fleet_budget，
+#   主机可用内存不能低于 min_available；不满足时不启动，请求排队等待已有的浏览器
+# - 每个浏览器和整个浏览器组的内存都可以通过 /metrics 查看
+#
+# 配置（环境变量，单位 MB，0 表示不限制）：
+#   SCRAPER_MAX_NAVIGATIONS       每个浏览器最多处理多少次查询（默认 200）
+#   SCRAPER_MAX_BROWSER_RSS_MB    单个浏览器的 RSS 上限（默认 800）
+#   SCRAPER_MEMORY_BUDGET_MB      本进程所有浏览器的 RSS 总预算（默认 0）
+#   SCRAPER_MIN_AVAILABLE_MB      主机至少保留的可用内存（默认 512）
+#   SCRAPER_RSS_SAMPLE_INTERVAL   两次采样的最小间隔秒数（默认 5）
+import itertools
+import threading
+import time
+
+from proctree import available_memory, tree_rss_many
+from settings import env_float, env_int
+from watchdog import driver_pid
+
+_MB = 1024 * 1024
+
+# 还没有采样数据时，预估一个新浏览器会占用的内存
+DEFAULT_BROWSER_ESTIMATE = 300 * _MB
+
+
+class _Browser:
+    def __init__(self, browser_id, pid):
+        self.id = browser_id
+        self.pid = pid
+        self.navigations = 0
+        self.rss = 0
+
+
+class MemoryGovernor:
+    def __init__(self, max_navigations=200, max_browser_rss=800 * _MB, fleet_budget=0,
+                 min_available=512 * _MB, sample_interval=5.0):
+        self.max_navigations = max_navigations
+        self.max_browser_rss = max_browser_rss
+        self.fleet_budget = fleet_budget
+        self.min_available = min_available
+        self.sample_interval = sample_interval
+        self._browsers = {}  # id(driver) -> _Browser
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._sampled_at = 0.0
+        self._available = None
+        self._peak_browser_rss = 0
+        self._warned_at = 0.0
+        self.stats = {
+            "recycled_navigations": 0,
+            "recycled_rss": 0,
+            "launch_deferred": 0,
+            "samples": 0,
+        }
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_navigations=env_int("SCRAPER_MAX_NAVIGATIONS", 200),
+            max_browser_rss=env_int("SCRAPER_MAX_BROWSER_RSS_MB", 800) * _MB,
+            fleet_budget=env_int("SCRAPER_MEMORY_BUDGET_MB", 0) * _MB,
+            min_available=env_int("SCRAPER_MIN_AVAILABLE_MB", 512) * _MB,
+            sample_interval=env_float("SCRAPER_RSS_SAMPLE_INTERVAL", 5.0),
+        )
+
+    # ---------- 浏览器登记 ----------
+
+    def track(self, driver):
+        with self._lock:
+            self._browsers[id(driver)] = _Browser(next(self._ids), driver_pid(driver))
+        # 新浏览器改变了整体内存，下一次检查时重新采样
+        self._sampled_at = 0.0
+
+    def forget(self, driver):
+        with self._lock:
+            self._browsers.pop(id(driver), None)
+
+    def record_navigation(self, driver):
+        with self._lock:
+            browser = self._browsers.get(id(driver))
+            if browser is not None:
+                browser.navigations += 1
+
+    # ---------- 采样 ----------
+
+    def sample(self, force=False):
+        """采样所有浏览器的 RSS（距离上次采样不足 sample_interval 秒时直接使用上次的值）"""
+        now = time.monotonic()
+        if not force and now - self._sampled_at < self.sample_interval:
+            return
+        self._sampled_at = now
+        with self._lock:
+            browsers = [b for b in self._browsers.values() if b.pid is not None]
+        rss = tree_rss_many([b.pid for b in browsers])
+        available = available_memory()
+        with self._lock:
+            for browser in browsers:
+                browser.rss = rss.get(browser.pid, 0)
+                self._peak_browser_rss = max(self._peak_browser_rss, browser.rss)
+            self._available = available
+            self.stats["samples"] += 1
+
+    def fleet_rss(self):
+        with self._lock:
+            return sum(b.rss for b in self._browsers.values())
+
+    def browser_estimate(self):
+        """一个新浏览器预计占用的内存：当前浏览器的平均值，没有数据时用默认值"""
+        with self._lock:
+            sizes = [b.rss for b in self._browsers.values() if b.rss]
+        return sum(sizes) // len(sizes) if sizes else DEFAULT_BROWSER_ESTIMATE
+
+    # ---------- 决策 ----------
+
+    def should_recycle(self, driver):
+        """浏览器归还时调用：需要回收时返回原因，否则返回 None"""
+        with self._lock:
+            browser = self._browsers.get(id(driver))
+        if browser is None:
+            return None
+        if self.max_navigations and browser.navigations >= self.max_navigations:
+            self.stats["recycled_navigations"] += 1
+            return f"已处理 {browser.navigations} 次查询"
+        if self.max_browser_rss:
+            self.sample()
+            if browser.rss >= self.max_browser_rss:
+                self.stats["recycled_rss"] += 1
+                return f"RSS {browser.rss / _MB:.0f} MB 超过上限 {self.max_browser_rss / _MB:.0f} MB"
+        return None
+
+    def can_launch(self, live):
+        """是否可以再启动一个浏览器；live 是当前存活（含正在启动）的浏览器数。
+
+        一个浏览器都没有时总是允许，否则请求会永远等不到浏览器。
+        """
+        if live <= 0 or not (self.fleet_budget or self.min_available):
+            return True
+        self.sample()
+        estimate = self.browser_estimate()
+        reason = None
+        if self.fleet_budget and self.fleet_rss() + estimate > self.fleet_budget:
+            reason = (f"浏览器总内存 {self.fleet_rss() / _MB:.0f} MB + 新浏览器约 {estimate / _MB:.0f} MB"
+                      f" 将超过预算 {self.fleet_budget / _MB:.0f} MB")
+        elif self.min_available and self._available is not None and self._available - estimate < self.min_available:
+            reason = f"主机可用内存只剩 {self._available / _MB:.0f} MB"
+        if reason is None:
+            return True
+        self.stats["launch_deferred"] += 1
+        if time.monotonic() - self._warned_at >= 10.0:
+            # 等待中的请求每秒都会重新检查一次，日志不用每次都打
+            self._warned_at = time.monotonic()
+            print(f"[memory] 暂不启动新浏览器（{reason}），等待已有浏览器空闲")
+        return False
+
+    # ---------- 观测 ----------
+
+    def browsers(self):
+        """每个浏览器的 RSS（字节），键是浏览器编号"""
+        self.sample()
+        with self._lock:
+            return {str(b.id): b.rss for b in self._browsers.values()}
+
+    def snapshot(self):
+        self.sample()
+        with self._lock:
+            browsers = list(self._browsers.values())
+            available = self._available
+        return dict(
+            self.stats,
+            browsers=len(browsers),
+            fleet_rss_bytes=sum(b.rss for b in browsers),
+            max_browser_rss_bytes=max((b.rss for b in browsers), default=0),
+            peak_browser_rss_bytes=self._peak_browser_rss,
+            max_navigations_seen=max((b.navigations for b in browsers), default=0),
+            fleet_budget_bytes=self.fleet_budget,
+            host_available_bytes=available or 0,
+        )
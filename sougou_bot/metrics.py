@@ -0,0 +1,277 @@
+# metrics.py
+# 搜索链路的分阶段耗时统计和 Prometheus 指标导出。
+#
+# - stage("navigation") 之类的上下文管理器记录每个阶段的耗时直方图和错误计数
+# - 每次搜索一个 SearchTrace（通过 contextvars 传递，调度器把上下文带进抓取线程），
+#   搜索结束时输出一行 JSON 日志，包含各阶段耗时
+# - start_http_server() 在本地端口提供 /metrics（Prometheus 文本格式）
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+
+logger = logging.getLogger("search")
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [bucket_counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            # 每个桶只在 observe 时计入 value <= bound 的样本，本身就是累积值
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', '+Inf')])} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+
+class CallbackMetric:
+    """抓取时才读取的指标，用于导出其他组件已有的统计（缓存、调度器、浏览器池等）
+
+    fn() 返回一个数字，或 {标签值: 数字}（此时需要提供 label），
+    或 {标签值: {子标签值: 数字}}（此时还需要提供 sublabel，例如每个搜索来源的统计）。
+    """
+
+    def __init__(self, name, help_text, fn, metric_type="gauge", label=None, sublabel=None):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.type = metric_type
+        self.label = label
+        self.sublabel = sublabel
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        try:
+            value = self.fn()
+        except Exception as e:
+            logger.warning("metric %s failed: %s", self.name, e)
+            return lines
+        if isinstance(value, dict):
+            for label_value, v in sorted(value.items()):
+                if isinstance(v, dict) and self.sublabel:
+                    for sub_value, sv in sorted(v.items()):
+                        if isinstance(sv, (int, float)) and not isinstance(sv, bool):
+                            labels = _format_labels((self.label, self.sublabel), (label_value, sub_value))
+                            lines.append(f"{self.name}{labels} {sv}")
+                elif isinstance(v, (int, float)) and not isinstance(v, bool):
+                    lines.append(f"{self.name}{_format_labels((self.label,), (label_value,))} {v}")
+        elif value is not None:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def callback(self, name, help_text, fn, metric_type="gauge", label=None, sublabel=None):
+        with self._lock:
+            # 回调指标允许重新注册（例如组件被重新创建）
+            self._metrics[name] = CallbackMetric(name, help_text, fn, metric_type, label, sublabel)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "search_stage_seconds", "Time spent in each search stage", labels=("stage",)
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "search_stage_errors_total", "Exceptions raised inside a search stage", labels=("stage",)
+)
+SEARCH_SECONDS = REGISTRY.histogram(
+    "search_total_seconds", "End-to-end search handling time", labels=("outcome",)
+)
+SEARCHES = REGISTRY.counter("searches_total", "Searches handled by outcome", labels=("outcome",))
+RESULTS_PER_QUERY = REGISTRY.histogram(
+    "search_results_per_query", "Number of results returned per search",
+    buckets=(0, 1, 5, 10, 20, 40, 60, 100),
+)
+FIRST_RESULT_SECONDS = REGISTRY.histogram(
+    "search_first_result_seconds", "Time until the first partial results were shown to the user"
+)
+PAGE_BYTES = REGISTRY.histogram(
+    "browser_page_bytes", "Bytes transferred by the browser per search page",
+    buckets=(16e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6),
+)
+BLOCKED_REQUESTS = REGISTRY.counter(
+    "browser_blocked_requests_total", "Requests blocked by the lean browsing profile"
+)
+BROWSER_REQUESTS = REGISTRY.counter("browser_requests_total", "Requests issued by the browser")
+CACHED_REQUESTS = REGISTRY.counter(
+    "browser_cached_requests_total", "Browser requests served from the disk or memory cache"
+)
+
+
+# ---------- 每次搜索的跟踪 ----------
+
+_current_trace = contextvars.ContextVar("search_trace", default=None)
+
+
+class SearchTrace:
+    def __init__(self, query, **fields):
+        self.query = query
+        self.fields = dict(fields)
+        self.stages = {}
+        self.outcome = "ok"
+        self.results = None
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, stage_name, seconds):
+        with self._lock:
+            self.stages[stage_name] = round(self.stages.get(stage_name, 0.0) + seconds * 1000, 2)
+
+    def elapsed(self):
+        return time.perf_counter() - self._t0
+
+
+def start_trace(query, **fields):
+    """开始跟踪一次搜索；同一上下文（含调度器线程）里的 stage() 都会记到这个 trace 上"""
+    trace = SearchTrace(query, **fields)
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def finish_trace(trace):
+    """记录总耗时并输出一行 JSON 日志"""
+    total = trace.elapsed()
+    SEARCH_SECONDS.observe(total, outcome=trace.outcome)
+    SEARCHES.inc(outcome=trace.outcome)
+    if trace.results is not None:
+        RESULTS_PER_QUERY.observe(trace.results)
+    line = {
+        "event": "search",
+        "query": trace.query,
+        "outcome": trace.outcome,
+        "results": trace.results,
+        "total_ms": round(total * 1000, 2),
+        "stages_ms": trace.stages,
+    }
+    line.update(trace.fields)
+    logger.info(json.dumps(line, ensure_ascii=False))
+
+
+@contextmanager
+def stage(name):
+    """with stage("navigation"): ... 记录耗时直方图；异常计入错误计数后继续抛出"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.record(name, elapsed)
+
+
+# ---------- HTTP 导出 ----------
+
+async def _handle_metrics(request):
+    return web.Response(
+        text=REGISTRY.render(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+async def start_http_server(host="127.0.0.1", port=9108):
+    """启动 /metrics 端点，返回 AppRunner（关闭时调用 runner.cleanup()）"""
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,133 @@
+# proctree.py
+# 进程树工具：子孙进程、进程树 RSS、主机可用内存。
+# benchmark.py（峰值内存）、watchdog.py（杀掉卡死的浏览器）、memory_governor.py（浏览器内存）
+# 和 browser_cache.py（清理已退出进程留下的 profile）共用。
+import os
+import signal
+
+# psutil 是可选依赖：没有时在 Linux 上直接读 /proc
+try:
+    import psutil
+    _PSUTIL_AVAILABLE = True
+except ImportError:
+    _PSUTIL_AVAILABLE = False
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _children_map_linux():
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def _descendants_linux(pid, children):
+    found = []
+    stack = list(children.get(pid, ()))
+    while stack:
+        current = stack.pop()
+        found.append(current)
+        stack.extend(children.get(current, ()))
+    return found
+
+
+def _rss_linux(pid):
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def descendants(pid):
+    """pid 的所有子孙进程"""
+    if _PSUTIL_AVAILABLE:
+        try:
+            return [child.pid for child in psutil.Process(pid).children(recursive=True)]
+        except psutil.Error:
+            return []
+    if os.path.isdir("/proc"):
+        return _descendants_linux(pid, _children_map_linux())
+    return []
+
+
+def pid_alive(pid):
+    """进程是否还在运行"""
+    if _PSUTIL_AVAILABLE:
+        return psutil.pid_exists(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # 进程存在，只是属于其他用户
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def kill_tree(pid):
+    """强制结束 pid 及其所有子孙进程"""
+    # 先收集子进程：父进程死后子进程会被过继给 init，就找不到了
+    for target in descendants(pid) + [pid]:
+        try:
+            if _PSUTIL_AVAILABLE:
+                psutil.Process(target).kill()
+            else:
+                os.kill(target, signal.SIGKILL if os.name == "posix" else signal.SIGTERM)
+        except Exception:
+            # 进程已经退出（ProcessLookupError / psutil.NoSuchProcess）
+            pass
+
+
+def tree_rss_many(pids):
+    """{pid: 该进程及其所有子进程的 RSS 总和（字节）}；没有 psutil 时只扫描一次 /proc"""
+    if _PSUTIL_AVAILABLE:
+        return {pid: process_tree_rss(pid) for pid in pids}
+    if not os.path.isdir("/proc"):
+        return {pid: 0 for pid in pids}
+    children = _children_map_linux()
+    return {pid: sum(_rss_linux(p) for p in [pid] + _descendants_linux(pid, children)) for pid in pids}
+
+
+def process_tree_rss(pid=None):
+    """进程及其所有子进程（chromedriver / Chrome）的 RSS 总和，单位字节"""
+    pid = pid or os.getpid()
+    if _PSUTIL_AVAILABLE:
+        try:
+            proc = psutil.Process(pid)
+            total = proc.memory_info().rss
+            for child in proc.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:
+                    pass
+            return total
+        except psutil.Error:
+            return 0
+    if os.path.isdir("/proc"):
+        return tree_rss_many([pid])[pid]
+    return 0
+
+
+def available_memory():
+    """主机当前可用内存（字节）；无法获取时返回 None"""
+    if _PSUTIL_AVAILABLE:
+        return psutil.virtual_memory().available
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
@@ -0,0 +1,35 @@
+# progress.py
+# 抓取过程中的部分结果通知，用于把结果边抓边显示到“正在搜索…”消息里。
+#
+# bot 在发起搜索前用 set_listener() 注册一个回调，回调通过 contextvars 传递：
+# asyncio 任务和调度器的抓取线程都会继承提交时的上下文，
+# 所以 scraper 不需要知道是谁在监听，只要调用 report(page, results)。
+# 回调可能在抓取线程里被调用，必须是线程安全的。
+import contextvars
+
+_listener = contextvars.ContextVar("search_progress", default=None)
+
+
+def set_listener(fn):
+    """注册 fn(page, results)，返回 token（用 reset_listener(token) 取消）"""
+    return _listener.set(fn)
+
+
+def reset_listener(token):
+    _listener.reset(token)
+
+
+def active():
+    return _listener.get() is not None
+
+
+def report(page, results):
+    """报告第 page 页目前已经拿到的结果（结果只会越来越多）"""
+    fn = _listener.get()
+    if fn is None:
+        return
+    try:
+        fn(page, results)
+    except Exception as e:
+        # 显示进度失败不能影响抓取本身
+        print(f"[progress] 部分结果回调失败: {e}")
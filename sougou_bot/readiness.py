@@ -0,0 +1,151 @@
+# readiness.py
+# 自适应的页面就绪等待，替代 driver.get() 之后固定的 time.sleep(8)。
+#
+# 满足以下任一条件即结束等待：
+# - 结果链接（div.gs-title a）已经出现，且数量在 stable_for 秒内不再变化
+# - 页面显示了 Google CSE 的“无结果”标记
+# - 超过硬性截止时间（截止时间根据最近的渲染耗时自动调整）
+import threading
+import time
+from collections import deque
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from extract import RESULT_SELECTOR
+from settings import env_float, env_int
+
+NO_RESULTS_SELECTOR = "div.gs-no-results-result"
+
+READY_RESULTS = "results"
+READY_EMPTY = "empty"
+READY_TIMEOUT = "timeout"
+
+
+class ReadyState:
+    def __init__(self, status, elapsed, count):
+        self.status = status    # READY_RESULTS / READY_EMPTY / READY_TIMEOUT
+        self.elapsed = elapsed  # 实际等待秒数
+        self.count = count      # 结束时页面上的结果链接数量
+
+    def __repr__(self):
+        return f"ReadyState({self.status}, {self.elapsed:.2f}s, count={self.count})"
+
+
+class RenderTimer:
+    """记录最近的渲染等待时间，并据此计算下一次查询的截止时间"""
+
+    def __init__(self, min_deadline=3.0, max_deadline=15.0, margin=1.5, window=50, min_samples=5):
+        self.min_deadline = min_deadline
+        self.max_deadline = max_deadline
+        self.margin = margin
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            min_deadline=env_float("READINESS_MIN_DEADLINE", 3.0),
+            max_deadline=env_float("READINESS_MAX_DEADLINE", 15.0),
+            margin=env_float("READINESS_MARGIN", 1.5),
+            window=env_int("READINESS_WINDOW", 50),
+        )
+
+    def record(self, elapsed):
+        # 超时的查询按截止时间记录：真实渲染时间至少这么长，能把截止时间重新推高
+        with self._lock:
+            self._samples.append(elapsed)
+
+    def percentile(self, pct):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+    def deadline(self):
+        with self._lock:
+            enough = len(self._samples) >= self.min_samples
+        if not enough:
+            return self.max_deadline
+        p95 = self.percentile(95)
+        return max(self.min_deadline, min(self.max_deadline, p95 * self.margin))
+
+    def snapshot(self):
+        with self._lock:
+            n = len(self._samples)
+        return {
+            "samples": n,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "deadline": self.deadline(),
+        }
+
+
+class _ResultsSettled:
+    """WebDriverWait 条件：结果数量稳定或出现“无结果”标记时返回状态，否则返回 False"""
+
+    def __init__(self, stable_for, on_change=None, cancel=None):
+        self.stable_for = stable_for
+        self.on_change = on_change
+        self.cancel = cancel
+        self.count = 0
+        self._since = None
+
+    def __call__(self, driver):
+        if self.cancel is not None:
+            # 每次轮询都检查：被取消时 SearchCancelled 直接穿过 WebDriverWait
+            self.cancel.check()
+        now = time.monotonic()
+        count = len(driver.find_elements(By.CSS_SELECTOR, RESULT_SELECTOR))
+        if count != self.count or self._since is None:
+            if count > self.count and self.on_change is not None:
+                self.on_change(count)
+            self.count = count
+            self._since = now
+        if count:
+            if now - self._since >= self.stable_for:
+                return READY_RESULTS
+            return False
+        if EC.visibility_of_any_elements_located((By.CSS_SELECTOR, NO_RESULTS_SELECTOR))(driver):
+            return READY_EMPTY
+        return False
+
+
+_render_timer = None
+_render_timer_lock = threading.Lock()
+
+
+def get_render_timer():
+    """进程内共享的 RenderTimer（首次使用时按环境变量创建，此时 .env 已经加载）"""
+    global _render_timer
+    with _render_timer_lock:
+        if _render_timer is None:
+            _render_timer = RenderTimer.from_env()
+    return _render_timer
+
+
+def wait_for_results(driver, timer=None, deadline=None, stable_for=None, poll=0.2, on_change=None, cancel=None):
+    """在 driver.get(url) 之后调用，阻塞直到页面就绪或截止时间到达
+
+    on_change(count) 在渲染过程中每次结果链接数量增加时调用（用于流式显示部分结果）。
+    cancel 是 CancelToken：被取消时抛 SearchCancelled，不记录这次的渲染耗时。
+    """
+    timer = get_render_timer() if timer is None else timer
+    deadline = timer.deadline() if deadline is None else deadline
+    stable_for = env_float("READINESS_STABLE_FOR", 0.6) if stable_for is None else stable_for
+
+    condition = _ResultsSettled(stable_for, on_change, cancel)
+    t0 = time.monotonic()
+    try:
+        status = WebDriverWait(driver, deadline, poll_frequency=poll).until(condition)
+    except TimeoutException:
+        status = READY_TIMEOUT
+    elapsed = time.monotonic() - t0
+
+    timer.record(elapsed)
+    return ReadyState(status, elapsed, condition.count)
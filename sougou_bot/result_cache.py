@@ -0,0 +1,223 @@
+# result_cache.py
+# 搜索结果缓存：进程内 LRU（第一层）+ SQLite（第二层，bot 重启后仍然有效）。
+#
+# 键是“规范化的查询词 + 页码”：去掉首尾空白、合并连续空白、casefold。
+# 空结果和失败使用更短的 TTL（负缓存），既避免重复抓取，又能较快恢复。
+# 过期的结果在 SQLite 里再保留 stale_ttl 秒：上游站点不可用（熔断）时用 get_stale() 兜底。
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from settings import env_float, env_int, env_str
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "search_cache.sqlite3")
+
+
+def normalize_query(query):
+    return " ".join(query.split()).casefold()
+
+
+def cache_key(query, page=1):
+    return f"{normalize_query(query)}\x1f{page}"
+
+
+class CacheEntry:
+    def __init__(self, results, error, created_at, expires_at):
+        self.results = results  # list[{"title", "link"}]，失败时为 None
+        self.error = error      # 失败时的错误信息，成功时为 None
+        self.created_at = created_at
+        self.expires_at = expires_at
+
+    @property
+    def negative(self):
+        return self.error is not None or not self.results
+
+    def expired(self, now=None):
+        return (time.time() if now is None else now) >= self.expires_at
+
+
+class ResultCache:
+    def __init__(self, max_entries=512, ttl=3600.0, negative_ttl=120.0, db_path=DEFAULT_DB_PATH, stale_ttl=86400.0):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._puts_since_prune = 0
+        self.stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evictions": 0,
+            "stores": 0,
+            "negative_stores": 0,
+            "stale_hits": 0,
+        }
+        if db_path:
+            self._open_db(db_path)
+
+    @classmethod
+    def from_env(cls):
+        db_path = env_str("CACHE_DB_PATH", DEFAULT_DB_PATH)
+        if db_path.lower() in ("off", "none", "memory"):
+            db_path = None
+        return cls(
+            max_entries=env_int("CACHE_MAX_ENTRIES", 512),
+            ttl=env_float("CACHE_TTL", 3600.0),
+            negative_ttl=env_float("CACHE_NEGATIVE_TTL", 120.0),
+            db_path=db_path,
+            stale_ttl=env_float("CACHE_STALE_TTL", 86400.0),
+        )
+
+    # ---------- 读 ----------
+
+    def get(self, query, page=1):
+        """返回未过期的 CacheEntry，未命中返回 None"""
+        key = cache_key(query, page)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not entry.expired(now):
+                    self._memory.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self.stats["memory_hits"] += 1
+                    return entry
+                del self._memory[key]
+                self.stats["expired"] += 1
+
+            entry = self._db_get(key)
+            if entry is not None:
+                if not entry.expired(now):
+                    self._memory_put(key, entry)
+                    self.stats["hits"] += 1
+                    self.stats["disk_hits"] += 1
+                    return entry
+                self.stats["expired"] += 1
+
+            self.stats["misses"] += 1
+            return None
+
+    def get_stale(self, query, page=1):
+        """返回有结果的缓存条目，即使已经过期（上游不可用时兜底）；没有返回 None"""
+        key = cache_key(query, page)
+        with self._lock:
+            entry = self._memory.get(key) or self._db_get(key)
+            if entry is None or entry.negative or time.time() >= entry.expires_at + self.stale_ttl:
+                return None
+            self.stats["stale_hits"] += 1
+        return entry
+
+    def peek(self, query, page=1):
+        """返回缓存条目（可能已经过期，不计入命中统计）；没有缓存返回 None"""
+        key = cache_key(query, page)
+        with self._lock:
+            return self._memory.get(key) or self._db_get(key)
+
+    def expires_in(self, query, page=1):
+        """缓存条目距离过期还有多少秒（不计入命中统计）；没有缓存返回 None"""
+        entry = self.peek(query, page)
+        if entry is None:
+            return None
+        return entry.expires_at - time.time()
+
+    # ---------- 写 ----------
+
+    def put(self, query, page, results):
+        ttl = self.ttl if results else self.negative_ttl
+        self._store(cache_key(query, page), list(results), None, ttl)
+
+    def put_error(self, query, page, error):
+        self._store(cache_key(query, page), None, str(error), self.negative_ttl)
+
+    def _store(self, key, results, error, ttl):
+        now = time.time()
+        entry = CacheEntry(results, error, now, now + ttl)
+        with self._lock:
+            self._memory_put(key, entry)
+            self._db_put(key, entry)
+            self.stats["stores"] += 1
+            if entry.negative:
+                self.stats["negative_stores"] += 1
+
+    def _memory_put(self, key, entry):
+        # 调用前必须持有 self._lock
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+                self._db.commit()
+
+    def snapshot(self):
+        with self._lock:
+            size = len(self._memory)
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hit_ratio = self.stats["hits"] / lookups if lookups else 0.0
+        return dict(self.stats, memory_entries=size, hit_ratio=round(hit_ratio, 4))
+
+    # ---------- SQLite 层 ----------
+
+    def _open_db(self, db_path):
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " results TEXT,"
+                " error TEXT,"
+                " created_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"[cache] 无法打开 SQLite 缓存 {db_path}，只使用内存缓存: {e}")
+            self._db = None
+
+    def _db_get(self, key):
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT results, error, created_at, expires_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"[cache] 读取 SQLite 缓存失败: {e}")
+            return None
+        if row is None:
+            return None
+        results = json.loads(row[0]) if row[0] is not None else None
+        return CacheEntry(results, row[1], row[2], row[3])
+
+    def _db_put(self, key, entry):
+        if self._db is None:
+            return
+        results = json.dumps(entry.results, ensure_ascii=False) if entry.results is not None else None
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, results, error, created_at, expires_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, results, entry.error, entry.created_at, entry.expires_at),
+            )
+            self._puts_since_prune += 1
+            if self._puts_since_prune >= 100:
+                # 定期清理过期太久的行，避免数据库无限增长
+                self._puts_since_prune = 0
+                self._db.execute("DELETE FROM results WHERE expires_at < ?", (time.time() - self.stale_ttl,))
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"[cache] 写入 SQLite 缓存失败: {e}")
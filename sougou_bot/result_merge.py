@@ -0,0 +1,28 @@
+# result_merge.py
+# 结果去重 / 多页合并。只依赖标准库：bot 在 scraper（selenium、bs4 等）加载完成之前
+# 也要用它合并缓存里的结果，所以从 scraper.py 中拆了出来（scraper 仍然导出这两个函数）。
+
+
+def dedupe_results(pairs):
+    """把 (title, link) 序列转换成 [{"title", "link"}]，按 link 去重并保持原有顺序"""
+    # 使用 set 去重（基于 link，因为 link 通常更唯一）
+    seen_links = set()
+    results = []
+    for title, link in pairs:
+        if title and link:
+            # 只在没见过这个 link 时才添加
+            if link not in seen_links:
+                seen_links.add(link)
+                results.append({"title": title, "link": link})
+            else:
+                print(f"[scraper] 跳过重复: {link}")
+    return results
+
+
+def merge_pages(page_results):
+    """按页码顺序合并多页结果并按 link 去重；未完成的页传 None"""
+    pairs = []
+    for results in page_results:
+        for item in results or ():
+            pairs.append((item["title"], item["link"]))
+    return dedupe_results(pairs)
@@ -0,0 +1,85 @@
+# result_sessions.py
+# 分页用的结果集会话。
+#
+# 每次搜索的结果保存在一个短 token 下（token 放进 inline 按钮的 callback_data，
+# Telegram 限制 callback_data 最长 64 字节），用户点“上一页/下一页”时直接用保存的
+# 结果编辑原消息，不需要重新打开浏览器，也不会刷屏发新消息。
+# 会话有 TTL 和数量上限，过期或被挤出的会话需要用户重新搜索。
+import secrets
+import time
+from collections import OrderedDict
+
+from settings import env_float, env_int
+
+
+class ResultSession:
+    def __init__(self, token, query, results, source_pages, ttl):
+        self.token = token
+        self.query = query
+        self.results = list(results)
+        self.source_pages = source_pages  # 已经抓取（或尝试抓取）的搜索引擎页数
+        self.exhausted = False            # 搜索引擎已经没有更多结果
+        self.prefetch = None              # 正在进行的后台预取任务
+        self.expires_at = time.monotonic() + ttl
+
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+    def extend(self, results):
+        """追加新抓到的结果（按 link 去重），返回新增数量"""
+        seen = {item["link"] for item in self.results}
+        added = 0
+        for item in results:
+            if item["link"] not in seen:
+                seen.add(item["link"])
+                self.results.append(item)
+                added += 1
+        return added
+
+
+class ResultSessionStore:
+    def __init__(self, ttl=1800.0, max_sessions=1000):
+        self.ttl = ttl
+        self.max_sessions = max(1, max_sessions)
+        self._sessions = OrderedDict()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            ttl=env_float("RESULT_SESSION_TTL", 1800.0),
+            max_sessions=env_int("RESULT_SESSION_MAX", 1000),
+        )
+
+    def create(self, query, results, source_pages):
+        token = secrets.token_urlsafe(6)
+        while token in self._sessions:
+            token = secrets.token_urlsafe(6)
+        session = ResultSession(token, query, results, source_pages, self.ttl)
+        self._sessions[token] = session
+        while len(self._sessions) > self.max_sessions:
+            _, old = self._sessions.popitem(last=False)
+            self._cancel(old)
+        return session
+
+    def get(self, token):
+        session = self._sessions.get(token)
+        if session is None:
+            return None
+        if session.expired():
+            del self._sessions[token]
+            self._cancel(session)
+            return None
+        self._sessions.move_to_end(token)
+        return session
+
+    def prune(self):
+        for token in [t for t, s in self._sessions.items() if s.expired()]:
+            self._cancel(self._sessions.pop(token))
+
+    def __len__(self):
+        return len(self._sessions)
+
+    @staticmethod
+    def _cancel(session):
+        if session.prefetch is not None and not session.prefetch.done():
+            session.prefetch.cancel()
@@ -0,0 +1,267 @@
+# scheduler.py
+# 专用的抓取调度器，替代 loop.run_in_executor(None, ...)（asyncio 默认线程池）。
+#
+# - 并发上限：同时运行的抓取数量与主机能承受的 Chrome 数量一致
+# - 有界队列 + 按用户轮询（round-robin），一个用户刷屏不会饿死其他用户
+# - 每个用户一个令牌桶限速
+# - 过载保护：队列太深时立即拒绝，并告诉用户当前排在第几位
+# - 后台任务（缓存预热）单独排队，只在没有交互请求排队、且留出一个空闲槽位时运行
+# - 等待者取消 Future 时：还在排队的任务直接移出队列；已经在运行的任务通过 CancelToken 通知
+#   scraper 在下一个检查点停下（见 cancellation.py）
+# 所有方法都在事件循环线程中调用，不需要加锁。
+import asyncio
+import contextvars
+import functools
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cancellation
+from settings import env_float, env_int
+
+
+class SchedulerBusy(RuntimeError):
+    """队列已满，本次抓取被拒绝"""
+
+    def __init__(self, position):
+        super().__init__(f"搜索队列已满（当前排在第 {position} 位）")
+        self.position = position
+
+
+class RateLimited(RuntimeError):
+    """用户请求过于频繁"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"请求过于频繁，请 {retry_after:.0f} 秒后再试")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        """取一个令牌；成功返回 0，否则返回还需等待的秒数"""
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def full(self):
+        self._refill(time.monotonic())
+        return self.tokens >= self.burst
+
+
+class _Job:
+    def __init__(self, user_id, fn, args, future, background=False):
+        self.user_id = user_id
+        self.fn = fn
+        self.args = args
+        self.future = future
+        self.background = background
+        self.started = False
+        self.cancel = cancellation.CancelToken()
+        self.enqueued_at = time.monotonic()
+        # 把提交时的上下文（例如 metrics 的 SearchTrace）带进抓取线程
+        self.context = contextvars.copy_context()
+
+
+class ScrapeScheduler:
+    def __init__(self, concurrency=2, max_queue=20, user_rate=0.2, user_burst=3, max_background=10):
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.max_background = max(0, max_background)
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="scrape")
+        self._queues = OrderedDict()  # user_id -> deque[_Job]，按轮询顺序排列
+        self._background = deque()
+        self._buckets = {}
+        self._running = 0
+        self._waits = deque(maxlen=200)
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "shed": 0,
+            "rate_limited": 0,
+            "dropped": 0,  # 排队期间被取消的任务
+            "aborted": 0,  # 运行中被取消的任务
+            "background": 0,
+        }
+
+    @classmethod
+    def from_env(cls):
+        # 多进程模式下并发上限等于 worker 数，否则等于进程内浏览器池大小
+        concurrency = env_int("SCRAPE_CONCURRENCY", env_int("SCRAPER_WORKERS", 0) or env_int("SCRAPER_POOL_SIZE", 2))
+        return cls(
+            concurrency=concurrency,
+            max_queue=env_int("SCRAPE_MAX_QUEUE", 20),
+            user_rate=env_float("SCRAPE_USER_RATE", 0.2),
+            user_burst=env_int("SCRAPE_USER_BURST", 3),
+            max_background=env_int("SCRAPE_MAX_BACKGROUND", 10),
+        )
+
+    # ---------- 准入 ----------
+
+    def admit(self, user_id):
+        """在发起新抓取前调用：超出用户限速抛 RateLimited，队列已满抛 SchedulerBusy"""
+        if self.depth() >= self.max_queue and self._running >= self.concurrency:
+            self.stats["shed"] += 1
+            raise SchedulerBusy(self.estimate_position(user_id))
+
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) > 10000:
+                self._prune_buckets()
+            bucket = self._buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+        retry_after = bucket.take()
+        if retry_after > 0:
+            self.stats["rate_limited"] += 1
+            raise RateLimited(retry_after)
+
+    def _prune_buckets(self):
+        for user_id in [u for u, b in self._buckets.items() if b.full()]:
+            del self._buckets[user_id]
+
+    # ---------- 提交 / 调度 ----------
+
+    def submit(self, user_id, fn, *args, background=False):
+        """把 fn(*args) 放入队列，返回 asyncio.Future；队列已满时抛 SchedulerBusy"""
+        future = asyncio.get_event_loop().create_future()
+        job = _Job(user_id, fn, args, future, background=background)
+        if background:
+            if len(self._background) >= self.max_background:
+                raise SchedulerBusy(len(self._background) + 1)
+            self._background.append(job)
+            self.stats["background"] += 1
+        else:
+            if self._running >= self.concurrency and self.depth() >= self.max_queue:
+                self.stats["shed"] += 1
+                raise SchedulerBusy(self.estimate_position(user_id))
+            self._queues.setdefault(user_id, deque()).append(job)
+        self.stats["submitted"] += 1
+        future.add_done_callback(lambda f, job=job: self._on_cancelled(job) if f.cancelled() else None)
+        self._pump()
+        return future
+
+    async def run(self, user_id, fn, *args, background=False):
+        return await self.submit(user_id, fn, *args, background=background)
+
+    def _next_job(self):
+        if self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            # 轮询：这个用户的下一个任务排到所有其他用户之后
+            if queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            return job
+        # 后台任务始终给交互请求留一个空闲槽位
+        reserve = 1 if self.concurrency > 1 else 0
+        if self._background and self._running < self.concurrency - reserve:
+            return self._background.popleft()
+        return None
+
+    def _pump(self):
+        loop = asyncio.get_event_loop()
+        while self._running < self.concurrency:
+            job = self._next_job()
+            if job is None:
+                break
+
+            if job.future.done():
+                # 等待者已经取消，直接丢弃，不占用浏览器
+                self.stats["dropped"] += 1
+                continue
+
+            self._waits.append(time.monotonic() - job.enqueued_at)
+            self._running += 1
+            job.started = True
+            call = functools.partial(job.context.run, self._call, job)
+            inner = loop.run_in_executor(self._executor, call)
+            inner.add_done_callback(lambda f, job=job: self._on_done(job, f))
+
+    @staticmethod
+    def _call(job):
+        # 在任务自己的上下文里运行，scraper 通过 cancellation.check() 得知任务已被取消
+        cancellation.bind(job.cancel)
+        return job.fn(*job.args)
+
+    def _on_cancelled(self, job):
+        if job.started:
+            # 已经在线程里运行：让 scraper 在下一个检查点停下，浏览器照常归还
+            job.cancel.cancel()
+            self.stats["aborted"] += 1
+            return
+        if job.background:
+            queue = self._background
+        else:
+            queue = self._queues.get(job.user_id, ())
+        if job in queue:
+            # 立即移出队列，排队位置的估算也随之更新
+            queue.remove(job)
+            if not job.background and not queue:
+                del self._queues[job.user_id]
+            self.stats["dropped"] += 1
+
+    def _on_done(self, job, inner):
+        self._running -= 1
+        if isinstance(inner.exception(), cancellation.SearchCancelled):
+            # 已经计入 aborted，等待者也已经离开
+            pass
+        elif inner.exception() is not None:
+            self.stats["failed"] += 1
+            if not job.future.done():
+                job.future.set_exception(inner.exception())
+        else:
+            self.stats["completed"] += 1
+            if not job.future.done():
+                job.future.set_result(inner.result())
+        self._pump()
+
+    # ---------- 观测 ----------
+
+    def depth(self):
+        return sum(len(q) for q in self._queues.values())
+
+    def estimate_position(self, user_id):
+        """估算该用户的新请求在轮询队列中的位置（1 表示下一个执行）"""
+        if self._running < self.concurrency and not self._queues:
+            return 0
+        mine = len(self._queues.get(user_id, ()))
+        # 轮询时，其他用户每人最多排在我前面 mine + 1 个任务
+        ahead = sum(min(len(q), mine + 1) for u, q in self._queues.items() if u != user_id)
+        return ahead + mine + 1
+
+    def wait_percentile(self, pct):
+        samples = sorted(self._waits)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))]
+
+    def snapshot(self):
+        return dict(
+            self.stats,
+            running=self._running,
+            concurrency=self.concurrency,
+            depth=self.depth(),
+            max_queue=self.max_queue,
+            background_depth=len(self._background),
+            users_queued=len(self._queues),
+            wait_p50=round(self.wait_percentile(50), 3),
+            wait_p95=round(self.wait_percentile(95), 3),
+        )
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
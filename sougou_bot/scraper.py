@@ -1,147 +1,582 @@
 # scraper.py
+import asyncio
+import atexit
+import json
+import re
+import threading
 import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import aiohttp
 from bs4 import BeautifulSoup
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
+from selenium.common.exceptions import TimeoutException, WebDriverException
 
-# Try to import webdriver_manager; fall back to system chromedriver or selenium-manager
-try:
-    from webdriver_manager.chrome import ChromeDriverManager
-    _WEBDRIVER_MANAGER_AVAILABLE = True
-except ImportError:
-    _WEBDRIVER_MANAGER_AVAILABLE = False
+from browser_cache import ProfileCache
+from circuit_breaker import CircuitBreaker
+from driver_factory import DriverFactory
+from driver_pool import DriverPool
+from memory_governor import MemoryGovernor
+from extract import RESULT_SELECTOR, extract_from_html, extract_in_browser
+from lean_profile import collect_traffic, install_blocking, reset_traffic
+import cancellation
+import progress
+from cancellation import SearchCancelled
+from metrics import stage
+from readiness import READY_TIMEOUT, get_render_timer, wait_for_results
+from result_merge import dedupe_results, merge_pages
+from settings import env_bool, env_float, env_int, env_str
+from watchdog import DeadlineResults, NavigationTimeout, get_watchdog
 
-# Try to import Service class (name varies across selenium versions)
-try:
-    # selenium 4+: Service is available here
-    from selenium.webdriver.chrome.service import Service as ChromeService
-    _CHROME_SERVICE_AVAILABLE = True
-except Exception:
-    ChromeService = None
-    _CHROME_SERVICE_AVAILABLE = False
 
+BASE_URL = "https://telegramsearchengine.com/"
+MAX_RESULTS = 20
 
-def search_telegram(query, page=1):
-    base_url = "https://telegramsearchengine.com/"
+
+def build_url(query, page=1):
     params = {
         "q": query,
         "gsc.tab": "0",
         "gsc.q": query,
         "gsc.page": str(page - 1)
     }
-    url = base_url + "?" + urllib.parse.urlencode(params)
-
-    # Headless Chrome
-    options = Options()
-    options.add_argument("--headless=new")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64)")
-
-    # Initialize Chrome driver with robust fallback logic to support multiple Selenium versions
-    print("[scraper] 初始化 Chrome driver...")
-    driver = None
-    driver_path = None
-    if _WEBDRIVER_MANAGER_AVAILABLE:
+    # SCRAPER_BASE_URL 可以指向本地桩服务（见 stub_server.py / benchmark.py）
+    return env_str("SCRAPER_BASE_URL", BASE_URL) + "?" + urllib.parse.urlencode(params)
+
+
+# 进程内共享的 driver 工厂：第一次创建浏览器时探测初始化方式，之后直接复用
+_factory = None
+_factory_lock = threading.Lock()
+
+
+def get_driver_factory():
+    global _factory
+    with _factory_lock:
+        if _factory is None:
+            _factory = DriverFactory()
+    return _factory
+
+
+# 共享的浏览器磁盘缓存：每个浏览器启动时从预热好的模板复制缓存（SCRAPER_PROFILE_CACHE=0 关闭）
+_profiles = None
+_profiles_lock = threading.Lock()
+
+
+def get_profile_cache():
+    """进程内共享的 ProfileCache；关闭时返回 None"""
+    global _profiles
+    with _profiles_lock:
+        if _profiles is None and ProfileCache.enabled():
+            _profiles = ProfileCache.from_env()
+            _profiles.maybe_prune(force=True)
+    return _profiles
+
+
+def profile_cache_snapshot():
+    return _profiles.snapshot() if _profiles is not None else {}
+
+
+def create_driver():
+    profiles = get_profile_cache()
+    if profiles is None:
+        driver = get_driver_factory().create()
+    else:
+        profile = profiles.checkout()
         try:
-            driver_path = ChromeDriverManager().install()
-            print(f"[scraper] webdriver_manager returned path: {driver_path}")
-        except Exception as e:
-            print(f"webdriver_manager 下载 chromedriver 失败: {e}")
+            driver = get_driver_factory().create(profiles.arguments(profile))
+        except BaseException:
+            profiles.discard(profile)
+            raise
+        profiles.attach(driver, profile)
+    # 拦截规则对整个浏览器会话有效，池里复用时不需要重新设置
+    install_blocking(driver)
+    # 页面加载超时由浏览器自己中止；浏览器彻底卡死时由 watchdog 兜底（见 search_telegram）
+    driver.set_page_load_timeout(navigation_timeout())
+    return driver
 
-    # Try multiple ways to create the Chrome WebDriver depending on Selenium version
-    errors = []
-    if driver_path:
-        # 1) Preferred: use Service object (Selenium 4+)
-        if _CHROME_SERVICE_AVAILABLE:
-            try:
-                print("[scraper] 尝试使用 ChromeService(...) 初始化 driver")
-                driver = webdriver.Chrome(service=ChromeService(driver_path), options=options)
-                print("[scraper] driver 初始化成功（service）")
-            except Exception as e:
-                print(f"[scraper] service 初始化失败: {e}")
-                errors.append(("service", e))
-
-        # 2) Older Selenium versions accept executable_path keyword
-        if driver is None:
+
+# ---------- 各阶段的硬截止时间 ----------
+# SCRAPER_NAV_TIMEOUT      页面加载超时：到时浏览器停止加载，继续用已经渲染出来的内容，浏览器用完后回收
+# SCRAPER_EXTRACT_TIMEOUT  页面内提取结果的截止时间
+# SCRAPER_RESET_TIMEOUT    浏览器归还到池里之前清理状态的截止时间，超时的浏览器被杀掉并替换
+# SCRAPER_WATCHDOG_GRACE   在上面的截止时间（以及渲染等待的自适应截止时间）之后再等多久，
+#                          仍未返回就杀掉整个浏览器，抛 NavigationTimeout
+
+def navigation_timeout():
+    return env_float("SCRAPER_NAV_TIMEOUT", 20.0)
+
+
+def extraction_timeout():
+    return env_float("SCRAPER_EXTRACT_TIMEOUT", 10.0)
+
+
+def reset_timeout():
+    return env_float("SCRAPER_RESET_TIMEOUT", 10.0)
+
+
+def watchdog_grace():
+    return env_float("SCRAPER_WATCHDOG_GRACE", 5.0)
+
+
+# ---------- 浏览器池 ----------
+# 浏览器在查询之间复用，避免每次查询都付出 Chrome 启动成本
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool():
+    """返回进程内共享的浏览器池（首次调用时创建并在后台预热）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            size = env_int("SCRAPER_POOL_SIZE", 2)
+            _pool = DriverPool(
+                create_driver,
+                size=size,
+                warm=env_int("SCRAPER_POOL_WARM", size),
+                acquire_timeout=env_float("SCRAPER_POOL_ACQUIRE_TIMEOUT", 60.0),
+                reset_timeout=reset_timeout(),
+                governor=MemoryGovernor.from_env(),
+                profiles=get_profile_cache(),
+            )
+            _pool.start()
+            atexit.register(_pool.close)
+    return _pool
+
+
+def pool_snapshot():
+    """浏览器池的统计；池还没有创建时返回空字典（不会因此启动浏览器）"""
+    return _pool.snapshot() if _pool is not None else {}
+
+
+def memory_snapshot():
+    """浏览器内存（整体）；池还没有创建时返回空字典"""
+    return _pool.governor.snapshot() if _pool is not None else {}
+
+
+def browser_memory():
+    """每个浏览器进程树的 RSS（字节）"""
+    return _pool.governor.browsers() if _pool is not None else {}
+
+
+# ---------- 上游熔断 ----------
+# 站点持续超时时，浏览器路径直接抛 CircuitOpen，不再占用队列位置、线程和浏览器
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_site_breaker():
+    global _breaker
+    with _breaker_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker.from_env("telegramsearchengine")
+    return _breaker
+
+
+def search_telegram(query, page=1):
+    url = build_url(query, page)
+
+    pool = get_driver_pool()
+    watchdog = get_watchdog()
+    grace = watchdog_grace()
+    print("[scraper] 从浏览器池获取 Chrome driver...")
+    with stage("driver_acquire"):
+        driver = pool.acquire()
+    broken = False
+    timed_out = False
+
+    try:
+        # 等浏览器期间任务可能已经被取消（用户发起了新的搜索）
+        cancellation.check()
+        print(f"[scraper] 导航到 URL: {url}")
+        reset_traffic(driver)
+        with stage("navigation"), watchdog.guard(driver, navigation_timeout() + grace, "navigation"):
             try:
-                print("[scraper] 尝试使用 executable_path 初始化 driver")
-                driver = webdriver.Chrome(executable_path=driver_path, options=options)
-                print("[scraper] driver 初始化成功（executable_path）")
-            except Exception as e:
-                print(f"[scraper] executable_path 初始化失败: {e}")
-                errors.append(("executable_path", e))
-
-        # 3) Some environments accept the path as the first positional argument
-        if driver is None:
+                driver.get(url)
+            except TimeoutException:
+                # 页面加载超时：停止加载，用已经渲染出来的部分继续；这个浏览器用完后不再复用
+                print(f"[scraper] 页面加载超过 {navigation_timeout():.0f}s，停止加载")
+                broken = timed_out = True
+                driver.execute_script("window.stop();")
+        cancellation.check()
+        # 等待 JS 渲染：结果稳定 / 出现“无结果” / 到达自适应截止时间，三者先到为准
+        render_deadline = get_render_timer().deadline()
+        print(f"[scraper] 等待页面内容加载（最长 {render_deadline:.1f}s）...")
+        on_change = None
+        if progress.active():
+            def on_change(count):
+                # 结果还在陆续渲染：把已经出现的部分先报告出去
+                try:
+                    partial = dedupe_results(extract_in_browser(driver))[:MAX_RESULTS]
+                except WebDriverException:
+                    return
+                progress.report(page, partial)
+        with stage("render_wait"), watchdog.guard(driver, render_deadline + grace, "render_wait"):
+            ready = wait_for_results(
+                driver, deadline=render_deadline, on_change=on_change, cancel=cancellation.current()
+            )
+        print(f"[scraper] 等待结束: {ready.status}，用时 {ready.elapsed:.2f}s，正在页面内提取结果")
+        if ready.status == READY_TIMEOUT and not ready.count:
+            # 到截止时间一个结果都没有渲染出来：上游很慢，计入熔断器
+            timed_out = True
+        with stage("extraction"), watchdog.guard(driver, extraction_timeout() + grace, "extraction"):
             try:
-                print("[scraper] 尝试使用 positional path 初始化 driver")
-                driver = webdriver.Chrome(driver_path, options=options)
-                print("[scraper] driver 初始化成功（positional）")
-            except Exception as e:
-                print(f"[scraper] positional 初始化失败: {e}")
-                errors.append(("positional", e))
-
-    # 4) Fallback: let Selenium use selenium-manager or system chromedriver
-    if driver is None:
+                # 在页面内执行选择器，只传回 [title, href]，不再传输整页 HTML
+                pairs = extract_in_browser(driver)
+            except WebDriverException as e:
+                print(f"[scraper] 页面内提取失败，改用 page_source 解析: {e}")
+                html = driver.page_source
+                print(f"[scraper] 已取得 page_source（{len(html)} bytes）")
+                pairs = extract_from_html(html)
+        print(f"[scraper] 找到 {len(pairs)} 个 {RESULT_SELECTOR} 元素")
+        traffic = collect_traffic(driver)
+        if traffic is not None:
+            print(f"[scraper] 本次查询传输 {traffic.bytes / 1024:.1f} KB，{traffic.requests} 个请求，"
+                  f"拦截 {traffic.blocked} 个，缓存命中 {traffic.cached} 个")
+            if _profiles is not None:
+                _profiles.record(traffic)
+    except SearchCancelled:
+        # 停止加载，浏览器没有问题，照常归还给下一个查询
+        print(f"[scraper] 搜索 {query!r} 已被取消，停止加载并归还浏览器")
         try:
-            print("[scraper] 尝试使用 Selenium 默认方式初始化 driver（selenium-manager 或系统 chromedriver）")
-            driver = webdriver.Chrome(options=options)
-            print("[scraper] driver 初始化成功（default）")
-        except Exception as e:
-            print(f"[scraper] default 初始化失败: {e}")
-            errors.append(("default", e))
-
-    if driver is None:
-        # All attempts failed — raise a consolidated error for debugging
-        msg_lines = [f"无法初始化 Chrome driver，尝试的方式和错误："]
-        for k, v in errors:
-            msg_lines.append(f" - {k}: {v}")
-        raise RuntimeError("\n".join(msg_lines))
-
-    # try to set reasonable timeouts to avoid hanging on page load
-    try:
-        print(f"[scraper] 导航到 URL: {url}")
-        # 不使用 set_page_load_timeout，直接导航并等待
-        driver.get(url)
-        print("[scraper] 等待页面内容加载（sleep 8s）...")
-        time.sleep(8)  # 等待 JS 渲染
-        print("[scraper] sleep 结束，正在获取 page_source")
-        html = driver.page_source
-        print(f"[scraper] 页面加载完成，已取得 page_source（{len(html)} bytes）")
+            driver.execute_script("window.stop();")
+        except WebDriverException:
+            broken = True
+        raise
     except Exception as e:
         print(f"[scraper] 在 driver.get 或渲染过程中发生异常: {e}")
+        broken = True
         raise
     finally:
-        try:
-            driver.quit()
-        except Exception:
-            pass
-
-    soup = BeautifulSoup(html, "html.parser")
-
-    # 根据页面结构选择 CSS selector
-    items = soup.select("div.gs-title a")
-    print(f"[scraper] 从 HTML 中找到 {len(items)} 个 div.gs-title a 元素")
-
-    # 使用 set 去重（基于 link，因为 link 通常更唯一）
-    seen_links = set()
-    results = []
-    for a in items:
-        title = a.get_text(strip=True)
-        link = a.get("href")
-        if title and link:
-            # 只在没见过这个 link 时才添加
-            if link not in seen_links:
-                seen_links.add(link)
-                results.append({"title": title, "link": link})
-            else:
-                print(f"[scraper] 跳过重复: {link}")
+        # 归还浏览器；出错的浏览器直接销毁，由池在后台补一个新的
+        pool.release(driver, broken=broken)
 
+    with stage("dedupe"):
+        results = dedupe_results(pairs)
     print(f"[scraper] 去重后得到 {len(results)} 个结果")
-    return results[:20]  # 限制前20个结果
+    return DeadlineResults(results[:MAX_RESULTS], timed_out=timed_out)  # 限制前20个结果
+
+
+# ---------- 多页并发抓取 ----------
+
+_page_executor = None
+_page_executor_lock = threading.Lock()
+
+
+def get_page_executor():
+    """多页抓取共用的线程池（同时在跑的页数受浏览器池限制，线程数取池大小的两倍）"""
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is None:
+            _page_executor = ThreadPoolExecutor(
+                max_workers=max(2, env_int("SCRAPER_POOL_SIZE", 2) * 2), thread_name_prefix="scrape-page"
+            )
+    return _page_executor
+
+
+def search_telegram_pages(query, pages=3, deadline=30.0):
+    """并发抓取第 1..pages 页，每页使用池中一个独立的浏览器。
+
+    在全局截止时间 deadline 秒内返回已完成页的合并结果；超时的页直接放弃
+    （不等待它们：结束后会自行把浏览器归还到池里）。
+    """
+    executor = get_page_executor()
+    futures = [executor.submit(search_telegram, query, page) for page in range(1, pages + 1)]
+    done, not_done = wait(futures, timeout=deadline)
+
+    page_results = []
+    errors = []
+    for page, future in enumerate(futures, 1):
+        if future in not_done:
+            print(f"[scraper] 第 {page} 页在 {deadline:.1f}s 内未完成，放弃")
+            page_results.append(None)
+        elif future.exception() is not None:
+            print(f"[scraper] 第 {page} 页抓取失败: {future.exception()}")
+            errors.append(future.exception())
+            page_results.append(None)
+        else:
+            page_results.append(future.result())
+
+    if all(r is None for r in page_results):
+        # 没有任何一页拿到结果：报告错误，而不是返回空结果
+        if errors:
+            raise errors[0]
+        raise TimeoutError(f"搜索超时（{deadline:.0f}s 内没有任何一页完成）")
+    results = merge_pages(page_results)
+    print(f"[scraper] {len(done)}/{pages} 页完成，合并去重后得到 {len(results)} 个结果")
+    return results
+
+
+# ---------- 无浏览器快速路径 ----------
+# 页面上的搜索结果由内嵌的 Google Custom Search (CSE) 元素生成，
+# 它自己去请求 cse.google.com 的 JSON 接口。这里直接用 aiohttp 请求同一个接口：
+#   1. 站点首页 -> 找到 cse.js?cx=...（cx 是搜索引擎 ID，找不到就用已知值）
+#   2. cse.js -> 取出 cse_token 和 cselibVersion
+#   3. /cse/element/v1 -> JSONP 结果，解析成和 Selenium 路径相同的 {"title", "link"}
+# 任何一步失败都抛 FastPathError，search() 会自动回退到 Selenium。
+# 站点和 CSE 地址可以通过 FAST_PATH_SITE_URL / FAST_PATH_CSE_URL 指向本地桩服务（见 stub_server.py）。
+
+DEFAULT_CSE_CX = "3efd7fa5ca51ba289"
+CSE_BASE_URL = "https://cse.google.com"
+_HTTP_HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
+_FAST_PATH_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ValueError)
+
+
+class FastPathError(RuntimeError):
+    """快速路径无法取得结果（接口变化、token 失效、网络错误等）"""
+
+
+fast_path_stats = {
+    "fast_ok": 0,
+    "fast_failed": 0,
+    "fallbacks": 0,
+    "skipped": 0,  # 快速路径被关闭或处于冷却期，直接走 Selenium
+}
+
+_http_session = None
+_cse_lock = None
+_cse_config = {"cx": None, "token": None, "libv": "", "fetched_at": 0.0}
+_fast_path_failures = 0
+_fast_path_disabled_until = 0.0
+
+
+async def get_http_session():
+    """进程内共享的 aiohttp 会话（连接池复用 TCP/TLS 连接）"""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=env_int("FAST_PATH_MAX_CONNECTIONS", 20),
+                ttl_dns_cache=300,
+            ),
+            headers=_HTTP_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=env_float("FAST_PATH_TIMEOUT", 5.0)),
+        )
+    return _http_session
+
+
+async def close_http_session():
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
+
+async def _fetch_text(url, params=None, headers=None):
+    session = await get_http_session()
+    async with session.get(url, params=params, headers=headers) as resp:
+        if resp.status != 200:
+            raise FastPathError(f"HTTP {resp.status}: {url}")
+        return await resp.text()
+
+
+def _cse_url():
+    return env_str("FAST_PATH_CSE_URL", CSE_BASE_URL).rstrip("/")
+
+
+async def _load_cse_config(refresh=False):
+    global _cse_lock
+    if _cse_lock is None:
+        _cse_lock = asyncio.Lock()
+    async with _cse_lock:
+        ttl = env_float("FAST_PATH_TOKEN_TTL", 600.0)
+        if not refresh and _cse_config["token"] and time.time() - _cse_config["fetched_at"] < ttl:
+            return _cse_config
+
+        cx = _cse_config["cx"] or env_str("FAST_PATH_CX")
+        if cx is None:
+            try:
+                html = await _fetch_text(env_str("FAST_PATH_SITE_URL", BASE_URL))
+                match = re.search(r"cse\.js\?cx=([\w:-]+)", html)
+                cx = match.group(1) if match else None
+            except (FastPathError,) + _FAST_PATH_ERRORS as e:
+                print(f"[scraper] 无法从站点首页获取 cx，使用默认值: {e}")
+            cx = cx or DEFAULT_CSE_CX
+
+        js = await _fetch_text(f"{_cse_url()}/cse.js", params={"cx": cx})
+        token = re.search(r'"cse_token"\s*:\s*"([^"]+)"', js)
+        if not token:
+            raise FastPathError("cse.js 中没有找到 cse_token")
+        libv = re.search(r'"cselibVersion"\s*:\s*"([^"]+)"', js)
+        _cse_config.update(
+            cx=cx,
+            token=token.group(1),
+            libv=libv.group(1) if libv else "",
+            fetched_at=time.time(),
+        )
+        return _cse_config
+
+
+def parse_cse_response(text):
+    """解析 /cse/element/v1 返回的 JSONP（或纯 JSON），得到 [{"title", "link"}]"""
+    body = text.strip()
+    if not body.startswith("{"):
+        # 形如 /*O_o*/ google.search.cse.api123({...});
+        start, end = body.find("("), body.rfind(")")
+        if start < 0 or end < start:
+            raise FastPathError("无法识别的 CSE 响应格式")
+        body = body[start + 1:end]
+    try:
+        data = json.loads(body)
+    except ValueError as e:
+        raise FastPathError(f"CSE 响应不是合法 JSON: {e}")
+
+    if "error" in data:
+        error = data["error"]
+        message = error.get("message") if isinstance(error, dict) else error
+        raise FastPathError(f"CSE 返回错误: {message}")
+
+    pairs = []
+    for item in data.get("results", []):
+        title = item.get("titleNoFormatting") or BeautifulSoup(item.get("title", ""), "html.parser").get_text()
+        link = item.get("unescapedUrl") or item.get("url")
+        pairs.append((title.strip(), link))
+    return dedupe_results(pairs)[:MAX_RESULTS]
+
+
+async def search_telegram_fast(query, page=1):
+    """不打开浏览器，直接请求 CSE 接口获取搜索结果"""
+    for attempt in (1, 2):
+        config = await _load_cse_config(refresh=attempt == 2)
+        params = {
+            "rsz": "filtered_cse",
+            "num": "10",
+            "hl": "zh-CN",
+            "source": "gcsc",
+            "start": str((page - 1) * 10),
+            "cselibv": config["libv"],
+            "cx": config["cx"],
+            "q": query,
+            "safe": "off",
+            "cse_tok": config["token"],
+            "callback": "google.search.cse.api0",
+        }
+        text = await _fetch_text(
+            f"{_cse_url()}/cse/element/v1",
+            params=params,
+            headers={"Referer": build_url(query, page)},
+        )
+        try:
+            return parse_cse_response(text)
+        except FastPathError:
+            # token 可能已经过期：刷新一次配置再试
+            if attempt == 2:
+                raise
+
+
+def fast_path_enabled():
+    return env_bool("FAST_PATH", True) and time.monotonic() >= _fast_path_disabled_until
+
+
+def fallback_rate():
+    attempts = fast_path_stats["fast_ok"] + fast_path_stats["fallbacks"]
+    return fast_path_stats["fallbacks"] / attempts if attempts else 0.0
+
+
+async def _run_selenium_in_executor(query, page):
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, search_telegram, query, page)
+
+
+async def _run_selenium_guarded(run_selenium, query, page):
+    """经过熔断器执行一次浏览器抓取；熔断中直接抛 CircuitOpen"""
+    breaker = get_site_breaker()
+    probe = breaker.allow()
+    try:
+        results = await run_selenium(query, page)
+    except NavigationTimeout:
+        # 浏览器被 watchdog 杀掉，或者 worker 进程的任务超时
+        breaker.timeout(probe)
+        raise
+    except BaseException:
+        # 过载拒绝、取消、解析失败等与站点是否响应无关
+        breaker.release(probe)
+        raise
+    if getattr(results, "timed_out", False):
+        # 页面加载或渲染等待超时：结果照常返回，但上游很慢
+        breaker.timeout(probe)
+    else:
+        breaker.success(probe)
+    return results
+
+
+async def search(query, page=1, run_selenium=None):
+    """优先走快速路径；失败时自动回退到 Selenium。
+
+    run_selenium(query, page) 是一个协程函数，默认在 asyncio 线程池中运行 search_telegram。
+    """
+    global _fast_path_failures, _fast_path_disabled_until
+    run_selenium = run_selenium or _run_selenium_in_executor
+
+    if not fast_path_enabled():
+        fast_path_stats["skipped"] += 1
+        return await _run_selenium_guarded(run_selenium, query, page)
+
+    try:
+        with stage("fast_path"):
+            results = await search_telegram_fast(query, page)
+    except (FastPathError,) + _FAST_PATH_ERRORS as e:
+        fast_path_stats["fast_failed"] += 1
+        fast_path_stats["fallbacks"] += 1
+        _fast_path_failures += 1
+        if _fast_path_failures >= env_int("FAST_PATH_MAX_FAILURES", 5):
+            # 连续失败说明接口可能变了，暂时关闭快速路径，避免每次都白白多等一次
+            cooldown = env_float("FAST_PATH_COOLDOWN", 300.0)
+            _fast_path_disabled_until = time.monotonic() + cooldown
+            _fast_path_failures = 0
+            print(f"[scraper] 快速路径连续失败，暂停 {cooldown:.0f}s")
+        print(f"[scraper] 快速路径失败，回退到 Selenium（回退率 {fallback_rate():.0%}）: {e}")
+        return await _run_selenium_guarded(run_selenium, query, page)
+
+    _fast_path_failures = 0
+    fast_path_stats["fast_ok"] += 1
+    print(f"[scraper] 快速路径得到 {len(results)} 个结果")
+    return results
+
+
+async def search_pages(query, pages=3, deadline=30.0, search_page=None):
+    """异步版多页搜索：并发请求第 1..pages 页，deadline 秒后返回已完成页的合并结果。
+
+    search_page(query, page) 是协程函数，默认使用 search()（快速路径 + Selenium 回退）。
+    """
+    search_page = search_page or search
+    tasks = [asyncio.ensure_future(search_page(query, page)) for page in range(1, pages + 1)]
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+    except asyncio.CancelledError:
+        # 调用方被取消（例如用户发起了新的搜索）：各页的抓取一起取消
+        for task in tasks:
+            task.cancel()
+        raise
+    for task in pending:
+        task.cancel()
+
+    page_results = []
+    errors = []
+    for page, task in enumerate(tasks, 1):
+        if task in pending:
+            print(f"[scraper] 第 {page} 页在 {deadline:.1f}s 内未完成，放弃")
+            page_results.append(None)
+        elif task.cancelled():
+            # 共享的抓取被其他等待者取消了：这一页当作没有完成
+            print(f"[scraper] 第 {page} 页的抓取已被取消")
+            page_results.append(None)
+        elif task.exception() is not None:
+            print(f"[scraper] 第 {page} 页抓取失败: {task.exception()}")
+            errors.append(task.exception())
+            page_results.append(None)
+        else:
+            page_results.append(task.result())
+
+    if all(r is None for r in page_results):
+        # 没有任何一页拿到结果（失败、超时或被取消）：报告第一个错误，而不是返回空结果
+        if errors:
+            raise errors[0]
+        raise TimeoutError(f"搜索超时（{deadline:.0f}s 内没有任何一页完成）")
+    return merge_pages(page_results)
@@ -0,0 +1,41 @@
+# settings.py
+# 统一读取环境变量配置（.env 由 bot.py 的 load_dotenv() 加载）。
+# 注意：这里的函数都是在调用时读取，而不是在 import 时读取，
+# 因为 bot.py 先 import 各个模块再 load_dotenv()（scraper 更是在启动后才在后台加载）。
+import os
+
+
+def env_str(name, default=None):
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip()
+
+
+def env_int(name, default):
+    value = env_str(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        print(f"[settings] 环境变量 {name}={value!r} 不是整数，使用默认值 {default}")
+        return default
+
+
+def env_float(name, default):
+    value = env_str(name)
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        print(f"[settings] 环境变量 {name}={value!r} 不是数字，使用默认值 {default}")
+        return default
+
+
+def env_bool(name, default=False):
+    value = env_str(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
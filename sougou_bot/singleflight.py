@@ -0,0 +1,59 @@
+# singleflight.py
+# 合并相同的并发搜索：同一个 key 同一时间只有一个抓取任务在跑，
+# 其他请求直接等待这个任务，拿到同样的结果或同样的异常。
+#
+# 某个等待者被取消（例如用户的处理协程被取消）不会影响共享任务；
+# 只有当所有等待者都离开时，共享任务才会被取消。
+import asyncio
+
+
+class _Flight:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights = {}
+        self.stats = {
+            "started": 0,    # 实际发起的抓取次数
+            "joined": 0,     # 加入已有抓取的请求数（= 节省的抓取次数）
+            "abandoned": 0,  # 所有等待者都离开后被取消的抓取
+        }
+
+    def inflight(self, key):
+        return key in self._flights
+
+    async def do(self, key, fn):
+        """执行 fn()（无参协程函数）；相同 key 的并发调用共享同一次执行"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task, key=key: self._finish(key, task))
+            self.stats["started"] += 1
+        else:
+            self.stats["joined"] += 1
+
+        flight.waiters += 1
+        try:
+            # shield：取消当前等待者不会传递到共享任务
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+                self.stats["abandoned"] += 1
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _finish(self, key, task):
+        if self._flights.get(key) is not None and self._flights[key].task is task:
+            del self._flights[key]
+        # 所有等待者都已离开时，避免 "Task exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def snapshot(self):
+        return dict(self.stats, inflight=len(self._flights))
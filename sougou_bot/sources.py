@@ -0,0 +1,309 @@
+# sources.py
+# 多来源联合搜索：每个搜索来源实现同一个接口，联合搜索并发请求所有来源并合并结果。
+#
+# - SearchSource.fetch(query, page, **context) -> [{"title", "link"}]
+#   现有的 telegramsearchengine 抓取（快速路径 + Selenium）是其中一个来源
+# - 每个来源有自己的截止时间；第一个远程来源返回后，其他来源最多再等 grace 秒，
+#   慢的来源直接放弃，不拖慢回复（本地语料库毫秒级返回，不开始计时，否则实时抓取几乎总被放弃）
+# - 合并：按规范化的 t.me 链接去重；多个来源都给出的结果排在前面，
+#   其次按各来源排名的倒数加权求和（reciprocal rank fusion）
+# - 每个来源记录最近的成功/失败/超时和耗时；失败率过高的来源自动暂停一段时间
+#
+# 配置：SEARCH_SOURCES=tse,corpus,mirror=http://host/api/search?q={query}&page={page}
+#   tse     telegramsearchengine.com（默认，唯一必需的来源）
+#   corpus  本地语料库（corpus_index.py）
+#   名称=URL 返回 JSON 列表 [{"title", "link"}] 的 HTTP 接口（{query}/{page} 会被替换）
+# 每个来源的截止时间和权重：SOURCE_DEADLINE / SOURCE_<NAME>_DEADLINE、SOURCE_<NAME>_WEIGHT
+import abc
+import asyncio
+import time
+import urllib.parse
+from collections import deque
+
+from circuit_breaker import CircuitOpen
+from corpus_index import canonical_link
+from scheduler import RateLimited, SchedulerBusy
+from settings import env_float, env_int, env_str
+from startup import get_scraper
+from watchdog import DeadlineResults
+
+
+class SourceUnavailable(RuntimeError):
+    """所有来源都失败或超时"""
+
+
+class SearchSource(abc.ABC):
+    """搜索来源的基类：子类实现 fetch()（没有实现的子类在创建时就报错）"""
+
+    name = "source"
+    local = False  # 本地来源（不访问网络），返回不代表上游已经有结果
+
+    def __init__(self, deadline=30.0, weight=1.0, window=20, min_samples=5,
+                 max_failure_rate=0.6, cooldown=300.0):
+        self.deadline = deadline
+        self.weight = weight
+        self.min_samples = min_samples
+        self.max_failure_rate = max_failure_rate
+        self.cooldown = cooldown
+        self._outcomes = deque(maxlen=window)   # True = 成功
+        self._latencies = deque(maxlen=window)
+        self._disabled_until = 0.0
+        self.stats = {"calls": 0, "ok": 0, "errors": 0, "timeouts": 0, "disabled": 0}
+
+    @abc.abstractmethod
+    async def fetch(self, query, page=1, **context):
+        """返回 [{"title", "link"}]"""
+
+    # ---------- 健康状态 ----------
+
+    def available(self):
+        return time.monotonic() >= self._disabled_until
+
+    def record(self, ok, elapsed, timeout=False):
+        self.stats["calls"] += 1
+        if ok:
+            self.stats["ok"] += 1
+            self._latencies.append(elapsed)
+        else:
+            self.stats["timeouts" if timeout else "errors"] += 1
+        self._outcomes.append(ok)
+        failures = self._outcomes.count(False)
+        if len(self._outcomes) >= self.min_samples and failures / len(self._outcomes) >= self.max_failure_rate:
+            # 暂停一段时间；恢复后重新统计，第一次请求就相当于探测
+            self._disabled_until = time.monotonic() + self.cooldown
+            self._outcomes.clear()
+            self.stats["disabled"] += 1
+            print(f"[sources] 来源 {self.name} 最近失败率过高，暂停 {self.cooldown:.0f}s")
+
+    def latency_percentile(self, pct):
+        samples = sorted(self._latencies)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))]
+
+    def snapshot(self):
+        return dict(
+            self.stats,
+            available=int(self.available()),
+            latency_p50=round(self.latency_percentile(50), 3),
+            latency_p95=round(self.latency_percentile(95), 3),
+        )
+
+
+class TelegramSearchEngineSource(SearchSource):
+    """telegramsearchengine.com：快速路径优先，失败时经由调度器用 Selenium 抓取"""
+
+    name = "tse"
+
+    async def fetch(self, query, page=1, run_selenium=None, **context):
+        scraper = await get_scraper()
+        return await scraper.search(query, page, run_selenium=run_selenium)
+
+
+class CorpusSource(SearchSource):
+    """本地语料库（之前抓到过的结果），毫秒级返回"""
+
+    name = "corpus"
+    local = True
+
+    def __init__(self, corpus, limit=20, **kwargs):
+        super().__init__(**kwargs)
+        self.corpus = corpus
+        self.limit = limit
+
+    async def fetch(self, query, page=1, **context):
+        return self.corpus.search(query, self.limit * page)[self.limit * (page - 1):]
+
+
+class HttpJsonSource(SearchSource):
+    """返回 JSON 列表 [{"title", "link"}] 的 HTTP 接口（例如自建的索引服务或 stub_server.py 的 /api/search）"""
+
+    def __init__(self, name, url_template, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.url_template = url_template
+
+    async def fetch(self, query, page=1, **context):
+        url = self.url_template.format(query=urllib.parse.quote(query), page=page)
+        scraper = await get_scraper()
+        session = await scraper.get_http_session()
+        async with session.get(url) as resp:
+            if resp.status != 200:
+                raise RuntimeError(f"HTTP {resp.status}: {url}")
+            data = await resp.json(content_type=None)
+        items = data.get("results", []) if isinstance(data, dict) else data
+        return [{"title": item["title"], "link": item["link"]} for item in items if item.get("link")]
+
+
+class StaticSource(SearchSource):
+    """本地测试用的来源：固定结果、可选的延迟和错误"""
+
+    def __init__(self, name, results=(), delay=0.0, error=None, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.results = list(results)
+        self.delay = delay
+        self.error = error
+
+    async def fetch(self, query, page=1, **context):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return list(self.results)
+
+
+def merge_ranked(source_results, weights=None, k=10):
+    """合并多个来源的结果：[(source_name, results)] -> [{"title", "link"}]
+
+    排序依据：给出该结果的来源数（越多越靠前），然后是 sum(weight / (k + rank))。
+    """
+    weights = weights or {}
+    merged = {}
+    for name, results in source_results:
+        weight = weights.get(name, 1.0)
+        seen = set()
+        for rank, item in enumerate(results, 1):
+            key = canonical_link(item["link"])
+            if key in seen:
+                continue
+            seen.add(key)
+            entry = merged.get(key)
+            if entry is None:
+                entry = merged[key] = {"item": item, "sources": 0, "score": 0.0, "best": weight}
+            elif weight > entry["best"]:
+                # 标题用权重最高的来源给出的
+                entry["item"], entry["best"] = item, weight
+            entry["sources"] += 1
+            entry["score"] += weight / (k + rank)
+    ranked = sorted(merged.values(), key=lambda e: (e["sources"], e["score"]), reverse=True)
+    return [{"title": e["item"]["title"], "link": e["item"]["link"]} for e in ranked]
+
+
+class FederatedSearch:
+    def __init__(self, sources, grace=2.0, rrf_k=10):
+        self.sources = list(sources)
+        self.grace = grace
+        self.rrf_k = rrf_k
+        self.stats = {"searches": 0, "dropped_slow": 0, "all_failed": 0}
+
+    @classmethod
+    def from_env(cls, corpus=None):
+        sources = []
+        for spec in env_str("SEARCH_SOURCES", "tse").split(","):
+            spec = spec.strip()
+            if not spec:
+                continue
+            name, _, url = spec.partition("=")
+            name = name.strip()
+            kwargs = dict(
+                deadline=env_float(f"SOURCE_{name.upper()}_DEADLINE", env_float("SOURCE_DEADLINE", 50.0)),
+                weight=env_float(f"SOURCE_{name.upper()}_WEIGHT", 0.5 if name == "corpus" else 1.0),
+                max_failure_rate=env_float("SOURCE_MAX_FAILURE_RATE", 0.6),
+                cooldown=env_float("SOURCE_COOLDOWN", 300.0),
+            )
+            if url:
+                sources.append(HttpJsonSource(name, url.strip(), **kwargs))
+            elif name == "tse":
+                sources.append(TelegramSearchEngineSource(**kwargs))
+            elif name == "corpus" and corpus is not None:
+                sources.append(CorpusSource(corpus, **kwargs))
+            else:
+                print(f"[sources] 未知的搜索来源 {spec!r}，忽略")
+        if not sources:
+            sources.append(TelegramSearchEngineSource())
+        return cls(sources, grace=env_float("FEDERATED_GRACE", 2.0), rrf_k=env_int("FEDERATED_RRF_K", 10))
+
+    def active_sources(self):
+        active = [s for s in self.sources if s.available()]
+        # 全部被暂停时仍然全部尝试，不能因为健康统计而没有任何结果
+        return active or list(self.sources)
+
+    async def _call(self, source, query, page, context):
+        t0 = time.monotonic()
+        try:
+            results = await asyncio.wait_for(source.fetch(query, page, **context), source.deadline)
+        except asyncio.TimeoutError:
+            source.record(False, time.monotonic() - t0, timeout=True)
+            raise asyncio.TimeoutError(f"搜索来源 {source.name} 在 {source.deadline:g}s 内没有返回")
+        except (SchedulerBusy, RateLimited, CircuitOpen):
+            # 本机过载 / 用户限速 / 熔断器已经在拒绝请求，不重复计入来源的健康统计
+            raise
+        except Exception:
+            source.record(False, time.monotonic() - t0)
+            raise
+        source.record(True, time.monotonic() - t0)
+        return results
+
+    async def search(self, query, page=1, **context):
+        """并发请求所有可用来源，合并结果；所有来源都失败时抛出第一个来源的异常"""
+        results, _ = await self.search_detailed(query, page, **context)
+        return results
+
+    async def search_detailed(self, query, page=1, **context):
+        """同 search()，另外返回 {来源名: 该来源的结果}（只包含成功返回的来源）"""
+        self.stats["searches"] += 1
+        sources = self.active_sources()
+        if len(sources) == 1:
+            results = await self._call(sources[0], query, page, context)
+            return results, {sources[0].name: results}
+
+        tasks = {asyncio.ensure_future(self._call(s, query, page, context)): s for s in sources}
+        pending = set(tasks)
+        finished = []
+        errors = []
+        grace_deadline = None
+        while pending:
+            timeout = None if grace_deadline is None else max(0.0, grace_deadline - time.monotonic())
+            try:
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            except asyncio.CancelledError:
+                # 调用方被取消：正在进行的来源请求一起取消（不计入来源的健康统计）
+                for task in pending:
+                    task.cancel()
+                raise
+            if not done:
+                break  # grace 时间到
+            for task in done:
+                source = tasks[task]
+                if task.exception() is not None:
+                    errors.append((source, task.exception()))
+                    print(f"[sources] 来源 {source.name} 失败: {task.exception()!r}")
+                    continue
+                finished.append((source, task.result()))
+                if grace_deadline is None and not source.local:
+                    # 第一个远程来源已经返回：其他来源最多再等 grace 秒
+                    grace_deadline = time.monotonic() + self.grace
+
+        for task in pending:
+            # 只是这一次没等它，不计入来源的健康统计（真正的超时由来源自己的截止时间记录）
+            self.stats["dropped_slow"] += 1
+            print(f"[sources] 来源 {tasks[task].name} 在其他来源返回 {self.grace:g}s 后仍未完成，放弃")
+            task.cancel()
+
+        if not finished:
+            self.stats["all_failed"] += 1
+            if errors:
+                # 保持和单来源时相同的异常（例如 SchedulerBusy / CircuitOpen 不写负缓存）
+                order = {s: i for i, s in enumerate(sources)}
+                raise min(errors, key=lambda e: order[e[0]])[1]
+            raise SourceUnavailable("所有搜索来源都超时")
+
+        weights = {s.name: s.weight for s in self.sources}
+        merged = merge_ranked([(s.name, results) for s, results in finished], weights, self.rrf_k)
+        if any(getattr(results, "timed_out", False) for _, results in finished):
+            # 保留上游超时的标记：调用方据此不缓存这份不完整的结果
+            merged = DeadlineResults(merged, timed_out=True)
+        return merged, {s.name: results for s, results in finished}
+
+    def remote_results(self, by_source):
+        """search_detailed() 的结果里来自远程来源的部分（去重）；没有远程来源返回时为 None"""
+        local = {s.name for s in self.sources if s.local}
+        remote = [(name, results) for name, results in by_source.items() if name not in local]
+        if not remote:
+            return None
+        weights = {s.name: s.weight for s in self.sources}
+        return merge_ranked(remote, weights, self.rrf_k)
+
+    def snapshot(self):
+        return {source.name: source.snapshot() for source in self.sources}
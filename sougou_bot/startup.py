@@ -0,0 +1,143 @@
+# startup.py
+# 分阶段启动：bot 先连上 Telegram、设置菜单、开始接收消息，重的东西放到后台。
+#
+# - scraper（连带 selenium、webdriver_manager、bs4/lxml）不在 import bot 时加载，
+#   而是在后台线程里加载；第一次真正需要它的请求会等待同一次加载完成
+# - 加载完成后在后台预先启动浏览器（或等待 worker 进程就绪），之后状态变为 ready
+# - 每个阶段的耗时都会打印出来，并通过 /metrics 导出（startup_state）
+# - 预热完成前到达的搜索可以通过 STARTUP.ready 知道自己会慢一些
+import asyncio
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+
+STARTING = "starting"
+WARMING = "warming"
+READY = "ready"
+DEGRADED = "degraded"  # 预热失败（例如没有 Chrome）：仍然可以搜索，只是第一次会慢或失败
+
+_STATE_CODES = {STARTING: 0, WARMING: 1, READY: 2, DEGRADED: 3}
+
+
+class StartupTracker:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.state = STARTING
+        self.stages = {}  # 阶段名 -> 秒
+        self._last_mark = self.started
+        self._ready = threading.Event()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def uptime(self):
+        return time.perf_counter() - self.started
+
+    def _record(self, name, elapsed):
+        self.stages[name] = elapsed
+        print(f"[startup] {name}: {elapsed:.2f}s（启动后 {self.uptime():.2f}s）")
+
+    def mark(self, name):
+        """记录从上一次 mark（或进程启动）到现在的耗时"""
+        now = time.perf_counter()
+        elapsed, self._last_mark = now - self._last_mark, now
+        self._record(name, elapsed)
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, time.perf_counter() - t0)
+
+    def set_state(self, state):
+        self.state = state
+        if state in (READY, DEGRADED):
+            self._ready.set()
+            print(f"[startup] 状态: {state}（启动后 {self.uptime():.2f}s）")
+
+    async def wait_ready(self, timeout=None):
+        """等待预热结束；超时返回 False"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._ready.wait, timeout)
+
+    def snapshot(self):
+        stats = {f"{name}_seconds": round(elapsed, 3) for name, elapsed in self.stages.items()}
+        return dict(stats, state=_STATE_CODES[self.state], uptime_seconds=round(self.uptime(), 1))
+
+
+STARTUP = StartupTracker()
+
+
+# ---------- scraper 的延迟加载 ----------
+
+_scraper = None
+_scraper_lock = threading.Lock()
+
+
+def load_scraper():
+    """导入 scraper 模块（只导入一次；其他线程同时调用时等待同一次导入）"""
+    global _scraper
+    with _scraper_lock:
+        if _scraper is None:
+            with STARTUP.stage("import_scraper"):
+                _scraper = importlib.import_module("scraper")
+    return _scraper
+
+
+async def get_scraper():
+    """异步版 load_scraper：导入在线程池里进行，不阻塞事件循环"""
+    if _scraper is not None:
+        return _scraper
+    return await asyncio.get_running_loop().run_in_executor(None, load_scraper)
+
+
+def loaded_scraper():
+    """已经加载的 scraper 模块；还没加载时返回 None（不会触发导入）"""
+    return _scraper
+
+
+# ---------- 后台预热 ----------
+
+def _wait_until(check, timeout, poll=0.5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(poll)
+    return check()
+
+
+def _warm(browsers_ready, timeout):
+    STARTUP.set_state(WARMING)
+    scraper = load_scraper()
+    if browsers_ready is None:
+        # 在当前进程里驱动浏览器：创建浏览器池，它会在后台启动 SCRAPER_POOL_WARM 个浏览器
+        scraper.get_driver_pool()
+
+        def browsers_ready():
+            snapshot = scraper.pool_snapshot()
+            return snapshot.get("idle", 0) > 0 or snapshot.get("launch_failed", 0) > 0
+
+    with STARTUP.stage("warm_browsers"):
+        ready = _wait_until(browsers_ready, timeout)
+    failed = scraper.pool_snapshot().get("launch_failed", 0) > 0
+    return ready and not failed
+
+
+async def prewarm(browsers_ready=None, timeout=120.0):
+    """后台加载 scraper 并预先启动浏览器，完成后把状态设为 ready。
+
+    browsers_ready() 返回浏览器是否就绪（例如 worker 进程已启动）；不传时使用进程内的浏览器池。
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        ok = await loop.run_in_executor(None, _warm, browsers_ready, timeout)
+    except Exception as e:
+        print(f"[startup] 预热失败: {e}")
+        ok = False
+    STARTUP.set_state(READY if ok else DEGRADED)
+    return ok
@@ -0,0 +1,117 @@
+# streaming.py
+# 把抓取过程中的部分结果实时编辑进“正在搜索…”占位消息。
+#
+# - 部分结果来自两个地方：Selenium 渲染过程中陆续出现的链接（progress.report），
+#   以及多页搜索中先完成的页
+# - 编辑有节流：两次编辑之间至少间隔 interval 秒，期间到达的更新合并成一次；
+#   Telegram 返回 RetryAfter 时按它要求的时间推迟
+# - 搜索结束时 finish() 做最后一次编辑（带完成标记和翻页按钮）
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from result_merge import merge_pages
+from settings import env_bool, env_float
+
+
+def streaming_enabled():
+    return env_bool("STREAM_RESULTS", True)
+
+
+class StreamingMessage:
+    def __init__(self, message, render, interval=2.0):
+        # render(results) -> 部分结果的消息文本（Markdown）
+        self.message = message
+        self.render = render
+        self.interval = interval
+        self.pages = {}
+        self.edits = 0
+        self.first_result_at = None
+        self._started = time.monotonic()
+        self._next_edit_at = 0.0
+        self._dirty = False
+        self._closed = False
+        self._task = None
+        self._last_text = None
+        self._loop = asyncio.get_running_loop()
+
+    def listener(self):
+        """返回线程安全的 fn(page, results)，可以交给 progress.set_listener()"""
+        def notify(page, results):
+            self._loop.call_soon_threadsafe(self.update, page, list(results))
+        return notify
+
+    def update(self, page, results):
+        """第 page 页目前的结果（只会变多）；在事件循环线程中调用"""
+        if self._closed or len(results) <= len(self.pages.get(page, ())):
+            return
+        self.pages[page] = results
+        if self.first_result_at is None:
+            self.first_result_at = time.monotonic()
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._flush())
+
+    def results(self):
+        return merge_pages(self.pages[page] for page in sorted(self.pages))
+
+    def time_to_first_result(self):
+        if self.first_result_at is None:
+            return None
+        return self.first_result_at - self._started
+
+    async def _flush(self):
+        while self._dirty and not self._closed:
+            delay = self._next_edit_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                if self._closed:
+                    return
+            self._dirty = False
+            await self._edit(self.render(self.results()))
+
+    async def _edit(self, text):
+        if text == self._last_text:
+            return True
+        self._next_edit_at = time.monotonic() + self.interval
+        try:
+            await self.message.edit_text(text, parse_mode="Markdown", disable_web_page_preview=True)
+        except TelegramRetryAfter as e:
+            self._next_edit_at = time.monotonic() + e.retry_after
+            return False
+        except TelegramBadRequest as e:
+            # “message is not modified” 之类，不影响后续编辑
+            print(f"[stream] 编辑消息失败: {e}")
+            return False
+        self._last_text = text
+        self.edits += 1
+        return True
+
+    async def finish(self, text, reply_markup=None, parse_mode="Markdown"):
+        """最后一次编辑；返回 False 时调用方应改为发送新消息"""
+        self._closed = True
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        delay = self._next_edit_at - time.monotonic()
+        if delay > 0:
+            # 最后一次编辑也要遵守节流，但不要为此等太久
+            await asyncio.sleep(min(delay, self.interval))
+        self._next_edit_at = 0.0
+        try:
+            await self.message.edit_text(
+                text, parse_mode=parse_mode, disable_web_page_preview=True, reply_markup=reply_markup
+            )
+        except (TelegramBadRequest, TelegramRetryAfter) as e:
+            print(f"[stream] 最终编辑失败，改为发送新消息: {e}")
+            return False
+        self.edits += 1
+        return True
+
+    @classmethod
+    def from_env(cls, message, render):
+        return cls(message, render, interval=env_float("STREAM_EDIT_INTERVAL", 2.0))
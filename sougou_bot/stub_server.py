@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# stub_server.py
+# telegramsearchengine.com 及其使用的 Google CSE 接口的本地替身，
+# 用录制的数据响应，不联网也能运行和压测抓取：
+# - /                  搜索页：--render-delay 秒后把录制的结果块插入 DOM（Selenium 等待的就是它）；
+#                      q=__empty__ 时改为渲染 CSE 的“没有结果”标记
+# - /recorded.html     原样返回录制的页面（默认 rendered.html）
+# - /cse.js            只包含 cse_token / cselibVersion 的最小 cse.js
+# - /cse/element/v1    由录制页面里 div.gs-title 链接生成的 JSONP 结果
+# - /api/search        同样的结果，普通 JSON 列表 [{"title", "link"}]，
+#                      供 sources.HttpJsonSource 使用（q=__empty__ 返回 []）
+# 每个响应都延迟 --latency 秒，模拟网络。
+#
+# 用法：
+#   python stub_server.py [--port 8765] [--latency 0.05] [--render-delay 1.0]
+#   python stub_server.py --check [query]         # 用 search_telegram_fast 请求 stub
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+
+from aiohttp import web
+from bs4 import BeautifulSoup
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RECORDED_PAGE = os.path.join(HERE, "rendered.html")
+STUB_TOKEN = "stub-cse-token"
+STUB_CX = "stub-cx"
+EMPTY_QUERY = "__empty__"
+PAGE_SIZE = 10
+
+SEARCH_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="UTF-8"><title>Telegram Search Engine (stub)</title>
+<script async src="/cse.js?cx={cx}"></script></head>
+<body>
+<div class="gsc-results gsc-webResult" id="results"></div>
+<template id="recorded">{blocks}</template>
+<script>
+setTimeout(function () {{
+    var results = document.getElementById("results");
+    results.appendChild(document.getElementById("recorded").content.cloneNode(true));
+}}, {delay_ms});
+</script>
+</body></html>
+"""
+
+NO_RESULTS_BLOCK = (
+    '<div class="gsc-webResult gsc-result"><div class="gs-webResult gs-result gs-no-results-result">'
+    '<div class="gs-snippet">No Results</div></div></div>'
+)
+
+
+def load_recording(path=RECORDED_PAGE):
+    """从录制的搜索页解析出 (结果块 HTML, 结果列表)"""
+    with open(path, encoding="utf-8") as f:
+        soup = BeautifulSoup(f.read(), "html.parser")
+
+    blocks = "".join(str(div) for div in soup.select("div.gsc-webResult.gsc-result"))
+    seen = set()
+    results = []
+    for a in soup.select("div.gs-title a"):
+        link = a.get("href")
+        title = " ".join(a.get_text().split())
+        if not title or not link or link in seen:
+            continue
+        seen.add(link)
+        results.append({
+            "title": a.decode_contents(),
+            "titleNoFormatting": title,
+            "url": link,
+            "unescapedUrl": link,
+        })
+    return blocks, results
+
+
+def make_app(page_path=RECORDED_PAGE, latency=0.0, render_delay=0.0):
+    with open(page_path, encoding="utf-8") as f:
+        page_html = f.read()
+    blocks, results = load_recording(page_path)
+
+    @web.middleware
+    async def inject_latency(request, handler):
+        if latency > 0:
+            await asyncio.sleep(latency)
+        return await handler(request)
+
+    async def index(request):
+        empty = request.query.get("q") == EMPTY_QUERY
+        body = SEARCH_PAGE.format(
+            cx=STUB_CX,
+            blocks=NO_RESULTS_BLOCK if empty else blocks,
+            delay_ms=int(render_delay * 1000),
+        )
+        return web.Response(text=body, content_type="text/html")
+
+    async def recorded(request):
+        return web.Response(text=page_html, content_type="text/html")
+
+    async def cse_js(request):
+        config = {"cx": request.query.get("cx", ""), "cse_token": STUB_TOKEN, "cselibVersion": "stub"}
+        body = f"(function(){{var cseConfig = {json.dumps(config)};}})();"
+        return web.Response(text=body, content_type="application/javascript")
+
+    async def element_v1(request):
+        callback = request.query.get("callback", "")
+        if request.query.get("cse_tok") != STUB_TOKEN:
+            data = {"error": {"code": 403, "message": "invalid cse_tok"}}
+        elif request.query.get("q") == EMPTY_QUERY:
+            data = {"results": []}
+        else:
+            start = int(request.query.get("start", "0"))
+            data = {"results": results[start:start + PAGE_SIZE]}
+        body = json.dumps(data, ensure_ascii=False)
+        if callback:
+            body = f"/*O_o*/\n{callback}({body});"
+        return web.Response(text=body, content_type="application/javascript")
+
+    async def api_search(request):
+        if request.query.get("q") == EMPTY_QUERY:
+            return web.json_response([])
+        page = int(request.query.get("page", "1"))
+        start = (page - 1) * PAGE_SIZE
+        items = [{"title": r["titleNoFormatting"], "link": r["url"]} for r in results[start:start + PAGE_SIZE]]
+        return web.json_response(items)
+
+    app = web.Application(middlewares=[inject_latency])
+    app.router.add_get("/", index)
+    app.router.add_get("/recorded.html", recorded)
+    app.router.add_get("/cse.js", cse_js)
+    app.router.add_get("/cse/element/v1", element_v1)
+    app.router.add_get("/api/search", api_search)
+    return app
+
+
+async def start_stub(port=0, page_path=RECORDED_PAGE, latency=0.0, render_delay=0.0):
+    """在 127.0.0.1 上启动 stub，返回 (runner, base_url)"""
+    runner = web.AppRunner(make_app(page_path, latency, render_delay))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+class StubServerThread:
+    """在后台线程里运行 stub（供 Selenium 等同步调用方使用）"""
+
+    def __init__(self, page_path=RECORDED_PAGE, latency=0.0, render_delay=0.0):
+        self._args = (0, page_path, latency, render_delay)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="stub-server", daemon=True)
+        self._runner = None
+        self.base_url = None
+
+    def __enter__(self):
+        self._thread.start()
+        future = asyncio.run_coroutine_threadsafe(start_stub(*self._args), self._loop)
+        self._runner, self.base_url = future.result(timeout=10)
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    def use_for_scraper(self):
+        """通过环境变量让 scraper.py（Selenium 和快速路径）请求这个 stub"""
+        os.environ["SCRAPER_BASE_URL"] = self.base_url + "/"
+        os.environ["FAST_PATH_SITE_URL"] = self.base_url + "/"
+        os.environ["FAST_PATH_CSE_URL"] = self.base_url
+
+
+async def check(query):
+    runner, base_url = await start_stub()
+    os.environ["FAST_PATH_SITE_URL"] = base_url + "/"
+    os.environ["FAST_PATH_CSE_URL"] = base_url
+    import scraper
+    try:
+        results = await scraper.search_telegram_fast(query)
+        print(f"search_telegram_fast 从 {base_url} 得到 {len(results)} 个结果")
+        for i, r in enumerate(results, 1):
+            print(f"{i:2d}. {r['title'][:60]:60s} | {r['link'][:80]}")
+    finally:
+        await scraper.close_http_session()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--page", default=RECORDED_PAGE, help="提供的录制搜索页")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个响应额外延迟的秒数")
+    parser.add_argument("--render-delay", type=float, default=0.0, help="结果出现在 DOM 里之前的秒数")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("query", nargs="?", default="六合彩")
+    args = parser.parse_args()
+
+    if args.check:
+        asyncio.run(check(args.query))
+        sys.exit(0)
+    web.run_app(make_app(args.page, args.latency, args.render_delay), host="127.0.0.1", port=args.port)
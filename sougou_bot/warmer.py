@@ -0,0 +1,164 @@
+# warmer.py
+# 热门查询的提前刷新（refresh-ahead）。
+#
+# 即使有缓存，热门关键词的缓存过期后，第一个用户仍然要等一次完整抓取。
+# 这里在 bot 进程内跑一个后台任务：
+# - search_handler 每次搜索都调用 record()，用指数衰减计数维护 top-K 热门查询
+# - 每隔 interval 秒检查一次，热门查询的缓存快过期（或已经不在缓存里）时提前重新抓取
+# - 启动时可以用配置的关键词列表预热（WARM_KEYWORDS / WARM_KEYWORDS_FILE）
+# 抓取以低优先级提交给调度器，不和交互搜索抢浏览器。
+import asyncio
+import math
+import time
+
+from result_cache import normalize_query
+from settings import env_bool, env_float, env_int, env_str
+
+
+class DecayingTopK:
+    """带指数衰减的频率计数：half_life 秒之前的一次搜索只算半次"""
+
+    def __init__(self, half_life=3600.0, max_tracked=1000):
+        self.half_life = half_life
+        self.max_tracked = max(1, max_tracked)
+        self._scores = {}  # key -> (score, updated_at)
+
+    def _decayed(self, score, updated_at, now):
+        return score * math.pow(0.5, (now - updated_at) / self.half_life)
+
+    def record(self, key, weight=1.0):
+        now = time.monotonic()
+        score, updated_at = self._scores.get(key, (0.0, now))
+        self._scores[key] = (self._decayed(score, updated_at, now) + weight, now)
+        if len(self._scores) > self.max_tracked:
+            self._prune(now)
+
+    def _prune(self, now):
+        # 淘汰分数最低的一半，避免每次都排序
+        ranked = sorted(self._scores, key=lambda k: self._decayed(*self._scores[k], now))
+        for key in ranked[:len(ranked) // 2]:
+            del self._scores[key]
+
+    def top(self, k):
+        """返回 [(key, score)]，按衰减后的分数从高到低"""
+        now = time.monotonic()
+        scored = [(key, self._decayed(score, updated_at, now)) for key, (score, updated_at) in self._scores.items()]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:k]
+
+    def __len__(self):
+        return len(self._scores)
+
+
+def load_seed_keywords():
+    keywords = []
+    inline = env_str("WARM_KEYWORDS")
+    if inline:
+        keywords += [k for k in inline.split(",") if k.strip()]
+    path = env_str("WARM_KEYWORDS_FILE")
+    if path:
+        try:
+            with open(path, encoding="utf-8") as f:
+                keywords += [line for line in f if line.strip() and not line.startswith("#")]
+        except OSError as e:
+            print(f"[warmer] 无法读取关键词文件 {path}: {e}")
+    seen = set()
+    result = []
+    for k in keywords:
+        key = normalize_query(k)
+        if key not in seen:
+            seen.add(key)
+            result.append(key)
+    return result
+
+
+class CacheWarmer:
+    def __init__(self, cache, refresh, top_k=20, refresh_ahead=300.0, interval=60.0,
+                 half_life=3600.0, min_score=2.0, seeds=()):
+        # refresh(query) 是协程函数：强制重新抓取并写入缓存
+        self.cache = cache
+        self.refresh = refresh
+        self.top_k = top_k
+        self.refresh_ahead = refresh_ahead
+        self.interval = interval
+        self.min_score = min_score
+        self.seeds = list(seeds)
+        self.counter = DecayingTopK(half_life=half_life)
+        self._task = None
+        self.stats = {"refreshed": 0, "refresh_failed": 0, "seeded": 0, "cycles": 0}
+
+    @classmethod
+    def from_env(cls, cache, refresh):
+        return cls(
+            cache,
+            refresh,
+            top_k=env_int("WARM_TOP_K", 20),
+            refresh_ahead=env_float("WARM_REFRESH_AHEAD", 300.0),
+            interval=env_float("WARM_INTERVAL", 60.0),
+            half_life=env_float("WARM_HALF_LIFE", 3600.0),
+            min_score=env_float("WARM_MIN_SCORE", 2.0),
+            seeds=load_seed_keywords(),
+        )
+
+    @staticmethod
+    def enabled():
+        return env_bool("WARMER", True)
+
+    def record(self, query):
+        self.counter.record(normalize_query(query))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def due(self):
+        """需要刷新的查询：热门且缓存快过期或已不在缓存中（失败或没有结果的不刷新）"""
+        due = []
+        now = time.time()
+        for query, score in self.counter.top(self.top_k):
+            if score < self.min_score:
+                break
+            entry = self.cache.peek(query)
+            if entry is not None and entry.negative:
+                # 负缓存的 TTL 比 refresh_ahead 短，不跳过的话每一轮都会在后台重抓一次没有结果的查询
+                continue
+            if entry is None or entry.expires_at - now <= self.refresh_ahead:
+                due.append(query)
+        return due
+
+    async def _refresh(self, query):
+        try:
+            await self.refresh(query)
+            return True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats["refresh_failed"] += 1
+            print(f"[warmer] 刷新 {query!r} 失败: {e}")
+            return False
+
+    async def _run(self):
+        for query in self.seeds:
+            # 种子关键词只补缓存里没有的，避免每次重启都全部重抓
+            remaining = self.cache.expires_in(query)
+            if (remaining is None or remaining <= self.refresh_ahead) and await self._refresh(query):
+                self.stats["seeded"] += 1
+        if self.seeds:
+            print(f"[warmer] 启动预热完成：{self.stats['seeded']}/{len(self.seeds)} 个关键词")
+
+        while True:
+            await asyncio.sleep(self.interval)
+            self.stats["cycles"] += 1
+            for query in self.due():
+                if await self._refresh(query):
+                    self.stats["refreshed"] += 1
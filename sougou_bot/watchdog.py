@@ -0,0 +1,130 @@
+# watchdog.py
+# 浏览器操作的硬截止时间：driver.get() / execute_script() 卡死时，直接杀掉这个浏览器。
+#
+# test_nav_timeout.py / test_nav_thread.py 已经说明目标站点上的 driver.get() 可能永远不返回，
+# 而 Selenium 调用是阻塞的，没有办法从外面“取消”。这里用一个后台线程盯住所有进行中的阶段：
+# - with watchdog.guard(driver, seconds, "navigation"): driver.get(url)
+# - 超过截止时间还没结束：杀掉该浏览器的 chromedriver 及其所有子进程（Chrome），
+#   卡住的调用会因为连接断开立即抛异常，guard 把它转换成 NavigationTimeout
+# - 调用方把这个浏览器当作损坏的归还给池（pool.release(broken=True)），池在后台补一个新的
+# 没到杀浏览器的地步、但上游明显很慢（页面加载超时等）时，抓取仍然返回已有的结果，
+# 用 DeadlineResults.timed_out 标记，熔断器同样计为一次超时
+import threading
+import time
+from contextlib import contextmanager
+
+from proctree import kill_tree
+
+
+class NavigationTimeout(RuntimeError):
+    """浏览器操作超过截止时间（上游站点没有响应），浏览器已被终止或需要回收"""
+
+
+class DeadlineResults(list):
+    """截止时间内拿到的结果；timed_out 表示上游很慢（页面加载超时，或渲染等待到截止时间仍没有任何结果）"""
+
+    def __init__(self, results=(), timed_out=False):
+        super().__init__(results)
+        self.timed_out = timed_out
+
+
+def driver_pid(driver):
+    """本地 chromedriver 进程的 pid；远程 / 测试用的假 driver 返回 None"""
+    process = getattr(getattr(driver, "service", None), "process", None)
+    return getattr(process, "pid", None)
+
+
+def kill_driver(driver):
+    """杀掉 chromedriver 和它启动的 Chrome 进程树；返回是否找到了进程"""
+    pid = driver_pid(driver)
+    if pid is None:
+        return False
+    kill_tree(pid)
+    return True
+
+
+class _Guard:
+    def __init__(self, driver, stage, seconds):
+        self.driver = driver
+        self.stage = stage
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds
+        self.fired = False
+
+
+class Watchdog:
+    def __init__(self, kill=kill_driver):
+        self._kill = kill
+        self._guards = set()
+        self._cond = threading.Condition()
+        self._thread = None
+        self.stats = {"guarded": 0, "fired": 0}
+
+    @contextmanager
+    def guard(self, driver, seconds, stage):
+        """seconds 秒内没有退出 with 块就杀掉 driver；超时后抛 NavigationTimeout"""
+        if not seconds or seconds <= 0:
+            yield None
+            return
+        guard = _Guard(driver, stage, seconds)
+        with self._cond:
+            self._guards.add(guard)
+            self.stats["guarded"] += 1
+            self._ensure_thread()
+            self._cond.notify()
+        try:
+            yield guard
+        except Exception as e:
+            if guard.fired:
+                raise NavigationTimeout(f"{stage} 超过 {seconds:g}s 没有完成，已终止浏览器") from e
+            raise
+        finally:
+            with self._cond:
+                self._guards.discard(guard)
+        if guard.fired:
+            # 进程已经被杀，但调用恰好返回了：结果不可信，浏览器也不能再用
+            raise NavigationTimeout(f"{stage} 超过 {seconds:g}s 没有完成，已终止浏览器")
+
+    def _ensure_thread(self):
+        # 调用前必须持有 self._cond
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="browser-watchdog", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                expired = [g for g in self._guards if not g.fired and g.deadline <= now]
+                for guard in expired:
+                    guard.fired = True
+                if not expired:
+                    pending = [g.deadline for g in self._guards if not g.fired]
+                    self._cond.wait(min(pending) - now if pending else None)
+                    continue
+            for guard in expired:
+                self.stats["fired"] += 1
+                print(f"[watchdog] {guard.stage} 超过 {guard.seconds:g}s 没有完成，终止浏览器")
+                try:
+                    if not self._kill(guard.driver):
+                        # 拿不到进程（远程 driver 等）：至少尝试关闭会话
+                        guard.driver.quit()
+                except Exception as e:
+                    print(f"[watchdog] 终止浏览器失败: {e}")
+
+    def snapshot(self):
+        with self._cond:
+            active = len(self._guards)
+        return dict(self.stats, active=active)
+
+
+_watchdog = None
+_watchdog_lock = threading.Lock()
+
+
+def get_watchdog():
+    global _watchdog
+    with _watchdog_lock:
+        if _watchdog is None:
+            _watchdog = Watchdog()
+    return _watchdog
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# webhook.py
+# Webhook 模式：代替 dp.start_polling(bot) 的长轮询。
+#
+# - aiohttp 服务器接收 Telegram 推送的 update，立即返回 200，处理放到后台任务里
+#   （搜索可能要几十秒，不能让 Telegram 等到超时后重发）
+# - 关闭时先停止接收新的 update（返回 503，Telegram 会稍后重发给其他副本），
+#   再等待正在处理的搜索完成（最多 WEBHOOK_DRAIN_TIMEOUT 秒），剩下的才取消
+# - 多个副本可以挂在同一个负载均衡后面共同处理 update
+#
+# 配置（环境变量）：
+#   BOT_MODE=webhook                    启用 webhook（默认 polling）
+#   WEBHOOK_HOST / WEBHOOK_PORT         监听地址（默认 0.0.0.0:8080）
+#   WEBHOOK_PATH                        update 路径（默认 /telegram）
+#   WEBHOOK_URL                         对外的完整地址（含路径），设置后启动时调用 setWebhook；本地测试时留空
+#   WEBHOOK_SECRET                      X-Telegram-Bot-Api-Secret-Token 校验
+#   WEBHOOK_DRAIN_TIMEOUT               关闭时等待进行中搜索的秒数（默认 30）
+#
+# 本地测试：把录制的 update JSON POST 给正在运行的 webhook 服务器
+#   python webhook.py post sample_update.json [--url http://127.0.0.1:8080/telegram] [--secret ...]
+import argparse
+import asyncio
+import json
+import signal
+import sys
+import time
+
+import aiohttp
+from aiogram.methods import TelegramMethod
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from settings import env_float, env_int, env_str
+
+
+def webhook_enabled():
+    return env_str("BOT_MODE", "polling").lower() == "webhook"
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """立即应答 update 并在后台处理；关闭时可以等待后台任务处理完
+
+    后台任务由这里自己管理（只用 aiogram 的公开接口 feed_raw_update），不依赖 aiogram 内部的任务集合。
+    """
+
+    def __init__(self, dispatcher, bot, secret_token=None, **data):
+        super().__init__(dispatcher, bot, secret_token=secret_token, **data)
+        self.draining = False
+        self._tasks = set()
+        self.stats = {"received": 0, "rejected": 0, "failed": 0, "cancelled": 0}
+
+    async def handle(self, request):
+        if self.draining:
+            # 正在关闭：让 Telegram 过一会儿重发（可能会被其他副本接收）
+            self.stats["rejected"] += 1
+            return web.Response(status=503, text="shutting down")
+        self.stats["received"] += 1
+        bot = await self.resolve_bot(request)
+        if not self.verify_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), bot):
+            return web.Response(body="Unauthorized", status=401)
+        update = await request.json(loads=bot.session.json_loads)
+        task = asyncio.ensure_future(self._process(bot, update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    __call__ = handle
+
+    async def _process(self, bot, update):
+        try:
+            result = await self.dispatcher.feed_raw_update(bot, update, **self.data)
+            if isinstance(result, TelegramMethod):
+                # 处理函数返回了 API 方法（webhook 回复的写法）：后台处理时单独调用
+                await bot(result)
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            raise
+        except Exception as e:
+            self.stats["failed"] += 1
+            print(f"[webhook] 处理 update {update.get('update_id')} 失败: {e}")
+
+    def pending(self):
+        return len(self._tasks)
+
+    async def drain(self, timeout):
+        """停止接收新 update，等待进行中的处理完成；超时后取消剩余任务"""
+        self.draining = True
+        tasks = set(self._tasks)
+        if not tasks:
+            return 0
+        print(f"[webhook] 等待 {len(tasks)} 个进行中的请求完成（最多 {timeout:.0f}s）...")
+        done, remaining = await asyncio.wait(tasks, timeout=timeout)
+        for task in remaining:
+            task.cancel()
+        if remaining:
+            await asyncio.gather(*remaining, return_exceptions=True)
+            print(f"[webhook] {len(remaining)} 个请求超时被取消")
+        return len(remaining)
+
+    def snapshot(self):
+        return dict(self.stats, pending=self.pending(), draining=int(self.draining))
+
+
+def build_app(dispatcher, bot, path="/telegram", secret_token=None, **data):
+    """返回 (app, handler)：update 路由 + /healthz（负载均衡探活，关闭中返回 503）"""
+    handler = DrainingRequestHandler(dispatcher, bot, secret_token=secret_token, **data)
+    app = web.Application()
+    handler.register(app, path=path)
+
+    async def healthz(request):
+        status = 503 if handler.draining else 200
+        return web.json_response(handler.snapshot(), status=status)
+
+    app.router.add_get("/healthz", healthz)
+    setup_application(app, dispatcher, bot=bot, **data)
+    return app, handler
+
+
+def _install_stop_signals(stop):
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError, ValueError):
+            # Windows 不支持 add_signal_handler，Ctrl+C 会以 KeyboardInterrupt 结束 asyncio.run
+            pass
+
+
+async def run_webhook(dispatcher, bot, stop=None, on_handler=None):
+    """以 webhook 模式运行，直到收到 SIGINT/SIGTERM（或 stop 被设置），然后优雅关闭"""
+    host = env_str("WEBHOOK_HOST", "0.0.0.0")
+    port = env_int("WEBHOOK_PORT", 8080)
+    path = env_str("WEBHOOK_PATH", "/telegram")
+    public_url = env_str("WEBHOOK_URL")
+    secret = env_str("WEBHOOK_SECRET")
+
+    app, handler = build_app(dispatcher, bot, path=path, secret_token=secret)
+    if on_handler is not None:
+        on_handler(handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"✅ Webhook 服务器已启动：http://{host}:{port}{path}")
+
+    if public_url:
+        await bot.set_webhook(
+            public_url,
+            secret_token=secret,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+        )
+        print(f"✅ 已向 Telegram 注册 webhook：{public_url}")
+    else:
+        print("⚠️ 未设置 WEBHOOK_URL，不会向 Telegram 注册 webhook（仅本地测试）")
+
+    stop = stop or asyncio.Event()
+    _install_stop_signals(stop)
+    try:
+        await stop.wait()
+    finally:
+        print("🛑 正在关闭 webhook 服务器...")
+        await handler.drain(env_float("WEBHOOK_DRAIN_TIMEOUT", 30.0))
+        # cleanup 会触发 on_shutdown（关闭 bot session），所以必须在 drain 之后
+        await runner.cleanup()
+
+
+# ---------- 本地测试：POST 录制的 update ----------
+
+async def post_updates(paths, url, secret=None):
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    async with aiohttp.ClientSession() as session:
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            updates = data if isinstance(data, list) else [data]
+            for update in updates:
+                t0 = time.perf_counter()
+                async with session.post(url, json=update, headers=headers) as resp:
+                    body = await resp.text()
+                elapsed = (time.perf_counter() - t0) * 1000
+                print(f"update {update.get('update_id')}: HTTP {resp.status} in {elapsed:.1f} ms {body[:80]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="webhook helpers")
+    sub = parser.add_subparsers(dest="command", required=True)
+    post = sub.add_parser("post", help="POST recorded Telegram update JSON to a running webhook server")
+    post.add_argument("files", nargs="+", help="JSON files, each one update or a list of updates")
+    post.add_argument("--url", default=None, help="default: http://127.0.0.1:$WEBHOOK_PORT$WEBHOOK_PATH")
+    post.add_argument("--secret", default=env_str("WEBHOOK_SECRET"))
+    args = parser.parse_args()
+
+    url = args.url or f"http://127.0.0.1:{env_int('WEBHOOK_PORT', 8080)}{env_str('WEBHOOK_PATH', '/telegram')}"
+    asyncio.run(post_updates(args.files, url, args.secret))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
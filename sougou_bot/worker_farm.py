@@ -0,0 +1,501 @@
+# worker_farm.py
+# 多进程抓取：Chrome 不再由 bot 进程里的线程驱动，而是交给 N 个独立的 worker 进程。
+#
+# - 每个 worker 是一个单独的 Python 进程（python worker_farm.py --worker），
+#   拥有自己的浏览器池，一次处理一个 search_telegram 任务
+# - bot 进程只负责分发：任务放进共享队列，空闲的 worker 取走执行，结果通过管道传回
+#   （每行一个 JSON；worker 的 print 输出全部重定向到 stderr，不会混进协议）
+# - worker 崩溃（管道 EOF）时自动重启，正在执行的任务重试一次
+# - 任务超过 job_timeout 没有返回视为卡死：杀掉整个进程组（包括 chromedriver / Chrome）并重启
+# - 调用方取消（调度器的 CancelToken 被触发）：还在排队的任务直接丢弃；已经在执行的任务发送
+#   {"cancel": id}，worker 触发自己的 CancelToken，scraper 在下一个检查点停下并归还浏览器
+#
+# 启用方式：SCRAPER_WORKERS=N（0 表示不启用，仍在 bot 进程内用线程抓取）。
+# worker 里的 stage() 耗时会随结果一起传回，记入 bot 进程的 metrics 和搜索日志。
+import json
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import cancellation
+import metrics
+from cancellation import SearchCancelled
+from proctree import tree_rss_many
+from settings import env_float, env_int
+from watchdog import DeadlineResults, NavigationTimeout
+
+WORKER_SCRIPT = os.path.abspath(__file__)
+
+# 调用方最多等待 job_timeout + RESULT_MARGIN 秒（包括排队和 worker 重启的时间）
+RESULT_MARGIN = 30.0
+# 等待结果时多久检查一次调用方是否已经取消
+CANCEL_POLL = 0.2
+
+
+class WorkerError(RuntimeError):
+    """worker 进程中的抓取失败"""
+
+
+class WorkerCrashed(WorkerError):
+    """worker 进程在执行任务时退出或卡死"""
+
+
+class WorkerTimeout(WorkerCrashed, NavigationTimeout):
+    """任务超过 job_timeout 没有返回，worker 已被杀掉；熔断器把它当作一次上游超时"""
+
+
+class FarmStopped(RuntimeError):
+    """worker farm 已经关闭"""
+
+
+class _Job:
+    def __init__(self, query, page):
+        self.id = None
+        self.query = query
+        self.page = page
+        self.attempts = 0
+        self.cancelled = False
+        self.future = Future()
+
+
+class _Worker:
+    def __init__(self, index, env):
+        self.index = index
+        self.env = env
+        self.proc = None
+        self.lines = None
+        self.ready = False
+        self.restarts = 0
+        self.jobs_done = 0
+        self.current = None  # 正在执行的 _Job
+        self._send_lock = threading.Lock()  # 分发线程发任务，调用方的线程发取消
+
+    def spawn(self):
+        kwargs = {}
+        if os.name == "posix":
+            # 独立进程组：卡死时连同 chromedriver / Chrome 一起杀掉
+            kwargs["start_new_session"] = True
+        else:
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        self.proc = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT, "--worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=self.env,
+            cwd=os.path.dirname(WORKER_SCRIPT),
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+            **kwargs,
+        )
+        self.ready = False
+        self.lines = queue.Queue()
+        threading.Thread(
+            target=self._read, args=(self.proc, self.lines), name=f"farm-reader-{self.index}", daemon=True
+        ).start()
+
+    @staticmethod
+    def _read(proc, lines):
+        try:
+            for line in proc.stdout:
+                lines.put(line)
+        except (OSError, ValueError):
+            pass
+        finally:
+            lines.put(None)  # EOF：进程已退出
+
+    def receive(self, timeout):
+        """读取一条消息；超时抛 queue.Empty，进程退出返回 None"""
+        deadline = time.monotonic() + timeout
+        while True:
+            line = self.lines.get(timeout=max(0.0, deadline - time.monotonic()))
+            if line is None:
+                return None
+            try:
+                return json.loads(line)
+            except ValueError:
+                print(f"[farm] worker {self.index} 输出了无法解析的内容: {line[:200]!r}")
+
+    def send(self, message):
+        with self._send_lock:
+            self.proc.stdin.write(json.dumps(message, ensure_ascii=False) + "\n")
+            self.proc.stdin.flush()
+
+    def kill(self):
+        if self.proc is None:
+            return
+        try:
+            if os.name == "posix":
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            else:
+                self.proc.kill()
+        except (OSError, ProcessLookupError):
+            pass
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            pass
+        self.ready = False
+
+    def stop(self, timeout=10.0):
+        """正常关闭：关掉 stdin，worker 退出前会关闭自己的浏览器"""
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            self.kill()
+
+
+class WorkerFarm:
+    def __init__(self, workers=2, browsers_per_worker=1, job_timeout=90.0, startup_timeout=120.0):
+        self.size = max(1, workers)
+        self.browsers_per_worker = max(1, browsers_per_worker)
+        self.job_timeout = job_timeout
+        self.startup_timeout = startup_timeout
+        self._jobs = queue.Queue()
+        self._workers = []
+        self._threads = []
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "crashed": 0,
+            "timeouts": 0,
+            "restarts": 0,
+            "retried": 0,
+            "cancelled": 0,
+        }
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            workers=env_int("SCRAPER_WORKERS", 2),
+            browsers_per_worker=env_int("SCRAPER_WORKER_BROWSERS", 1),
+            job_timeout=env_float("SCRAPER_WORKER_JOB_TIMEOUT", 90.0),
+            startup_timeout=env_float("SCRAPER_WORKER_STARTUP_TIMEOUT", 120.0),
+        )
+
+    @staticmethod
+    def enabled():
+        return env_int("SCRAPER_WORKERS", 0) > 0
+
+    def capacity(self):
+        """同时能执行的抓取数量（调度器的并发上限应与之一致）"""
+        return self.size
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            env = dict(os.environ)
+            # worker 一次只执行一个任务，每个 worker 的浏览器池只需要很小
+            env["SCRAPER_POOL_SIZE"] = str(self.browsers_per_worker)
+            env["SCRAPER_POOL_WARM"] = str(self.browsers_per_worker)
+            # 浏览器内存预算是整台机器的，平均分给每个 worker
+            budget = env_int("SCRAPER_MEMORY_BUDGET_MB", 0)
+            if budget:
+                env["SCRAPER_MEMORY_BUDGET_MB"] = str(max(1, budget // self.size))
+            env["PYTHONUNBUFFERED"] = "1"
+            for index in range(self.size):
+                worker = _Worker(index, env)
+                thread = threading.Thread(target=self._serve, args=(worker,), name=f"farm-{index}", daemon=True)
+                self._workers.append(worker)
+                self._threads.append(thread)
+                thread.start()
+            print(f"[farm] 启动 {self.size} 个抓取 worker 进程")
+
+    def close(self):
+        self._stopping.set()
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join(timeout=self.job_timeout + 15)
+        # 队列里剩下的任务不会再被执行
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None and not job.future.done():
+                job.future.set_exception(FarmStopped("worker farm 已关闭"))
+
+    # ---------- 提交 ----------
+
+    def submit(self, query, page=1):
+        """把一次 search_telegram(query, page) 放进共享队列，返回 concurrent.futures.Future"""
+        return self._submit(query, page).future
+
+    def _submit(self, query, page):
+        if self._stopping.is_set():
+            raise FarmStopped("worker farm 已关闭")
+        self.start()
+        job = _Job(query, page)
+        with self._lock:
+            self._next_id += 1
+            job.id = self._next_id
+            self.stats["submitted"] += 1
+        self._jobs.put(job)
+        return job
+
+    def search_telegram(self, query, page=1):
+        """与 scraper.search_telegram 相同的同步接口（在调度器的线程里调用）
+
+        调度器的任务被取消时（CancelToken），同样取消 worker 里的抓取并抛 SearchCancelled。
+        """
+        job = self._submit(query, page)
+        token = cancellation.current()
+        deadline = time.monotonic() + self.job_timeout + RESULT_MARGIN
+        while True:
+            try:
+                remaining = max(0.0, deadline - time.monotonic())
+                results, stages, fields = job.future.result(timeout=min(CANCEL_POLL, remaining))
+                break
+            except FutureTimeout:
+                if token is not None and token.cancelled:
+                    self.cancel(job)
+                    token.check()
+                if time.monotonic() >= deadline:
+                    # 例如 worker 一直启动不起来：不无限期地占用调度器的线程；还在排队的任务直接丢弃
+                    self.cancel(job)
+                    raise WorkerError(f"等待 worker 结果超过 {self.job_timeout + RESULT_MARGIN:.0f}s")
+        # worker 进程里的阶段耗时记到当前进程的 metrics 和搜索日志里
+        trace = metrics.current_trace()
+        for name, ms in stages.items():
+            metrics.STAGE_SECONDS.observe(ms / 1000.0, stage=name)
+            if trace is not None:
+                trace.record(name, ms / 1000.0)
+        if trace is not None:
+            for key, value in fields.items():
+                if isinstance(value, (int, float)):
+                    trace.fields[key] = trace.fields.get(key, 0) + value
+        return results
+
+    def cancel(self, job):
+        """取消任务：还在排队的直接丢弃，正在执行的通知 worker 停下"""
+        job.cancelled = True
+        self._count("cancelled")
+        if job.future.cancel():
+            return
+        for worker in self._workers:
+            if worker.current is job:
+                try:
+                    worker.send({"cancel": job.id})
+                except (OSError, ValueError):
+                    pass  # worker 已经退出：分发线程会处理
+        # 没有 worker 在执行：任务在崩溃后重新排队了，分发线程取出时直接结束
+
+    # ---------- 每个 worker 的分发线程 ----------
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _ensure_running(self, worker):
+        """确保 worker 进程已启动并完成初始化；连续失败时指数退避"""
+        failures = 0
+        while not self._stopping.is_set():
+            if worker.ready and worker.proc.poll() is None:
+                return True
+            if worker.proc is not None:
+                worker.kill()
+                worker.restarts += 1
+                self._count("restarts")
+            worker.spawn()
+            try:
+                message = worker.receive(self.startup_timeout)
+            except queue.Empty:
+                message = None
+            if message is not None and message.get("ready"):
+                worker.ready = True
+                print(f"[farm] worker {worker.index} 就绪 (pid={message.get('pid')})")
+                return True
+            failures += 1
+            backoff = min(30.0, 2.0 ** failures)
+            print(f"[farm] worker {worker.index} 启动失败，{backoff:.0f}s 后重试")
+            self._stopping.wait(backoff)
+        return False
+
+    def _serve(self, worker):
+        try:
+            while not self._stopping.is_set():
+                if not self._ensure_running(worker):
+                    break
+                job = self._jobs.get()
+                if job is None:
+                    break
+                # 重试的任务已经是 RUNNING 状态；新任务在这里检查调用方是否已经取消
+                if job.attempts == 0 and not job.future.set_running_or_notify_cancel():
+                    continue
+                if job.cancelled:
+                    # 崩溃后重新排队期间被取消
+                    job.future.set_exception(SearchCancelled("搜索已被取消"))
+                    continue
+                self._run_job(worker, job)
+        finally:
+            worker.stop()
+
+    def _run_job(self, worker, job):
+        job.attempts += 1
+        worker.current = job
+        try:
+            worker.send({"id": job.id, "query": job.query, "page": job.page})
+            reply = worker.receive(self.job_timeout)
+        except queue.Empty:
+            # 卡死：杀掉整个进程组，下一轮循环会重启
+            self._count("timeouts")
+            print(f"[farm] worker {worker.index} 执行 {job.query!r} 超过 {self.job_timeout:.0f}s，重启")
+            worker.kill()
+            job.future.set_exception(WorkerTimeout(f"抓取超时（{self.job_timeout:.0f}s）"))
+            return
+        except OSError:
+            reply = None
+        finally:
+            worker.current = None
+
+        if reply is None:
+            self._count("crashed")
+            worker.kill()
+            if job.attempts < 2 and not self._stopping.is_set():
+                # 崩溃多半与这次查询无关，换一个 worker 重试一次
+                self._count("retried")
+                print(f"[farm] worker {worker.index} 在执行 {job.query!r} 时退出，重试")
+                self._jobs.put(job)
+            else:
+                job.future.set_exception(WorkerCrashed("抓取进程异常退出"))
+            return
+
+        worker.jobs_done += 1
+        if reply.get("ok"):
+            self._count("completed")
+            results = DeadlineResults(reply["results"], timed_out=reply.get("timed_out", False))
+            job.future.set_result((results, reply.get("stages", {}), reply.get("fields", {})))
+        else:
+            if reply.get("cancelled"):
+                # 调用方已经离开（取消已经计入 cancelled），不算失败
+                job.future.set_exception(SearchCancelled(reply.get("error", "搜索已被取消")))
+                return
+            self._count("failed")
+            # 上游超时保持原来的异常类型，bot 进程里的熔断器要据此计数
+            error = NavigationTimeout if reply.get("timeout") else WorkerError
+            job.future.set_exception(error(reply.get("error", "未知错误")))
+
+    # ---------- 观测 ----------
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        # 每个 worker 的进程树包括它的 chromedriver / Chrome
+        pids = [w.proc.pid for w in self._workers if w.proc is not None and w.proc.poll() is None]
+        return dict(
+            stats,
+            fleet_rss_bytes=sum(tree_rss_many(pids).values()),
+            workers=self.size,
+            workers_ready=sum(1 for w in self._workers if w.ready),
+            busy=sum(1 for w in self._workers if w.current is not None),
+            queued=self._jobs.qsize(),
+        )
+
+
+# ---------- worker 进程 ----------
+
+def worker_main():
+    # 协议使用原来的 stdout；其余所有输出（包括子进程）都改到 stderr
+    protocol = os.fdopen(os.dup(1), "w", encoding="utf-8", buffering=1)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    def send(message):
+        protocol.write(json.dumps(message, ensure_ascii=False) + "\n")
+        protocol.flush()
+
+    import scraper
+
+    # 先确认至少有一个浏览器真的能用（借出再归还），再告诉分发方可以接任务；
+    # 启动失败时直接退出，由分发方按退避策略重启
+    pool = scraper.get_driver_pool()
+    try:
+        pool.release(pool.acquire())
+    except Exception as e:
+        print(f"[worker] 浏览器启动失败: {e}")
+        sys.exit(1)
+    send({"ready": True, "pid": os.getpid()})
+
+    # 单独的线程读 stdin：抓取进行中也能收到 {"cancel": id}
+    jobs = queue.Queue()
+    lock = threading.Lock()
+    running = {"id": None, "token": None}
+    cancelled = set()  # 任务还没开始执行就收到的取消
+
+    def read():
+        for line in sys.stdin:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if "cancel" not in message:
+                jobs.put(message)
+                continue
+            with lock:
+                if running["id"] == message["cancel"]:
+                    running["token"].cancel()
+                else:
+                    cancelled.add(message["cancel"])
+        jobs.put(None)  # stdin 关闭
+
+    threading.Thread(target=read, name="worker-stdin", daemon=True).start()
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        token = cancellation.CancelToken()
+        with lock:
+            # 分发方只会取消当前的任务：更早的 id 都已经结束
+            if job["id"] in cancelled:
+                token.cancel()
+            cancelled.clear()
+            running.update(id=job["id"], token=token)
+        cancellation.bind(token)
+        trace = metrics.start_trace(job["query"])
+        try:
+            results = scraper.search_telegram(job["query"], job.get("page", 1))
+            reply = {
+                "id": job["id"],
+                "ok": True,
+                "results": results,
+                "timed_out": getattr(results, "timed_out", False),
+            }
+        except Exception as e:
+            reply = {
+                "id": job["id"],
+                "ok": False,
+                "error": f"{type(e).__name__}: {e}",
+                "timeout": isinstance(e, NavigationTimeout),
+                "cancelled": isinstance(e, SearchCancelled),
+            }
+        with lock:
+            running.update(id=None, token=None)
+        reply["stages"] = trace.stages
+        reply["fields"] = trace.fields
+        send(reply)
+    # stdin 关闭：正常退出，atexit 会关闭浏览器池
+
+
+if __name__ == "__main__":
+    if "--worker" in sys.argv[1:]:
+        worker_main()
+    else:
+        print("usage: python worker_farm.py --worker   (started by WorkerFarm, not meant to be run by hand)")
+        sys.exit(2)